@@ -1,14 +1,19 @@
+import asyncio
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
 from fastapi import Depends, HTTPException, status
 
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Optional, Tuple, Union
 
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import OAuth2PasswordBearer
-from passlib.context import CryptContext
 from jose import JWTError, jwt
 from pydantic import BaseModel
 from sqlalchemy.orm.session import Session
-from .crud import get_user_by_username
+from .crud import USER_CACHE_TTL, get_cached_user, get_user_by_username, get_user_changed_at, get_user_from_cache, update_user_password_hash
+from .passwords import build_password_context
 from . import schemas
 from .utility import get_db, raise_http_400
 
@@ -33,10 +38,27 @@ class Token(BaseModel):
 class TokenData(BaseModel):
     username: Optional[str] = None
 
+# the user an access token was issued to, as carried by the token
+# it's enough to authorize a request, the profile (names & email) isn't part of it
+
+class TokenUser(BaseModel):
+    id: int
+    username: str
+    is_active: bool
+
 
 
 # used to get the hashed version of a password
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# the hashing policy (scheme & cost) is configured in passwords.py
+pwd_context = build_password_context()
+
+# hashing & verifying a password takes a while (on purpose)
+# --> the async endpoints run it in a dedicated thread pool, instead of blocking the event loop
+# the pool is bounded, so that a burst of logins queues up instead of starving the rest of the API
+
+PASSWORD_HASHING_WORKERS = int(os.environ.get("PASSWORD_HASHING_WORKERS", min(4, os.cpu_count() or 1)))
+
+password_hashing_executor = ThreadPoolExecutor(max_workers=PASSWORD_HASHING_WORKERS, thread_name_prefix="password-hashing")
 
 
 # authentication utility functions
@@ -55,6 +77,21 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     """
     return pwd_context.verify(plain_password, hashed_password)
 
+def verify_and_update_password(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """
+
+    Verify whether a given 'plain_password' corresponds to a 'hashed_password',
+    and hash it again if 'hashed_password' was made under an older hashing policy.
+
+    Args:
+        plain_password (str): Password in plain text.
+        hashed_password (str): Hashed password.
+
+    Returns:
+        Tuple[bool, Optional[str]]: True if the passwords match (False if not), and the new hash (None if there's no need for one).
+    """
+    return pwd_context.verify_and_update(plain_password, hashed_password)
+
 def get_password_hash(password: str) -> str:
     """
 
@@ -68,6 +105,35 @@ def get_password_hash(password: str) -> str:
     """
     return pwd_context.hash(password)
 
+async def verify_and_update_password_async(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """
+
+    Same as verify_and_update_password(), run in the password hashing thread pool.
+
+    Args:
+        plain_password (str): Password in plain text.
+        hashed_password (str): Hashed password.
+
+    Returns:
+        Tuple[bool, Optional[str]]: True if the passwords match (False if not), and the new hash (None if there's no need for one).
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(password_hashing_executor, verify_and_update_password, plain_password, hashed_password)
+
+async def get_password_hash_async(password: str) -> str:
+    """
+
+    Same as get_password_hash(), run in the password hashing thread pool.
+
+    Args:
+        password (str): Password in plain text.
+
+    Returns:
+        str: The hashed version of the password.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(password_hashing_executor, get_password_hash, password)
+
 def get_user(db: Session, username: str) -> schemas.User:
     """
 
@@ -99,15 +165,95 @@ def authenticate_user(db: Session, username:str, password: str):
     Returns:
         bool, schemas.User: The corresponding schemas.User object (if credentials are valid), False if not.
     """
-    user = get_user(db, username)
+    db_user = get_user_by_username(db, username)
     # check whether the user exists
-    if not user:
+    if db_user is None:
         return False
     # if they do exist, check whether the password is correct
-    user_password = get_user_by_username(db, user.username).hashed_password
-    if not verify_password(password, user_password):
+    verified, new_hash = verify_and_update_password(password, db_user.hashed_password)
+    if not verified:
         return False
-    return user
+    # the hash was made under an older hashing policy
+    # --> replace it, now that we know the password
+    if new_hash is not None:
+        update_user_password_hash(db, db_user, new_hash)
+    return schemas.User.from_orm(db_user)
+
+async def authenticate_user_async(db: Session, username: str, password: str):
+    """
+
+    Same as authenticate_user(), without blocking the event loop.
+    The user is looked up once (in the default thread pool), the password is verified in the password hashing thread pool.
+
+    Args:
+        db (Session): The session used to access the database.
+        username (str): The provided username.
+        password (str): The provided password supposed to correspond to the user identified by the provided 'username'.
+
+    Returns:
+        bool, schemas.User: The corresponding schemas.User object (if credentials are valid), False if not.
+    """
+    db_user = await run_in_threadpool(get_user_by_username, db, username)
+    # check whether the user exists
+    if db_user is None:
+        return False
+    # if they do exist, check whether the password is correct
+    verified, new_hash = await verify_and_update_password_async(password, db_user.hashed_password)
+    if not verified:
+        return False
+    # the hash was made under an older hashing policy
+    # --> replace it, now that we know the password
+    if new_hash is not None:
+        await run_in_threadpool(update_user_password_hash, db, db_user, new_hash)
+    return schemas.User.from_orm(db_user)
+
+
+# the access tokens carry the user they were issued to (ID & active flag)
+# --> most authenticated requests don't need to look up the user at all
+# the claims of a token aren't trusted (the user is looked up instead, in the cache or in the database) when:
+# - the token was issued before the last change of its user, made by this process (see crud_functions/user.py)
+# - the token was issued more than TOKEN_CLAIMS_TRUST_SECONDS ago
+#   --> bounds how long a change made by another process can go unnoticed, like USER_CACHE_TTL does for the cache
+
+TOKEN_CLAIMS_TRUST_SECONDS = float(os.environ.get("TOKEN_CLAIMS_TRUST_SECONDS", USER_CACHE_TTL))
+
+def get_token_claims(user: schemas.User) -> dict:
+    """
+
+    Get the data stored in the access token of a user.
+
+    Args:
+        user (schemas.User): The user the token is issued to.
+
+    Returns:
+        dict: The claims of the token (without the expiration & issue times).
+    """
+    return {
+        "sub": user.username,
+        "uid": user.id,
+        "act": user.is_active,
+    }
+
+def get_user_from_token_claims(payload: dict) -> Optional[TokenUser]:
+    """
+
+    Rebuild the user an access token was issued to, from the token's claims.
+
+    Args:
+        payload (dict): The decoded token.
+
+    Returns:
+        Optional[TokenUser]: The TokenUser object, None if the token doesn't carry a user or can't be trusted anymore.
+    """
+    if any(claim not in payload for claim in ["uid", "act", "iat"]):
+        # issued by a previous version of the API
+        return None
+    # the token must be recent & have been issued after the last change of the user
+    if time.time() - payload["iat"] > TOKEN_CLAIMS_TRUST_SECONDS:
+        return None
+    if payload["iat"] <= get_user_changed_at(payload["uid"]):
+        return None
+    return TokenUser(id=payload["uid"], username=payload["sub"], is_active=payload["act"])
 
 
 # use the following function to create an access token 
@@ -129,14 +275,14 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
         expire = datetime.utcnow() + expires_delta
     else: 
         expire = datetime.utcnow() + timedelta(minutes=15)
-    to_encode.update({"exp": expire})
+    to_encode.update({"exp": expire, "iat": int(time.time())})
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
 
 # use the following function to get a user object using a token
 
-async def get_user_using_token(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)) -> schemas.User:
+async def get_user_using_token(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)) -> Union[TokenUser, schemas.User]:
     """
 
     Retrieve a user from the database using a token.
@@ -149,7 +295,7 @@ async def get_user_using_token(token: str = Depends(oauth2_scheme), db: Session
         credentials_exception: Raised when the token isn't valid or the user can't be found in the database.
 
     Returns:
-        schemas.User: the schemas.User object (if found), None (if not found).
+        Union[TokenUser, schemas.User]: the user carried by the token, or the schemas.User object if the token can't be trusted.
     """
     # create once and for all the exception we throw when something goes wrong in this function
     credentials_exception = HTTPException(
@@ -169,8 +315,15 @@ async def get_user_using_token(token: str = Depends(oauth2_scheme), db: Session
         token_data = TokenData(username=username)
     except JWTError: # if the JWT is not correct
         raise credentials_exception
-    # try to get the user
-    user = get_user(db, username=token_data.username)
+    # the token is usually enough
+    user = get_user_from_token_claims(payload)
+    if user is not None:
+        return user
+    # if it can't be trusted, get the user from the cache (see crud_functions/user.py)
+    # the database is only accessed on a cache miss, outside of the event loop
+    user = get_user_from_cache(db, token_data.username)
+    if user is None:
+        user = await run_in_threadpool(get_cached_user, db, token_data.username)
     if user is None: 
         # if we can't get the user with the requested username for some reason
         raise credentials_exception
@@ -181,19 +334,19 @@ async def get_user_using_token(token: str = Depends(oauth2_scheme), db: Session
 # use the following function to get a user object using a token 
 # while also checking whether that token has expired
 
-async def get_current_active_user(current_user: schemas.User = Depends(get_user_using_token)):
+async def get_current_active_user(current_user: Union[TokenUser, schemas.User] = Depends(get_user_using_token)):
     """
 
-    Return a schemas.User object only if the User is active.
+    Return the authenticated user only if the User is active.
 
     Args:
-        current_user (schemas.User): The User object to be returned. Defaults to Depends(get_user_using_token).
+        current_user (Union[TokenUser, schemas.User]): The user to be returned. Defaults to Depends(get_user_using_token).
 
     Raises:
         HTTPException: Raised if the user isn't active.
 
     Returns:
-        schemas.User: The retrieved schemas.User object.
+        Union[TokenUser, schemas.User]: The authenticated user (its ID, username & active flag are always available).
     """
     if not current_user.is_active:
         raise_http_400("Inactive user.")
@@ -0,0 +1,69 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+
+# in-process cache, shared by all the requests handled by the same process
+# - once max_size entries are stored, the least recently used one is evicted
+# - if provided, ttl is the number of seconds an entry stays valid
+# the cache is thread-safe, since FastAPI runs our (non async) endpoints in a thread pool
+
+class LRUCache:
+
+    def __init__(self, max_size: int, ttl: Optional[float] = None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """
+
+        Retrieve an entry from the cache.
+
+        Args:
+            key (Hashable): The key of the entry.
+            default (Any): The value returned if the entry isn't in the cache (or has expired).
+
+        Returns:
+            Any: The cached value, the default value if not found.
+        """
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return default
+            value, expires_at = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self.entries[key]
+                return default
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key: Hashable, value: Any):
+        """
+
+        Store an entry in the cache, evicting the least recently used one if the cache is full.
+
+        Args:
+            key (Hashable): The key of the entry.
+            value (Any): The value to be cached.
+        """
+        expires_at = time.monotonic() + self.ttl if self.ttl is not None else None
+        with self.lock:
+            self.entries[key] = (value, expires_at)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def delete(self, key: Hashable):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def __len__(self) -> int:
+        with self.lock:
+            return len(self.entries)
@@ -12,4 +12,5 @@ from .crud_functions.artist import *
 from .crud_functions.artist_song import *
 from .crud_functions.song import *
 from .crud_functions.song_playlist import *
-from .crud_functions.playlist import *
\ No newline at end of file
+from .crud_functions.playlist import *
+from .crud_functions.purge import *
\ No newline at end of file
@@ -1,7 +1,8 @@
-from typing import List
+from typing import List, Optional, Tuple
 from sqlalchemy.orm import Session
 
-from ..crud_functions.utils import get_full_song_title
+from ..crud_functions.utils import create_named_items, get_full_song_titles, merge_named_items, rename_named_items
+from ..crud_functions.vocabulary import get_item_by_name, invalidate_vocabulary
 
 from .. import models, schemas, crud
 
@@ -27,6 +28,35 @@ def get_artist_artist_song_objects(db: Session, artist: models.Artist) -> List[m
     artist_song_items = db.query(models.ArtistSong).filter(models.ArtistSong.artist_id == artist.id).all()
     return artist_song_items
 
+def get_artist_song_objects(db: Session, artist: models.Artist, current_user: schemas.User, skip: Optional[int] = None, max: Optional[int] = None) -> List[models.Song]:
+    """
+
+    Retrieve the Song objects associated to an Artist object, using a single query.
+
+    Args:
+        db (Session): The session used to access the database.
+        artist (models.Artist): The provided Artist object.
+        current_user (schemas.User): The user who's music library we're working in.
+        skip (Optional[int]): If provided, represents the number of songs to skip.
+        max (Optional[int]): if provided, represents the maximum number of songs to return.
+
+    Returns:
+        List[models.Song]: The retrieved Song objects.
+    """
+    if artist is None:
+        return None
+    songs = db.query(models.Song) \
+        .join(models.ArtistSong, models.ArtistSong.song_id == models.Song.id) \
+        .filter(models.ArtistSong.artist_id == artist.id) \
+        .filter(models.Song.user_id == current_user.id) \
+        .distinct() \
+        .order_by(models.Song.id)
+    if skip is not None:
+        songs = songs.offset(skip)
+    if max is not None:
+        songs = songs.limit(max)
+    return songs.all()
+
 def get_artist_songs(db: Session, artist: models.Artist, current_user: schemas.User) -> List[str]:
     """
 
@@ -42,10 +72,9 @@ def get_artist_songs(db: Session, artist: models.Artist, current_user: schemas.U
     """
     if artist is None:
         return None
-    artist_song_items = get_artist_artist_song_objects(db, artist)
-    song_ids = [artist_song_item.song_id for artist_song_item in artist_song_items]
-    db_songs = [crud.get_song_by_id(db, song_id, current_user) for song_id in song_ids]
-    return [get_full_song_title(db, db_song) for db_song in db_songs]
+    db_songs = get_artist_song_objects(db, artist, current_user)
+    full_titles = get_full_song_titles(db, [db_song.id for db_song in db_songs])
+    return [full_titles[db_song.id] for db_song in db_songs if db_song.id in full_titles]
 
 
 def get_artist_by_id(db: Session, id: int, current_user: schemas.User) -> models.Artist:
@@ -76,7 +105,8 @@ def get_artist_by_name(db: Session, name: str, current_user: schemas.User) -> mo
     Returns:
         models.Artist: The retrieved Artist object (if found), None (if not found).
     """
-    return db.query(models.Artist).filter(models.Artist.user_id == current_user.id).filter(models.Artist.name == name).first()
+    # name -> id lookups go through the vocabulary cache, see vocabulary.py
+    return get_item_by_name(db, models.Artist, name, current_user)
 
 def get_all_artists(db: Session, current_user: schemas.User) -> List[models.Artist]:
     """
@@ -90,7 +120,7 @@ def get_all_artists(db: Session, current_user: schemas.User) -> List[models.Arti
     Returns:
         List[models.Artist]: The list of objects.
     """
-    return db.query(models.Artist).filter(models.Artist.user_id == current_user.id).all()
+    return db.query(models.Artist).filter(models.Artist.user_id == current_user.id).order_by(models.Artist.id).all()
 
 
 def create_artist(db: Session, artist: schemas.ArtistCreate, current_user: schemas.User) -> models.Artist:
@@ -110,9 +140,103 @@ def create_artist(db: Session, artist: schemas.ArtistCreate, current_user: schem
     db_artist = models.Artist(**new_artist_dict)
     db.add(db_artist)
     db.commit()
-    db.refresh(db_artist)
+    invalidate_vocabulary(db, models.Artist, current_user.id)
     return db_artist
 
+# create many Artist objects at once
+# used by the bulk POST API endpoint for Artist objects
+
+def create_artists(db: Session, artists: List[schemas.ArtistCreate], current_user: schemas.User) -> Tuple[List[models.Artist], List[str]]:
+    """
+
+    Create many Artist objects in the database, using a single INSERT statement.
+
+    Args:
+        db (Session): The session used to access the database.
+        artists (List[schemas.ArtistCreate]): The objects to be created.
+        current_user (schemas.User): The user who's music library we're working in.
+
+    Returns:
+        Tuple[List[models.Artist], List[str]]: The newly created objects, and the names that were already in use.
+    """
+    created, conflicts = create_named_items(db, models.Artist, [artist.name for artist in artists], current_user.id)
+    db.commit()
+    if len(created) != 0:
+        invalidate_vocabulary(db, models.Artist, current_user.id)
+    return created, conflicts
+
+# used to make sure that merging two artists doesn't create duplicate songs
+
+def get_artist_merge_conflicts(db: Session, db_artist: models.Artist, db_target: models.Artist) -> List[str]:
+    """
+
+    Find the songs of an Artist object that have the same title as one of the target's songs.
+    Once the artists are merged, these songs would have the same full title (artist + title).
+
+    Args:
+        db (Session): The session used to access the database.
+        db_artist (models.Artist): The Artist object to be merged.
+        db_target (models.Artist): The Artist object it's merged into.
+
+    Returns:
+        List[str]: The titles shared by songs of both artists.
+    """
+    target_song_ids = db.query(models.ArtistSong.song_id).filter(models.ArtistSong.artist_id == db_target.id)
+    target_titles = db.query(models.Song.title).filter(models.Song.id.in_(target_song_ids.statement))
+    rows = db.query(models.Song.title) \
+        .join(models.ArtistSong, models.ArtistSong.song_id == models.Song.id) \
+        .filter(models.ArtistSong.artist_id == db_artist.id) \
+        .filter(~models.Song.id.in_(target_song_ids.statement)) \
+        .filter(models.Song.title.in_(target_titles.statement)) \
+        .order_by(models.Song.id) \
+        .all()
+    return [song_title for song_title, in rows]
+
+# merge an Artist object into another one
+# used by the merge API endpoint for Artist objects
+
+def merge_artists(db: Session, db_artist: models.Artist, db_target: models.Artist, current_user: schemas.User) -> models.Artist:
+    """
+
+    Merge a Artist object into another one, in a single transaction.
+    The items associated to the artist are associated to the target instead, then the artist is deleted.
+
+    Args:
+        db (Session): The session used to access the database.
+        db_artist (models.Artist): The Artist object to be merged (and deleted).
+        db_target (models.Artist): The Artist object it's merged into.
+        current_user (schemas.User): The user who's music library we're working in.
+
+    Returns:
+        models.Artist: The target object.
+    """
+    merge_named_items(db, models.Artist, [(models.ArtistSong, "artist_id", "song_id")], db_artist.id, db_target.id)
+    db.commit()
+    invalidate_vocabulary(db, models.Artist, current_user.id)
+    return db_target
+
+# rename many Artist objects at once
+# used by the bulk rename API endpoint for Artist objects
+
+def rename_artists(db: Session, renames: List[schemas.ArtistRename], current_user: schemas.User) -> Tuple[List[models.Artist], List[str], List[str]]:
+    """
+
+    Rename many Artist objects, using a single UPDATE statement.
+
+    Args:
+        db (Session): The session used to access the database.
+        renames (List[schemas.ArtistRename]): The current & new name of each object.
+        current_user (schemas.User): The user who's music library we're working in.
+
+    Returns:
+        Tuple[List[models.Artist], List[str], List[str]]: The renamed objects, the names that don't exist, and the new names that are already in use.
+    """
+    renamed, not_found, conflicts = rename_named_items(db, models.Artist, [(artist.name, artist.new_name) for artist in renames], current_user.id)
+    db.commit()
+    if len(renamed) != 0:
+        invalidate_vocabulary(db, models.Artist, current_user.id)
+    return renamed, not_found, conflicts
+
 def delete_artist_from_db(db: Session, name: str, current_user: schemas.User) -> models.Artist:
     """
 
@@ -127,13 +251,13 @@ def delete_artist_from_db(db: Session, name: str, current_user: schemas.User) ->
         models.Artist: The deleted object.
     """
     artist = get_artist_by_name(db, name, current_user)
-    # dissociate the Artist object from all the ArtistSong
-    # & ArtistPlaylist it was associated to
-    association_items = get_artist_artist_song_objects(db, artist)
-    for item in association_items:
-        crud.delete_artist_song_from_db(db, item.id)
-    db.delete(artist)
+    # dissociate the Artist object from all the ArtistSong objects it was associated to
+    # --> a single DELETE statement, no matter how many there are
+    db.query(models.ArtistSong).filter(models.ArtistSong.artist_id == artist.id).delete(synchronize_session=False)
+    # "evaluate" also removes the object from the session
+    db.query(models.Artist).filter(models.Artist.id == artist.id).delete(synchronize_session="evaluate")
     db.commit()
+    invalidate_vocabulary(db, models.Artist, current_user.id)
     return artist
 
 
@@ -156,5 +280,5 @@ def update_artist(db: Session, name: str, artist: schemas.ArtistUpdate, current_
     db_artist.name = artist.new_name
     db.add(db_artist)
     db.commit()
-    db.refresh(db_artist)
+    invalidate_vocabulary(db, models.Artist, current_user.id)
     return db_artist
\ No newline at end of file
@@ -7,6 +7,9 @@ from .. import models, schemas
 # checks for appropriate permissions aren't performed here
 # rather, they're performed in the files calling the following functions
 
+# these functions only flush their changes, they don't commit them
+# --> the function handling the whole operation (creating a song, updating a playlist, ...) commits once, at the end
+
 def get_artist_song_by_id(db: Session, id: int) -> models.ArtistSong:
     """
 
@@ -64,8 +67,8 @@ def create_artist_song(db: Session, artist_song: schemas.ArtistSongCreate) -> mo
     """
     db_artist_song = models.ArtistSong(**artist_song.dict())
     db.add(db_artist_song)
-    db.commit()
-    db.refresh(db_artist_song)
+    # the ID is sent back by the INSERT statement, no need to refresh the object
+    db.flush()
     return db_artist_song
 
 def delete_artist_song_from_db(db: Session, id: int) -> models.ArtistSong:
@@ -82,7 +85,7 @@ def delete_artist_song_from_db(db: Session, id: int) -> models.ArtistSong:
     """
     artist_song = get_artist_song_by_id(db, id)
     db.delete(artist_song)
-    db.commit()
+    db.flush()
     return artist_song
 
 
@@ -106,6 +109,5 @@ def update_artist_song(db: Session, id: int, artist_song: schemas.ArtistSongUpda
     if artist_song.artist_id is not None:
         db_artist_song.artist_id = artist_song.artist_id
     db.add(db_artist_song)
-    db.commit()
-    db.refresh(db_artist_song)
+    db.flush()
     return db_artist_song
\ No newline at end of file
@@ -1,7 +1,8 @@
-from typing import List
-from sqlalchemy.orm import Session
+from typing import List, Optional, Tuple
+from sqlalchemy.orm import Query, Session
 
-from ..crud_functions.utils import get_full_song_title
+from ..crud_functions.utils import associate_item_to_songs, create_named_items, dissociate_item_from_songs, get_full_song_titles, merge_named_items, rename_named_items
+from ..crud_functions.vocabulary import get_item_by_name, invalidate_vocabulary
 
 from .. import models, schemas, crud
 
@@ -27,6 +28,35 @@ def get_genre_genre_song_objects(db: Session, genre: models.Genre) -> List[model
     genre_song_items = db.query(models.GenreSong).filter(models.GenreSong.genre_id == genre.id).all()
     return genre_song_items
 
+def get_genre_song_objects(db: Session, genre: models.Genre, current_user: schemas.User, skip: Optional[int] = None, max: Optional[int] = None) -> List[models.Song]:
+    """
+
+    Retrieve the Song objects associated to a Genre object, using a single query.
+
+    Args:
+        db (Session): The session used to access the database.
+        genre (models.Genre): The provided Genre object.
+        current_user (schemas.User): The user who's music library we're working in.
+        skip (Optional[int]): If provided, represents the number of songs to skip.
+        max (Optional[int]): if provided, represents the maximum number of songs to return.
+
+    Returns:
+        List[models.Song]: The retrieved Song objects.
+    """
+    if genre is None:
+        return None
+    songs = db.query(models.Song) \
+        .join(models.GenreSong, models.GenreSong.song_id == models.Song.id) \
+        .filter(models.GenreSong.genre_id == genre.id) \
+        .filter(models.Song.user_id == current_user.id) \
+        .distinct() \
+        .order_by(models.Song.id)
+    if skip is not None:
+        songs = songs.offset(skip)
+    if max is not None:
+        songs = songs.limit(max)
+    return songs.all()
+
 def get_genre_songs(db: Session, genre: models.Genre, current_user: schemas.User) -> List[str]:
     """
 
@@ -42,10 +72,9 @@ def get_genre_songs(db: Session, genre: models.Genre, current_user: schemas.User
     """
     if genre is None:
         return None
-    genre_song_items = get_genre_genre_song_objects(db, genre)
-    song_ids = [genre_song_item.song_id for genre_song_item in genre_song_items]
-    db_songs = [crud.get_song_by_id(db, song_id, current_user) for song_id in song_ids]
-    return [get_full_song_title(db, db_song) for db_song in db_songs]
+    db_songs = get_genre_song_objects(db, genre, current_user)
+    full_titles = get_full_song_titles(db, [db_song.id for db_song in db_songs])
+    return [full_titles[db_song.id] for db_song in db_songs if db_song.id in full_titles]
 
 
 def get_genre_by_id(db: Session, id: int, current_user: schemas.User) -> models.Genre:
@@ -76,7 +105,8 @@ def get_genre_by_name(db: Session, name: str, current_user: schemas.User) -> mod
     Returns:
         models.Genre: The retrieved Genre object (if found), None (if not found).
     """
-    return db.query(models.Genre).filter(models.Genre.user_id == current_user.id).filter(models.Genre.name == name).first()
+    # name -> id lookups go through the vocabulary cache, see vocabulary.py
+    return get_item_by_name(db, models.Genre, name, current_user)
 
 def get_all_genres(db: Session, current_user: schemas.User) -> List[models.Genre]:
     """
@@ -90,7 +120,7 @@ def get_all_genres(db: Session, current_user: schemas.User) -> List[models.Genre
     Returns:
         List[models.Genre]: The list of objects.
     """
-    return db.query(models.Genre).filter(models.Genre.user_id == current_user.id).all()
+    return db.query(models.Genre).filter(models.Genre.user_id == current_user.id).order_by(models.Genre.id).all()
 
 
 def create_genre(db: Session, genre: schemas.GenreCreate, current_user: schemas.User) -> models.Genre:
@@ -110,9 +140,116 @@ def create_genre(db: Session, genre: schemas.GenreCreate, current_user: schemas.
     db_genre = models.Genre(**new_genre_dict)
     db.add(db_genre)
     db.commit()
-    db.refresh(db_genre)
+    invalidate_vocabulary(db, models.Genre, current_user.id)
     return db_genre
 
+# create many Genre objects at once
+# used by the bulk POST API endpoint for Genre objects
+
+def create_genres(db: Session, genres: List[schemas.GenreCreate], current_user: schemas.User) -> Tuple[List[models.Genre], List[str]]:
+    """
+
+    Create many Genre objects in the database, using a single INSERT statement.
+
+    Args:
+        db (Session): The session used to access the database.
+        genres (List[schemas.GenreCreate]): The objects to be created.
+        current_user (schemas.User): The user who's music library we're working in.
+
+    Returns:
+        Tuple[List[models.Genre], List[str]]: The newly created objects, and the names that were already in use.
+    """
+    created, conflicts = create_named_items(db, models.Genre, [genre.name for genre in genres], current_user.id)
+    db.commit()
+    if len(created) != 0:
+        invalidate_vocabulary(db, models.Genre, current_user.id)
+    return created, conflicts
+
+# associate a Genre object to many Song objects at once
+# used by the bulk POST API endpoint for the songs of a Genre object
+
+def add_genre_to_songs(db: Session, db_genre: models.Genre, songs: Query) -> int:
+    """
+
+    Associate a Genre object to all the Song objects selected by a query, using a single INSERT ... SELECT statement.
+
+    Args:
+        db (Session): The session used to access the database.
+        db_genre (models.Genre): The Genre object to be associated to the songs.
+        songs (Query): Selects the Song objects.
+
+    Returns:
+        int: The number of songs the genre was added to (the songs that already had it aren't counted).
+    """
+    nb_affected = associate_item_to_songs(db, models.GenreSong, "genre_id", db_genre.id, songs)
+    db.commit()
+    return nb_affected
+
+# dissociate a Genre object from many Song objects at once
+# used by the bulk DELETE API endpoint for the songs of a Genre object
+
+def remove_genre_from_songs(db: Session, db_genre: models.Genre, songs: Query) -> int:
+    """
+
+    Dissociate a Genre object from all the Song objects selected by a query, using a single DELETE statement.
+
+    Args:
+        db (Session): The session used to access the database.
+        db_genre (models.Genre): The Genre object to be dissociated from the songs.
+        songs (Query): Selects the Song objects.
+
+    Returns:
+        int: The number of songs the genre was removed from.
+    """
+    nb_affected = dissociate_item_from_songs(db, models.GenreSong, "genre_id", db_genre.id, songs)
+    db.commit()
+    return nb_affected
+
+# merge a Genre object into another one
+# used by the merge API endpoint for Genre objects
+
+def merge_genres(db: Session, db_genre: models.Genre, db_target: models.Genre, current_user: schemas.User) -> models.Genre:
+    """
+
+    Merge a Genre object into another one, in a single transaction.
+    The items associated to the genre are associated to the target instead, then the genre is deleted.
+
+    Args:
+        db (Session): The session used to access the database.
+        db_genre (models.Genre): The Genre object to be merged (and deleted).
+        db_target (models.Genre): The Genre object it's merged into.
+        current_user (schemas.User): The user who's music library we're working in.
+
+    Returns:
+        models.Genre: The target object.
+    """
+    merge_named_items(db, models.Genre, [(models.GenreSong, "genre_id", "song_id")], db_genre.id, db_target.id)
+    db.commit()
+    invalidate_vocabulary(db, models.Genre, current_user.id)
+    return db_target
+
+# rename many Genre objects at once
+# used by the bulk rename API endpoint for Genre objects
+
+def rename_genres(db: Session, renames: List[schemas.GenreRename], current_user: schemas.User) -> Tuple[List[models.Genre], List[str], List[str]]:
+    """
+
+    Rename many Genre objects, using a single UPDATE statement.
+
+    Args:
+        db (Session): The session used to access the database.
+        renames (List[schemas.GenreRename]): The current & new name of each object.
+        current_user (schemas.User): The user who's music library we're working in.
+
+    Returns:
+        Tuple[List[models.Genre], List[str], List[str]]: The renamed objects, the names that don't exist, and the new names that are already in use.
+    """
+    renamed, not_found, conflicts = rename_named_items(db, models.Genre, [(genre.name, genre.new_name) for genre in renames], current_user.id)
+    db.commit()
+    if len(renamed) != 0:
+        invalidate_vocabulary(db, models.Genre, current_user.id)
+    return renamed, not_found, conflicts
+
 def delete_genre_from_db(db: Session, name: str, current_user: schemas.User) -> models.Genre:
     """
 
@@ -127,13 +264,13 @@ def delete_genre_from_db(db: Session, name: str, current_user: schemas.User) ->
         models.Genre: The deleted object.
     """
     genre = get_genre_by_name(db, name, current_user)
-    # dissociate the Genre object from all the GenreSong
-    # & GenrePlaylist it was associated to
-    association_items = get_genre_genre_song_objects(db, genre)
-    for item in association_items:
-        crud.delete_genre_song_from_db(db, item.id)
-    db.delete(genre)
+    # dissociate the Genre object from all the GenreSong objects it was associated to
+    # --> a single DELETE statement, no matter how many there are
+    db.query(models.GenreSong).filter(models.GenreSong.genre_id == genre.id).delete(synchronize_session=False)
+    # "evaluate" also removes the object from the session
+    db.query(models.Genre).filter(models.Genre.id == genre.id).delete(synchronize_session="evaluate")
     db.commit()
+    invalidate_vocabulary(db, models.Genre, current_user.id)
     return genre
 
 
@@ -156,5 +293,5 @@ def update_genre(db: Session, name: str, genre: schemas.GenreUpdate, current_use
     db_genre.name = genre.new_name
     db.add(db_genre)
     db.commit()
-    db.refresh(db_genre)
+    invalidate_vocabulary(db, models.Genre, current_user.id)
     return db_genre
\ No newline at end of file
@@ -7,6 +7,9 @@ from .. import models, schemas
 # checks for appropriate permissions aren't performed here
 # rather, they're performed in the files calling the following functions
 
+# these functions only flush their changes, they don't commit them
+# --> the function handling the whole operation (creating a song, updating a playlist, ...) commits once, at the end
+
 def get_genre_song_by_id(db: Session, id: int) -> models.GenreSong:
     """
 
@@ -64,8 +67,8 @@ def create_genre_song(db: Session, genre_song: schemas.GenreSongCreate) -> model
     """
     db_genre_song = models.GenreSong(**genre_song.dict())
     db.add(db_genre_song)
-    db.commit()
-    db.refresh(db_genre_song)
+    # the ID is sent back by the INSERT statement, no need to refresh the object
+    db.flush()
     return db_genre_song
 
 def delete_genre_song_from_db(db: Session, id: int) -> models.GenreSong:
@@ -82,7 +85,7 @@ def delete_genre_song_from_db(db: Session, id: int) -> models.GenreSong:
     """
     genre_song = get_genre_song_by_id(db, id)
     db.delete(genre_song)
-    db.commit()
+    db.flush()
     return genre_song
 
 
@@ -106,6 +109,5 @@ def update_genre_song(db: Session, id: int, genre_song: schemas.GenreSongUpdate)
     if genre_song.genre_id is not None:
         db_genre_song.genre_id = genre_song.genre_id
     db.add(db_genre_song)
-    db.commit()
-    db.refresh(db_genre_song)
+    db.flush()
     return db_genre_song
\ No newline at end of file
@@ -1,9 +1,10 @@
 
-from typing import List
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import insert
 from sqlalchemy.orm import Session
 
-from ..crud_functions.song import get_song_by_title
-from ..crud_functions.utils import get_full_song_title, unpack_full_song_title
+from ..crud_functions.song import get_songs_by_titles
+from ..crud_functions.utils import create_named_items, get_full_song_titles, get_item_ids_by_names, remove_duplicates, split_in_chunks, unpack_full_song_title, update_associations
 
 from .. import crud
 from ..crud_functions.artist import get_artist_by_name
@@ -35,7 +36,7 @@ def get_playlist_song_objects(db: Session, playlist: models.Playlist) -> List[mo
         return None
     song_playlist_items = db.query(models.SongPlaylist).filter(models.SongPlaylist.playlist_id == playlist.id).all()
     song_playlist_ids = [song_playlist_item.song_id for song_playlist_item in song_playlist_items]
-    playlist_songs = db.query(models.Song).filter(models.Song.id.in_(song_playlist_ids)).all()
+    playlist_songs = db.query(models.Song).filter(models.Song.id.in_(song_playlist_ids)).order_by(models.Song.id).all()
     return playlist_songs
 
 def get_playlist_songs(db: Session, playlist: models.Playlist) -> List[str]:
@@ -52,8 +53,7 @@ def get_playlist_songs(db: Session, playlist: models.Playlist) -> List[str]:
     """
     if playlist is None:
         return None
-    playlist_songs = get_playlist_song_objects(db, playlist)
-    return [get_full_song_title(db, playlist_song) for playlist_song in playlist_songs]
+    return get_playlists_songs(db, [playlist])[playlist.id]
 
 
 
@@ -73,7 +73,7 @@ def get_playlist_tag_objects(db: Session, playlist: models.Playlist) -> List[mod
         return None
     tag_playlist_items = db.query(models.TagPlaylist).filter(models.TagPlaylist.playlist_id == playlist.id).all()
     tag_playlist_ids = [tag_playlist_item.tag_id for tag_playlist_item in tag_playlist_items]
-    playlist_tags = db.query(models.Tag).filter(models.Tag.id.in_(tag_playlist_ids)).all()
+    playlist_tags = db.query(models.Tag).filter(models.Tag.id.in_(tag_playlist_ids)).order_by(models.Tag.id).all()
     return playlist_tags
 
 def get_playlist_tags(db: Session, playlist: models.Playlist) -> List[str]:
@@ -95,6 +95,105 @@ def get_playlist_tags(db: Session, playlist: models.Playlist) -> List[str]:
 
 
 
+# batched versions of the getters above
+# used to build the response for a whole list of Playlist objects at once
+# --> a fixed number of queries, no matter how many playlists are in the list
+
+def get_playlists_songs(db: Session, playlists: List[models.Playlist]) -> Dict[int, List[str]]:
+    """
+
+    Retrieve the Song objects associated to each Playlist object of a list.
+
+    Args:
+        db (Session): The session used to access the database.
+        playlists (List[models.Playlist]): The provided Playlist objects.
+
+    Returns:
+        Dict[int, List[str]]: The full title of the retrieved Song objects, for each Playlist ID.
+    """
+    playlist_ids = [playlist.id for playlist in playlists]
+    songs = { playlist_id: [] for playlist_id in playlist_ids }
+    if len(playlist_ids) == 0:
+        return songs
+    # all the rows of a playlist are in the same chunk, so their order is kept
+    song_playlist_items = []
+    for chunk in split_in_chunks(playlist_ids):
+        song_playlist_items += db.query(models.SongPlaylist.playlist_id, models.SongPlaylist.song_id) \
+            .filter(models.SongPlaylist.playlist_id.in_(chunk)) \
+            .order_by(models.SongPlaylist.song_id) \
+            .all()
+    full_titles = get_full_song_titles(db, [song_id for _, song_id in song_playlist_items])
+    seen = set()
+    for playlist_id, song_id in song_playlist_items:
+        full_title = full_titles.get(song_id)
+        if full_title is not None and (playlist_id, full_title) not in seen:
+            seen.add((playlist_id, full_title))
+            songs[playlist_id].append(full_title)
+    return songs
+
+def get_playlists_tags(db: Session, playlists: List[models.Playlist]) -> Dict[int, List[str]]:
+    """
+
+    Retrieve the Tag objects associated to each Playlist object of a list, using a single query (per chunk of MAX_IN_VALUES playlists).
+
+    Args:
+        db (Session): The session used to access the database.
+        playlists (List[models.Playlist]): The provided Playlist objects.
+
+    Returns:
+        Dict[int, List[str]]: The names of the retrieved Tag objects, for each Playlist ID.
+    """
+    playlist_ids = [playlist.id for playlist in playlists]
+    tags = { playlist_id: [] for playlist_id in playlist_ids }
+    if len(playlist_ids) == 0:
+        return tags
+    seen = set()
+    for chunk in split_in_chunks(playlist_ids):
+        rows = db.query(models.TagPlaylist.playlist_id, models.Tag.name) \
+            .join(models.Tag, models.Tag.id == models.TagPlaylist.tag_id) \
+            .filter(models.TagPlaylist.playlist_id.in_(chunk)) \
+            .order_by(models.Tag.id) \
+            .all()
+        for playlist_id, name in rows:
+            if (playlist_id, name) not in seen:
+                seen.add((playlist_id, name))
+                tags[playlist_id].append(name)
+    return tags
+
+def get_playlists_data(db: Session, playlists: List[models.Playlist]) -> List[dict]:
+    """
+
+    Build the data sent back to the client for a list of Playlist objects,
+    along with their associated Song and Tag objects.
+
+    Args:
+        db (Session): The session used to access the database.
+        playlists (List[models.Playlist]): The provided Playlist objects.
+
+    Returns:
+        List[dict]: The data for each Playlist object, in the same order.
+    """
+    tags = get_playlists_tags(db, playlists)
+    songs = get_playlists_songs(db, playlists)
+    return [{**playlist.__dict__, "tags": tags[playlist.id], "songs": songs[playlist.id]} for playlist in playlists]
+
+def get_playlist_data(db: Session, playlist: models.Playlist) -> dict:
+    """
+
+    Build the data sent back to the client for a Playlist object,
+    along with its associated Song and Tag objects.
+
+    Args:
+        db (Session): The session used to access the database.
+        playlist (models.Playlist): The provided Playlist object.
+
+    Returns:
+        dict: The data for the Playlist object.
+    """
+    return get_playlists_data(db, [playlist])[0]
+
+
+
 def get_playlist_by_id(db: Session, playlist_id: int, current_user: schemas.User) -> models.Playlist:
     """
 
@@ -138,10 +237,39 @@ def get_playlists_from_db(db: Session, max: int, current_user: schemas.User) ->
     Returns:
         List[models.Playlist]: The list of Playlist objects retrieved from the database.
     """
-    nb_playlists = len(get_all_playlists(db, current_user))
-    if max >= nb_playlists:
-        return get_all_playlists(db, current_user)
-    return db.query(models.Playlist).filter(models.Playlist.user_id == current_user.id).offset(nb_playlists - max).all()
+    # only read the 'max' most recent playlists
+    # then put them back in insertion order
+    db_playlists = db.query(models.Playlist) \
+        .filter(models.Playlist.user_id == current_user.id) \
+        .order_by(models.Playlist.id.desc()) \
+        .limit(max) \
+        .all()
+    return db_playlists[::-1]
+
+
+def get_playlists_page(db: Session, max: int, current_user: schemas.User, cursor: Optional[int] = None) -> Tuple[List[models.Playlist], Optional[int]]:
+    """
+
+    Get a page of Playlist objects, using keyset pagination on the playlists' IDs.
+
+    Args:
+        db (Session): The session used to access the database.
+        max (int): The maximum number of playlists to return.
+        current_user (schemas.User): The user who's playlist library we're working in.
+        cursor (Optional[int]): If provided, only the playlists coming after the playlist with this ID are returned.
+
+    Returns:
+        Tuple[List[models.Playlist], Optional[int]]: The Playlist objects, and the cursor to use to get the next page (None if this is the last page).
+    """
+    playlists = db.query(models.Playlist).filter(models.Playlist.user_id == current_user.id)
+    if cursor is not None:
+        playlists = playlists.filter(models.Playlist.id > cursor)
+    # fetch one more playlist than requested to know whether there's a next page
+    db_playlists = playlists.order_by(models.Playlist.id).limit(max + 1).all()
+    if len(db_playlists) <= max:
+        return db_playlists, None
+    db_playlists = db_playlists[:max]
+    return db_playlists, db_playlists[-1].id
 
 
 def get_all_playlists(db: Session, current_user: schemas.User) -> List[models.Playlist]:
@@ -156,7 +284,7 @@ def get_all_playlists(db: Session, current_user: schemas.User) -> List[models.Pl
     Returns:
         List[models.Playlist]: The list of Playlist objects retrieved from the database.
     """
-    return db.query(models.Playlist).filter(models.Playlist.user_id == current_user.id).all()
+    return db.query(models.Playlist).filter(models.Playlist.user_id == current_user.id).order_by(models.Playlist.id).all()
 
 
 def create_playlist(db: Session, new_playlist: schemas.PlaylistCreate, current_user: schemas.User) -> models.Playlist:
@@ -174,8 +302,8 @@ def create_playlist(db: Session, new_playlist: schemas.PlaylistCreate, current_u
     """
     new_playlist_dict = new_playlist.dict()
     new_playlist_dict["user_id"] = current_user.id
-    tags = new_playlist_dict.pop("tags")
-    songs = new_playlist_dict.pop("songs")
+    tags = remove_duplicates(new_playlist_dict.pop("tags"))
+    songs = remove_duplicates(new_playlist_dict.pop("songs"))
     # make sure all the tags listed do exist in the database
     if tags is not None:
         for tag in tags:
@@ -183,16 +311,17 @@ def create_playlist(db: Session, new_playlist: schemas.PlaylistCreate, current_u
             if not db_tag:
                 raise_http_404(f"Cannot add playlist '{new_playlist.name}' to the library because tag '{tag}' does not exist.")
     # make sure all the songs listed do exist in the database
+    # (all of them are looked up at once)
     if songs is not None:
-        for full_song_title in songs:
-            artist, song_title = unpack_full_song_title(full_song_title)
-            db_song = get_song_by_title(db, artist, song_title, current_user)
-            if not db_song:
+        full_titles = [tuple(unpack_full_song_title(full_song_title)) for full_song_title in songs]
+        db_songs = get_songs_by_titles(db, full_titles, current_user)
+        for full_song_title, full_title in zip(songs, full_titles):
+            if full_title not in db_songs:
                 raise_http_404(f"Cannot add playlist '{new_playlist.name}' to the library because song '{full_song_title}' does not exist.")
     db_playlist = models.Playlist(**new_playlist_dict)
     db.add(db_playlist)
-    db.commit()
-    db.refresh(db_playlist)
+    # get the playlist's ID, the associations below need it
+    db.flush()
     # associate the newly created Playlist object to the provided Tag objects
     if tags is not None:
         for tag in tags:
@@ -201,14 +330,72 @@ def create_playlist(db: Session, new_playlist: schemas.PlaylistCreate, current_u
             crud.create_tag_playlist(db, tag_playlist_item)
     # associate the newly created Playlist object to the provided Song objects
     if songs is not None:
-        for full_song_title in songs:
-            artist, song_title = unpack_full_song_title(full_song_title)
-            db_song = get_song_by_title(db, artist, song_title, current_user)
-            song_playlist_item = schemas.SongPlaylistCreate(playlist_id=db_playlist.id, song_id=db_song.id)
+        # a song listed under several of its artists is only added once
+        for song_id in remove_duplicates([db_songs[full_title].id for full_title in full_titles]):
+            song_playlist_item = schemas.SongPlaylistCreate(playlist_id=db_playlist.id, song_id=song_id)
             crud.create_song_playlist(db, song_playlist_item)
+    # everything is committed at once
+    db.commit()
     return db_playlist
 
 
+# create many Playlist objects at once
+# used by the bulk POST API endpoint for Playlist objects
+
+def create_playlists(db: Session, new_playlists: List[schemas.PlaylistCreate], current_user: schemas.User) -> Tuple[List[models.Playlist], List[str]]:
+    """
+
+    Create many Playlist objects in the database, in a single transaction.
+
+    Args:
+        db (Session): The session used to access the database.
+        new_playlists (List[schemas.PlaylistCreate]): The Playlist objects to be inserted into the database.
+        current_user (schemas.User): The user who's music library we're working in.
+
+    Raises:
+        HTTPException: Raise a "404 NOT FOUND" error if one of the Tag or Song objects can't be found (nothing is created).
+
+    Returns:
+        Tuple[List[models.Playlist], List[str]]: The newly created Playlist objects, and the names that were already in use.
+    """
+    # make sure all the tags & songs listed do exist in the database
+    # (all of them are looked up at once)
+    tag_ids = get_item_ids_by_names(db, models.Tag, [tag for playlist in new_playlists for tag in playlist.tags or []], current_user.id)
+    full_titles = {
+        full_song_title: tuple(unpack_full_song_title(full_song_title))
+        for playlist in new_playlists for full_song_title in playlist.songs or []
+    }
+    db_songs = get_songs_by_titles(db, list(full_titles.values()), current_user)
+    for playlist in new_playlists:
+        for tag in playlist.tags or []:
+            if tag not in tag_ids:
+                raise_http_404(f"Cannot add playlist '{playlist.name}' to the library because tag '{tag}' does not exist.")
+        for full_song_title in playlist.songs or []:
+            if full_titles[full_song_title] not in db_songs:
+                raise_http_404(f"Cannot add playlist '{playlist.name}' to the library because song '{full_song_title}' does not exist.")
+    created, conflicts = create_named_items(db, models.Playlist, [playlist.name for playlist in new_playlists], current_user.id)
+    # associate each new Playlist object to its Tag & Song objects
+    # with one multi-row INSERT per table
+    created_by_name = { db_playlist.name: db_playlist for db_playlist in created }
+    tag_playlists = []
+    song_playlists = []
+    for playlist in new_playlists:
+        # when a name is listed twice, only the first playlist is created
+        db_playlist = created_by_name.pop(playlist.name, None)
+        if db_playlist is None:
+            continue
+        for tag in remove_duplicates(playlist.tags) or []:
+            tag_playlists.append({"tag_id": tag_ids[tag], "playlist_id": db_playlist.id})
+        song_ids = [db_songs[full_titles[full_song_title]].id for full_song_title in playlist.songs or []]
+        for song_id in remove_duplicates(song_ids):
+            song_playlists.append({"song_id": song_id, "playlist_id": db_playlist.id})
+    for model, rows in [(models.TagPlaylist, tag_playlists), (models.SongPlaylist, song_playlists)]:
+        if len(rows) != 0:
+            db.execute(insert(model), rows)
+    db.commit()
+    return created, conflicts
+
+
 def delete_playlist(db: Session, name: str, current_user: schemas.User) -> models.Playlist:
     """
 
@@ -225,16 +412,13 @@ def delete_playlist(db: Session, name: str, current_user: schemas.User) -> model
     db_playlist = get_playlist_by_name(db, name, current_user)
     if db_playlist is None:
         return None
-    # on delete, we need to delete all the SongPlaylist objects associated to this one
-    song_playlist_items = db.query(models.SongPlaylist).filter(models.SongPlaylist.playlist_id == db_playlist.id).all()
-    for song_playlist_item in song_playlist_items:
-        crud.delete_song_playlist_from_db(db, song_playlist_item.id)
-    # on delete, we need to delete all the TagPlaylist objects associated to this one
-    tag_playlist_items = db.query(models.TagPlaylist).filter(models.TagPlaylist.playlist_id == db_playlist.id).all()
-    for tag_playlist_item in tag_playlist_items:
-        crud.delete_tag_playlist_from_db(db, tag_playlist_item.id)
+    # on delete, we need to delete all the SongPlaylist & TagPlaylist objects associated to this one
+    # --> a single DELETE statement per table, no matter how many there are
+    for association_model in [models.SongPlaylist, models.TagPlaylist]:
+        db.query(association_model).filter(association_model.playlist_id == db_playlist.id).delete(synchronize_session=False)
     # now delete the Playlist object
-    db.delete(db_playlist)
+    # "evaluate" also removes the object from the session
+    db.query(models.Playlist).filter(models.Playlist.id == db_playlist.id).delete(synchronize_session="evaluate")
     db.commit()
     return db_playlist
 
@@ -262,29 +446,17 @@ def update_playlist_songs(db: Session, db_playlist: models.Playlist, playlist: s
     """
     if playlist.songs is None:
         return False
-    current_songs = get_playlist_songs(db, db_playlist)
-    # start with checking whether some songs were disassociated from the Playlist object
-    for full_song_title in current_songs:
-        if full_song_title not in playlist.songs:
-            # if a song's been removed
-            artist, song_title = unpack_full_song_title(full_song_title)
-            db_song = get_song_by_title(db, artist, song_title, current_user)
-            if db_song is not None:
-                song_playlist_item = crud.get_song_playlist_by_key(db, db_song.id, db_playlist.id)
-                if song_playlist_item is not None:
-                    crud.delete_song_playlist_from_db(db, song_playlist_item.id)
-    # now check if any song has been added
-    for full_song_title in playlist.songs:
-        if full_song_title not in current_songs:
-            # if a song's been added
-            # make sure it already exists in the database
-            artist, song_title = unpack_full_song_title(full_song_title)
-            db_song = get_song_by_title(db, artist, song_title, current_user)
-            if not db_song:
-                raise_http_404(f"Cannot add song '{full_song_title}' to playlist '{db_playlist.name}' because the song does not exist.")
-            # associate the song to the Playlist object
-            song_playlist_item = schemas.SongPlaylistCreate(playlist_id=db_playlist.id, song_id=db_song.id)
-            crud.create_song_playlist(db, song_playlist_item)
+    # resolve all the listed songs at once, and make sure they already exist in the database
+    new_songs = remove_duplicates(playlist.songs)
+    full_titles = { full_song_title: tuple(unpack_full_song_title(full_song_title)) for full_song_title in new_songs }
+    db_songs = get_songs_by_titles(db, list(full_titles.values()), current_user)
+    for full_song_title in new_songs:
+        if full_titles[full_song_title] not in db_songs:
+            raise_http_404(f"Cannot add song '{full_song_title}' to playlist '{db_playlist.name}' because the song does not exist.")
+    # the difference is computed on the song IDs
+    # (a song may be listed under any of its artists)
+    song_ids = [db_songs[full_titles[full_song_title]].id for full_song_title in new_songs]
+    update_associations(db, models.SongPlaylist, "playlist_id", db_playlist.id, "song_id", song_ids)
     return True
 
 
@@ -310,25 +482,13 @@ def update_playlist_tags(db: Session, db_playlist: models.Playlist, playlist: sc
     """
     if playlist.tags is None:
         return False
-    current_tags = get_playlist_tags(db, db_playlist)
-    # start with checking whether some tags were disassociated from the Playlist object
-    for current_tag in current_tags:
-        if current_tag not in playlist.tags:
-            # if a tag's been removed
-            db_tag = get_tag_by_name(db, current_tag, current_user)
-            tag_playlist_item = crud.get_tag_playlist_by_key(db, db_tag.id, db_playlist.id)
-            crud.delete_tag_playlist_from_db(db, tag_playlist_item.id)
-    # now check if any file has been added
-    for tag in playlist.tags:
-        if tag not in current_tags:
-            # if a tag's been added
-            # make sure it already exists in the database
-            db_tag = get_tag_by_name(db, tag, current_user)
-            if not db_tag:
-                raise_http_404(f"Cannot add tag '{tag}' to playlist '{db_playlist.name}' because the tag does not exist.")
-            # associate the tag to the Playlist object
-            tag_playlist_item = schemas.TagPlaylistCreate(playlist_id=db_playlist.id, tag_id=db_tag.id)
-            crud.create_tag_playlist(db, tag_playlist_item)
+    # look up all the tags at once, and make sure they already exist in the database
+    tag_ids = get_item_ids_by_names(db, models.Tag, playlist.tags, current_user.id)
+    for tag in remove_duplicates(playlist.tags):
+        if tag not in tag_ids:
+            raise_http_404(f"Cannot add tag '{tag}' to playlist '{db_playlist.name}' because the tag does not exist.")
+    # remove the tags that aren't listed anymore & associate the new ones
+    update_associations(db, models.TagPlaylist, "playlist_id", db_playlist.id, "tag_id", tag_ids.values())
     return True
 
 
@@ -369,5 +529,4 @@ def update_playlist(db: Session, name: str, playlist: schemas.PlaylistUpdate, cu
         db_playlist.name = playlist.new_name
     db.add(db_playlist)
     db.commit()
-    db.refresh(db_playlist)
     return db_playlist
@@ -0,0 +1,212 @@
+import os
+import threading
+import time
+import uuid
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Query, Session
+
+from ..cache import LRUCache
+from ..crud_functions.user import invalidate_user
+from ..crud_functions.vocabulary import invalidate_vocabulary
+
+from .. import models
+
+# this file implements the removal of a user's whole music library, once their account is deleted
+#
+# - the account is deactivated right away (the user can't log in or make changes anymore) & marked for deletion,
+#   then the purge runs in the background, after the response was sent
+# - rows are deleted in chunks of PURGE_CHUNK_SIZE, each chunk in its own transaction
+#   --> locks on the shared tables are only held for a short time
+# - the purge pauses for PURGE_PAUSE seconds between two chunks, to leave room for the other requests
+# - the progress of each purge is stored in memory, and can be polled using its job ID
+# - the users marked for deletion are only deleted once their purge is over
+#   --> the purges stopped by a restart are started again when the app starts (see resume_purges())
+
+
+PURGE_CHUNK_SIZE = int(os.environ.get("PURGE_CHUNK_SIZE", 500))
+
+PURGE_PAUSE = float(os.environ.get("PURGE_PAUSE", 0.05))
+
+# the jobs are kept until they're finished, then forgotten after a day
+
+active_purge_jobs: Dict[str, dict] = {}
+active_purge_jobs_lock = threading.Lock()
+
+purge_jobs = LRUCache(max_size=1024, ttl=24 * 60 * 60)
+
+
+# the queries selecting the rows to delete
+# association rows go first, since they reference the items
+
+def get_association_ids(model, column, owner_model) -> Callable[[Session, int], Query]:
+    return lambda db, user_id: (
+        db.query(model.id).join(owner_model, column == owner_model.id).filter(owner_model.user_id == user_id)
+    )
+
+
+def get_item_ids(model) -> Callable[[Session, int], Query]:
+    return lambda db, user_id: db.query(model.id).filter(model.user_id == user_id)
+
+
+PURGE_STEPS: List[Tuple[object, Callable[[Session, int], Query]]] = [
+    (models.TagSong, get_association_ids(models.TagSong, models.TagSong.tag_id, models.Tag)),
+    (models.TagPlaylist, get_association_ids(models.TagPlaylist, models.TagPlaylist.tag_id, models.Tag)),
+    (models.GenreSong, get_association_ids(models.GenreSong, models.GenreSong.genre_id, models.Genre)),
+    (models.ArtistSong, get_association_ids(models.ArtistSong, models.ArtistSong.artist_id, models.Artist)),
+    (models.SongPlaylist, get_association_ids(models.SongPlaylist, models.SongPlaylist.playlist_id, models.Playlist)),
+    (models.Song, get_item_ids(models.Song)),
+    (models.Playlist, get_item_ids(models.Playlist)),
+    (models.Tag, get_item_ids(models.Tag)),
+    (models.Genre, get_item_ids(models.Genre)),
+    (models.Artist, get_item_ids(models.Artist)),
+]
+
+
+def create_purge_job(user_id: int) -> dict:
+    """
+
+    Register a new purge, before it's started.
+
+    Args:
+        user_id (int): The ID of the user who's library is going to be deleted.
+
+    Returns:
+        dict: The progress of the purge.
+    """
+    job = {
+        "job_id": uuid.uuid4().hex,
+        "user_id": user_id,
+        "status": "pending",
+        "deleted": {model.__tablename__: 0 for model, _ in PURGE_STEPS},
+        "created_at": datetime.utcnow(),
+        "finished_at": None,
+        "error": None,
+    }
+    with active_purge_jobs_lock:
+        active_purge_jobs[job["job_id"]] = job
+    return job
+
+
+def finish_purge_job(job: dict, status: str, error: Optional[str] = None):
+    """
+
+    Record the outcome of a purge, after which its progress is only kept for a while.
+
+    Args:
+        job (dict): The progress of the purge.
+        status (str): Either "done" or "failed".
+        error (Optional[str]): The reason of the failure.
+    """
+    job["status"] = status
+    job["error"] = error
+    job["finished_at"] = datetime.utcnow()
+    with active_purge_jobs_lock:
+        active_purge_jobs.pop(job["job_id"], None)
+        purge_jobs.set(job["job_id"], job)
+
+
+def get_purge_job(job_id: str) -> Optional[dict]:
+    """
+
+    Retrieve the progress of a purge.
+
+    Args:
+        job_id (str): The ID returned when the purge was started.
+
+    Returns:
+        Optional[dict]: The progress of the purge, None if not found (or forgotten).
+    """
+    with active_purge_jobs_lock:
+        job = active_purge_jobs.get(job_id) or purge_jobs.get(job_id)
+    # the purge may be updating it in another thread
+    return {**job, "deleted": dict(job["deleted"])} if job is not None else None
+
+
+def delete_in_chunks(db: Session, model, ids_query: Query, job: dict, chunk_size: int, pause: float):
+    """
+
+    Delete the rows selected by a query, one chunk (and one transaction) at a time.
+
+    Args:
+        db (Session): The session used to access the database.
+        model: The model of the rows to delete.
+        ids_query (Query): Selects the ID of the rows to delete.
+        job (dict): The progress of the purge, updated after each chunk.
+        chunk_size (int): The maximum number of rows deleted per transaction.
+        pause (float): The number of seconds to wait between two chunks.
+    """
+    while True:
+        ids = [row_id for row_id, in ids_query.limit(chunk_size).all()]
+        if not ids:
+            return
+        db.query(model).filter(model.id.in_(ids)).delete(synchronize_session=False)
+        db.commit()
+        job["deleted"][model.__tablename__] += len(ids)
+        if len(ids) < chunk_size:
+            return
+        time.sleep(pause)
+
+
+def purge_user(engine: Engine, user_id: int, job_id: str, chunk_size: Optional[int] = None, pause: Optional[float] = None):
+    """
+
+    Delete a user's music library, then the user itself.
+    This function is run in the background, once the user was deactivated.
+
+    Args:
+        engine (Engine): The engine connected to the database (the request's session is closed by then).
+        user_id (int): The ID of the user to delete.
+        job_id (str): The ID of the purge, as returned by create_purge_job().
+        chunk_size (Optional[int]): The maximum number of rows deleted per transaction. Defaults to PURGE_CHUNK_SIZE.
+        pause (Optional[float]): The number of seconds to wait between two chunks. Defaults to PURGE_PAUSE.
+    """
+    chunk_size = chunk_size or PURGE_CHUNK_SIZE
+    pause = PURGE_PAUSE if pause is None else pause
+    with active_purge_jobs_lock:
+        job = active_purge_jobs.get(job_id)
+    if job is None:
+        job = create_purge_job(user_id)
+    job["status"] = "running"
+    with Session(bind=engine) as db:
+        try:
+            for model, get_ids in PURGE_STEPS:
+                delete_in_chunks(db, model, get_ids(db, user_id), job, chunk_size, pause)
+            username = db.query(models.User.username).filter(models.User.id == user_id).scalar()
+            db.query(models.User).filter(models.User.id == user_id).delete(synchronize_session=False)
+            db.commit()
+        except Exception as error:
+            db.rollback()
+            finish_purge_job(job, "failed", str(error))
+            return
+        for model in [models.Tag, models.Genre, models.Artist]:
+            invalidate_vocabulary(db, model, user_id)
+        if username is not None:
+            invalidate_user(db, username)
+    finish_purge_job(job, "done")
+
+
+def resume_purges(engine: Engine) -> List[dict]:
+    """
+
+    Start the purge of the users marked for deletion but not deleted yet (the app stopped before their purge was over).
+    The users that were only deactivated are left alone.
+    The purges are run one after the other, in a background thread.
+    Deleting rows that were already deleted has no effect, so a purge can safely be resumed by several processes.
+
+    Args:
+        engine (Engine): The engine connected to the database.
+
+    Returns:
+        List[dict]: The progress of each purge.
+    """
+    with Session(bind=engine) as db:
+        user_ids = [user_id for user_id, in db.query(models.User.id).filter(models.User.deletion_requested_at != None).all()]
+    jobs = [create_purge_job(user_id) for user_id in user_ids]
+    if len(jobs) > 0:
+        def run_purges():
+            for job in jobs:
+                purge_user(engine, job["user_id"], job["job_id"])
+        threading.Thread(target=run_purges, daemon=True).start()
+    return jobs
@@ -1,11 +1,13 @@
 
-from typing import List
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import insert
 from sqlalchemy.orm import Session
 
 from .. import crud
 from ..crud_functions.artist import get_artist_by_name
 from ..crud_functions.genre import get_genre_by_name
 from ..crud_functions.tag import get_tag_by_name
+from ..crud_functions.utils import get_item_ids_by_names, parse_key_code, remove_duplicates, split_in_chunks, update_associations
 from .. import models, schemas
 from ..utility import *
 
@@ -16,6 +18,11 @@ from ..utility import *
 
 # CRUD functions for the Song model
 
+# '/api/artists/{name}/songs' lists the songs of an artist
+# --> a song can't be called that, or it couldn't be reached at '/api/artists/{artist_name}/{song_title}'
+
+RESERVED_SONG_TITLES = {"songs"}
+
 def get_song_tag_objects(db: Session, song: models.Song) -> List[models.Tag]:
     """
 
@@ -32,7 +39,7 @@ def get_song_tag_objects(db: Session, song: models.Song) -> List[models.Tag]:
         return None
     tag_song_items = db.query(models.TagSong).filter(models.TagSong.song_id == song.id).all()
     tag_song_ids = [tag_song_item.tag_id for tag_song_item in tag_song_items]
-    song_tags = db.query(models.Tag).filter(models.Tag.id.in_(tag_song_ids)).all()
+    song_tags = db.query(models.Tag).filter(models.Tag.id.in_(tag_song_ids)).order_by(models.Tag.id).all()
     return song_tags
 
 def get_song_tags(db: Session, song: models.Song) -> List[str]:
@@ -69,7 +76,7 @@ def get_song_genre_objects(db: Session, song: models.Song) -> List[models.Genre]
         return None
     genre_song_items = db.query(models.GenreSong).filter(models.GenreSong.song_id == song.id).all()
     genre_song_ids = [genre_song_item.genre_id for genre_song_item in genre_song_items]
-    song_genres = db.query(models.Genre).filter(models.Genre.id.in_(genre_song_ids)).all()
+    song_genres = db.query(models.Genre).filter(models.Genre.id.in_(genre_song_ids)).order_by(models.Genre.id).all()
     return song_genres
 
 def get_song_genres(db: Session, song: models.Song) -> List[str]:
@@ -105,7 +112,7 @@ def get_song_artist_objects(db: Session, song: models.Song) -> List[models.Artis
         return None
     artist_song_items = db.query(models.ArtistSong).filter(models.ArtistSong.song_id == song.id).all()
     artist_song_ids = [artist_song_item.artist_id for artist_song_item in artist_song_items]
-    song_artists = db.query(models.Artist).filter(models.Artist.id.in_(artist_song_ids)).all()
+    song_artists = db.query(models.Artist).filter(models.Artist.id.in_(artist_song_ids)).order_by(models.Artist.id).all()
     return song_artists
 
 def get_song_artists(db: Session, song: models.Song) -> List[str]:
@@ -128,6 +135,118 @@ def get_song_artists(db: Session, song: models.Song) -> List[str]:
 
 
 
+# batched versions of the getters above
+# used to build the response for a whole list of Song objects at once
+# --> a fixed number of queries, no matter how many songs are in the list
+
+def get_songs_related_names(db: Session, songs: List[models.Song], model, association_model, foreign_key) -> Dict[int, List[str]]:
+    """
+
+    Retrieve the names of the objects associated to each Song object of a list, using a single query (per chunk of MAX_IN_VALUES songs).
+
+    Args:
+        db (Session): The session used to access the database.
+        songs (List[models.Song]): The provided Song objects.
+        model: The associated model (models.Tag, models.Genre or models.Artist).
+        association_model: The association model (models.TagSong, models.GenreSong or models.ArtistSong).
+        foreign_key: The association model's column referencing the associated model.
+
+    Returns:
+        Dict[int, List[str]]: The names of the associated objects, for each Song ID.
+    """
+    song_ids = [song.id for song in songs]
+    names = { song_id: [] for song_id in song_ids }
+    if len(song_ids) == 0:
+        return names
+    # all the rows of a song are in the same chunk, so their order is kept
+    for chunk in split_in_chunks(list(names)):
+        rows = db.query(association_model.song_id, model.name) \
+            .join(model, model.id == foreign_key) \
+            .filter(association_model.song_id.in_(chunk)) \
+            .order_by(model.id) \
+            .all()
+        for song_id, name in rows:
+            if name not in names[song_id]:
+                names[song_id].append(name)
+    return names
+
+def get_songs_tags(db: Session, songs: List[models.Song]) -> Dict[int, List[str]]:
+    """
+
+    Retrieve the Tag objects associated to each Song object of a list.
+
+    Args:
+        db (Session): The session used to access the database.
+        songs (List[models.Song]): The provided Song objects.
+
+    Returns:
+        Dict[int, List[str]]: The names of the retrieved Tag objects, for each Song ID.
+    """
+    return get_songs_related_names(db, songs, models.Tag, models.TagSong, models.TagSong.tag_id)
+
+def get_songs_genres(db: Session, songs: List[models.Song]) -> Dict[int, List[str]]:
+    """
+
+    Retrieve the Genre objects associated to each Song object of a list.
+
+    Args:
+        db (Session): The session used to access the database.
+        songs (List[models.Song]): The provided Song objects.
+
+    Returns:
+        Dict[int, List[str]]: The names of the retrieved Genre objects, for each Song ID.
+    """
+    return get_songs_related_names(db, songs, models.Genre, models.GenreSong, models.GenreSong.genre_id)
+
+def get_songs_artists(db: Session, songs: List[models.Song]) -> Dict[int, List[str]]:
+    """
+
+    Retrieve the Artist objects associated to each Song object of a list.
+
+    Args:
+        db (Session): The session used to access the database.
+        songs (List[models.Song]): The provided Song objects.
+
+    Returns:
+        Dict[int, List[str]]: The names of the retrieved Artist objects, for each Song ID.
+    """
+    return get_songs_related_names(db, songs, models.Artist, models.ArtistSong, models.ArtistSong.artist_id)
+
+def get_songs_data(db: Session, songs: List[models.Song]) -> List[dict]:
+    """
+
+    Build the data sent back to the client for a list of Song objects,
+    along with their associated Tag, Genre and Artist objects.
+
+    Args:
+        db (Session): The session used to access the database.
+        songs (List[models.Song]): The provided Song objects.
+
+    Returns:
+        List[dict]: The data for each Song object, in the same order.
+    """
+    tags = get_songs_tags(db, songs)
+    genres = get_songs_genres(db, songs)
+    artists = get_songs_artists(db, songs)
+    return [{**song.__dict__, "tags": tags[song.id], "genres": genres[song.id], "artists": artists[song.id]} for song in songs]
+
+def get_song_data(db: Session, song: models.Song) -> dict:
+    """
+
+    Build the data sent back to the client for a Song object,
+    along with its associated Tag, Genre and Artist objects.
+
+    Args:
+        db (Session): The session used to access the database.
+        song (models.Song): The provided Song object.
+
+    Returns:
+        dict: The data for the Song object.
+    """
+    return get_songs_data(db, [song])[0]
+
+
+
 def get_song_playlist_objects(db: Session, song: models.Song) -> List[models.Playlist]:
     """
 
@@ -144,7 +263,7 @@ def get_song_playlist_objects(db: Session, song: models.Song) -> List[models.Pla
         return None
     song_playlist_items = db.query(models.SongPlaylist).filter(models.SongPlaylist.song_id == song.id).all()
     song_playlist_ids = [song_playlist_item.playlist_id for song_playlist_item in song_playlist_items]
-    song_playlists = db.query(models.Playlist).filter(models.Playlist.id.in_(song_playlist_ids)).all()
+    song_playlists = db.query(models.Playlist).filter(models.Playlist.id.in_(song_playlist_ids)).order_by(models.Playlist.id).all()
     return song_playlists
 
 def get_song_playlists(db: Session, song: models.Song) -> List[str]:
@@ -193,17 +312,50 @@ def get_song_by_title(db: Session, artist_name: str, song_title: str, current_us
     Returns:
         [models.Song]: The Song (if found), None (if not found).
     """
-    # get all songs matching song_title
-    db_songs = db.query(models.Song).filter(models.Song.user_id == current_user.id).filter(models.Song.title == song_title).all()
-    # for each song, get a list of the artists associated to it
-    artists = [get_song_artists(db, db_song) for db_song in db_songs]
-    # filter the list to get the one that's associated to the specified artist
-    i = 0
-    while i < len(artists):
-        if artist_name in artists[i]:
-            return db_songs[i]
-        i += 1
-    return None
+    # a single indexed join, no matter how many songs share that title
+    return db.query(models.Song) \
+        .join(models.ArtistSong, models.ArtistSong.song_id == models.Song.id) \
+        .join(models.Artist, models.Artist.id == models.ArtistSong.artist_id) \
+        .filter(models.Song.user_id == current_user.id) \
+        .filter(models.Song.title == song_title) \
+        .filter(models.Artist.name == artist_name) \
+        .order_by(models.Song.id) \
+        .first()
+
+
+def get_songs_by_titles(db: Session, full_titles: List[Tuple[str, str]], current_user: schemas.User) -> Dict[Tuple[str, str], models.Song]:
+    """
+
+    Retrieve Song objects from a user's music library using their full names (artist + title), using a single query.
+
+    Args:
+        db (Session): The session used to access the database.
+        full_titles (List[Tuple[str, str]]): The list of (artist name, song title) pairs to look for.
+        current_user (schemas.User): The user who's song library we're working in.
+
+    Returns:
+        Dict[Tuple[str, str], models.Song]: The Song objects found, indexed by their (artist name, song title) pair (pairs that weren't found are missing).
+    """
+    songs = {}
+    wanted = set(full_titles)
+    if len(wanted) == 0:
+        return songs
+    # filter on the artists & the titles separately (portable, and both are indexed)
+    # then keep the pairs we're looking for
+    for chunk in split_in_chunks(list(wanted)):
+        rows = db.query(models.Artist.name, models.Song) \
+            .join(models.ArtistSong, models.ArtistSong.artist_id == models.Artist.id) \
+            .join(models.Song, models.Song.id == models.ArtistSong.song_id) \
+            .filter(models.Song.user_id == current_user.id) \
+            .filter(models.Song.title.in_({song_title for _, song_title in chunk})) \
+            .filter(models.Artist.name.in_({artist_name for artist_name, _ in chunk})) \
+            .order_by(models.Song.id) \
+            .all()
+        for artist_name, db_song in rows:
+            full_title = (artist_name, db_song.title)
+            if full_title in wanted and full_title not in songs:
+                songs[full_title] = db_song
+    return songs
 
 
 
@@ -220,10 +372,39 @@ def get_songs_from_db(db: Session, max: int, current_user: schemas.User) -> List
     Returns:
         List[models.Song]: The list of Song objects retrieved from the database.
     """
-    nb_songs = len(get_all_songs(db, current_user))
-    if max >= nb_songs:
-        return get_all_songs(db, current_user)
-    return db.query(models.Song).filter(models.Song.user_id == current_user.id).offset(nb_songs - max).all()
+    # only read the 'max' most recent songs
+    # then put them back in insertion order
+    db_songs = db.query(models.Song) \
+        .filter(models.Song.user_id == current_user.id) \
+        .order_by(models.Song.id.desc()) \
+        .limit(max) \
+        .all()
+    return db_songs[::-1]
+
+
+def get_songs_page(db: Session, max: int, current_user: schemas.User, cursor: Optional[int] = None) -> Tuple[List[models.Song], Optional[int]]:
+    """
+
+    Get a page of Song objects, using keyset pagination on the songs' IDs.
+
+    Args:
+        db (Session): The session used to access the database.
+        max (int): The maximum number of songs to return.
+        current_user (schemas.User): The user who's song library we're working in.
+        cursor (Optional[int]): If provided, only the songs coming after the song with this ID are returned.
+
+    Returns:
+        Tuple[List[models.Song], Optional[int]]: The Song objects, and the cursor to use to get the next page (None if this is the last page).
+    """
+    songs = db.query(models.Song).filter(models.Song.user_id == current_user.id)
+    if cursor is not None:
+        songs = songs.filter(models.Song.id > cursor)
+    # fetch one more song than requested to know whether there's a next page
+    db_songs = songs.order_by(models.Song.id).limit(max + 1).all()
+    if len(db_songs) <= max:
+        return db_songs, None
+    db_songs = db_songs[:max]
+    return db_songs, db_songs[-1].id
     
 
 
@@ -240,7 +421,7 @@ def get_all_songs(db: Session, current_user: schemas.User) -> List[models.Song]:
     Returns:
         List[models.Song]: The list of Song objects retrieved from the database.
     """
-    return db.query(models.Song).filter(models.Song.user_id == current_user.id).all()
+    return db.query(models.Song).filter(models.Song.user_id == current_user.id).order_by(models.Song.id).all()
 
 
 def create_song(db: Session, new_song: schemas.SongCreate, current_user: schemas.User) -> models.Song:
@@ -258,9 +439,9 @@ def create_song(db: Session, new_song: schemas.SongCreate, current_user: schemas
     """
     new_song_dict = new_song.dict()
     new_song_dict["user_id"] = current_user.id
-    tags = new_song_dict.pop("tags")
-    genres = new_song_dict.pop("genres")
-    artists = new_song_dict.pop("artists")
+    tags = remove_duplicates(new_song_dict.pop("tags"))
+    genres = remove_duplicates(new_song_dict.pop("genres"))
+    artists = remove_duplicates(new_song_dict.pop("artists"))
     # make sure all the tags listed do exist in the database
     if tags is not None:
         for tag in tags:
@@ -281,10 +462,11 @@ def create_song(db: Session, new_song: schemas.SongCreate, current_user: schemas
             db_artist = get_artist_by_name(db, artist, current_user)
             if not db_artist:
                 raise_http_404(f"Cannot add song '{new_song.title}' to the library because artist '{artist}' does not exist.")
+    new_song_dict["key_code"] = parse_key_code(new_song.key)
     db_song = models.Song(**new_song_dict)
     db.add(db_song)
-    db.commit()
-    db.refresh(db_song)
+    # get the song's ID, the associations below need it
+    db.flush()
     # associate the newly created Song object to the provided tags
     if tags is not None:
         for tag in tags:
@@ -303,9 +485,87 @@ def create_song(db: Session, new_song: schemas.SongCreate, current_user: schemas
             db_artist = get_artist_by_name(db, artist, current_user)
             artist_song_item = schemas.ArtistSongCreate(song_id=db_song.id, artist_id=db_artist.id)
             crud.create_artist_song(db, artist_song_item)
+    # everything is committed at once
+    db.commit()
     return db_song
 
 
+# create many Song objects at once
+# used by the bulk POST API endpoint for Song objects
+
+def create_songs(db: Session, new_songs: List[schemas.SongCreate], current_user: schemas.User) -> Tuple[List[Optional[int]], List[Tuple[int, str]]]:
+    """
+
+    Create many Song objects in the database, in a single transaction.
+    The songs that can't be created are skipped, the others are still created.
+
+    Args:
+        db (Session): The session used to access the database.
+        new_songs (List[schemas.SongCreate]): The Song objects to be inserted into the database.
+        current_user (schemas.User): The user who's music library we're working in.
+
+    Returns:
+        Tuple[List[Optional[int]], List[Tuple[int, str]]]: The ID of each created song (None if it wasn't created), and the (index, reason) of each song that wasn't created.
+    """
+    ids = [None] * len(new_songs)
+    errors = []
+    # look up everything the songs refer to, all at once
+    tag_ids = get_item_ids_by_names(db, models.Tag, [tag for song in new_songs for tag in song.tags or []], current_user.id)
+    genre_ids = get_item_ids_by_names(db, models.Genre, [genre for song in new_songs for genre in song.genres or []], current_user.id)
+    artist_ids = get_item_ids_by_names(db, models.Artist, [artist for song in new_songs for artist in song.artists], current_user.id)
+    existing_songs = get_songs_by_titles(db, [(artist, song.title) for song in new_songs for artist in song.artists], current_user)
+    # validate each song
+    # a song is a duplicate if it's already in the database, or earlier in the batch
+    seen_full_titles = set()
+    valid_songs = []
+    for index, new_song in enumerate(new_songs):
+        tags = remove_duplicates(new_song.tags) or []
+        genres = remove_duplicates(new_song.genres) or []
+        artists = remove_duplicates(new_song.artists)
+        full_titles = [(artist, new_song.title) for artist in artists]
+        duplicates = [artist for artist, song_title in full_titles if (artist, song_title) in existing_songs or (artist, song_title) in seen_full_titles]
+        error = None
+        if len(artists) == 0:
+            error = f"Cannot add song '{new_song.title}' because no artists were specified."
+        elif new_song.title in RESERVED_SONG_TITLES:
+            error = f"Cannot add song '{new_song.title}' because this title is reserved."
+        elif len(duplicates) != 0:
+            error = f"Song '{new_song.title} by {duplicates[0]}' already exists."
+        else:
+            missing = [("tag", tag) for tag in tags if tag not in tag_ids] \
+                + [("genre", genre) for genre in genres if genre not in genre_ids] \
+                + [("artist", artist) for artist in artists if artist not in artist_ids]
+            if len(missing) != 0:
+                kind, name = missing[0]
+                error = f"Cannot add song '{new_song.title}' to the library because {kind} '{name}' does not exist."
+        if error is not None:
+            errors.append((index, error))
+            continue
+        seen_full_titles.update(full_titles)
+        song_dict = new_song.dict(exclude={"tags", "genres", "artists"})
+        db_song = models.Song(**song_dict, user_id=current_user.id, key_code=parse_key_code(new_song.key))
+        valid_songs.append((index, db_song, tags, genres, artists))
+    if len(valid_songs) == 0:
+        return ids, errors
+    # insert the songs (the IDs are needed for the associations)
+    db.add_all([db_song for _, db_song, _, _, _ in valid_songs])
+    db.flush()
+    # then all the associations, with one multi-row INSERT per table
+    tag_songs = []
+    genre_songs = []
+    artist_songs = []
+    for index, db_song, tags, genres, artists in valid_songs:
+        ids[index] = db_song.id
+        tag_songs += [{"tag_id": tag_ids[tag], "song_id": db_song.id} for tag in tags]
+        genre_songs += [{"genre_id": genre_ids[genre], "song_id": db_song.id} for genre in genres]
+        artist_songs += [{"artist_id": artist_ids[artist], "song_id": db_song.id} for artist in artists]
+    for model, rows in [(models.TagSong, tag_songs), (models.GenreSong, genre_songs), (models.ArtistSong, artist_songs)]:
+        if len(rows) != 0:
+            db.execute(insert(model), rows)
+    db.commit()
+    return ids, errors
+
+
 def delete_song(db: Session, artist_name: str, song_title: str, current_user: schemas.User) -> models.Song:
     """
 
@@ -323,24 +583,13 @@ def delete_song(db: Session, artist_name: str, song_title: str, current_user: sc
     db_song = get_song_by_title(db, artist_name, song_title, current_user)
     if db_song is None:
         return None
-    # on delete, we need to delete all the TagSong objects associated to this one
-    tag_song_items = db.query(models.TagSong).filter(models.TagSong.song_id == db_song.id).all()
-    for tag_song_item in tag_song_items:
-        crud.delete_tag_song_from_db(db, tag_song_item.id)
-    # on delete, we need to delete all the GenreSong objects associated to this one
-    genre_song_items = db.query(models.GenreSong).filter(models.GenreSong.song_id == db_song.id).all()
-    for genre_song_item in genre_song_items:
-        crud.delete_genre_song_from_db(db, genre_song_item.id)
-    # on delete, we need to delete all the ArtistSong objects associated to this one
-    artist_song_items = db.query(models.ArtistSong).filter(models.ArtistSong.song_id == db_song.id).all()
-    for artist_song_item in artist_song_items:
-        crud.delete_artist_song_from_db(db, artist_song_item.id)
-    # on delete, we need to delete all the SongPlaylist objects associated to this one
-    song_playlist_items = db.query(models.SongPlaylist).filter(models.SongPlaylist.song_id == db_song.id).all()
-    for song_playlist_item in song_playlist_items:
-        crud.delete_song_playlist_from_db(db, song_playlist_item.id)
+    # on delete, we need to delete all the TagSong, GenreSong, ArtistSong & SongPlaylist objects associated to this one
+    # --> a single DELETE statement per table, no matter how many there are
+    for association_model in [models.TagSong, models.GenreSong, models.ArtistSong, models.SongPlaylist]:
+        db.query(association_model).filter(association_model.song_id == db_song.id).delete(synchronize_session=False)
     # now delete the Song object
-    db.delete(db_song)
+    # "evaluate" also removes the object from the session
+    db.query(models.Song).filter(models.Song.id == db_song.id).delete(synchronize_session="evaluate")
     db.commit()
     return db_song
 
@@ -366,25 +615,13 @@ def update_song_tags(db: Session, db_song: models.Song, song: schemas.SongUpdate
     """
     if song.tags is None:
         return False
-    current_tags = get_song_tags(db, db_song)
-    # start with checking whether some tags were disassociated from the Song object
-    for current_tag in current_tags:
-        if current_tag not in song.tags:
-            # if a tag's been removed
-            db_tag = get_tag_by_name(db, current_tag, current_user)
-            tag_song_item = crud.get_tag_song_by_key(db, db_tag.id, db_song.id)
-            crud.delete_tag_song_from_db(db, tag_song_item.id)
-    # now check if any tag has been added
-    for tag in song.tags:
-        if tag not in current_tags:
-            # if a tag's been added
-            # make sure it already exists in the database
-            db_tag = get_tag_by_name(db, tag, current_user)
-            if not db_tag:
-                raise_http_404(f"Cannot add tag '{tag}' to song '{db_song.title}' because the tag does not exist.")
-            # associate the tag to the Song object
-            tag_song_item = schemas.TagSongCreate(song_id=db_song.id, tag_id=db_tag.id)
-            crud.create_tag_song(db, tag_song_item)
+    # look up all the tags at once, and make sure they already exist in the database
+    tag_ids = get_item_ids_by_names(db, models.Tag, song.tags, current_user.id)
+    for tag in remove_duplicates(song.tags):
+        if tag not in tag_ids:
+            raise_http_404(f"Cannot add tag '{tag}' to song '{db_song.title}' because the tag does not exist.")
+    # remove the tags that aren't listed anymore & associate the new ones
+    update_associations(db, models.TagSong, "song_id", db_song.id, "tag_id", tag_ids.values())
     return True
 
 
@@ -409,25 +646,13 @@ def update_song_genres(db: Session, db_song: models.Song, song: schemas.SongUpda
     """
     if song.genres is None:
         return False
-    current_genres = get_song_genres(db, db_song)
-    # start with checking whether some genres were disassociated from the Song object
-    for current_genre in current_genres:
-        if current_genre not in song.genres:
-            # if a genre's been removed
-            db_genre = get_genre_by_name(db, current_genre, current_user)
-            genre_song_item = crud.get_genre_song_by_key(db, db_genre.id, db_song.id)
-            crud.delete_genre_song_from_db(db, genre_song_item.id)
-    # now check if any genre has been added
-    for genre in song.genres:
-        if genre not in current_genres:
-            # if a genre's been added
-            # make sure it already exists in the database
-            db_genre = get_genre_by_name(db, genre, current_user)
-            if not db_genre:
-                raise_http_404(f"Cannot add genre '{genre}' to song '{db_song.title}' because the genre does not exist.")
-            # associate the genre to the Song object
-            genre_song_item = schemas.GenreSongCreate(song_id=db_song.id, genre_id=db_genre.id)
-            crud.create_genre_song(db, genre_song_item)
+    # look up all the genres at once, and make sure they already exist in the database
+    genre_ids = get_item_ids_by_names(db, models.Genre, song.genres, current_user.id)
+    for genre in remove_duplicates(song.genres):
+        if genre not in genre_ids:
+            raise_http_404(f"Cannot add genre '{genre}' to song '{db_song.title}' because the genre does not exist.")
+    # remove the genres that aren't listed anymore & associate the new ones
+    update_associations(db, models.GenreSong, "song_id", db_song.id, "genre_id", genre_ids.values())
     return True
 
 
@@ -454,25 +679,13 @@ def update_song_artists(db: Session, db_song: models.Song, song: schemas.SongUpd
         return False
     if len(song.artists) == 0:
         raise_http_400("The list of artists associated to a song cannot be empty.")
-    current_artists = get_song_artists(db, db_song)
-    # start with checking whether some artists were disassociated from the Song object
-    for current_artist in current_artists:
-        if current_artist not in song.artists:
-            # if an artist's been removed
-            db_artist = get_artist_by_name(db, current_artist, current_user)
-            artist_song_item = crud.get_artist_song_by_key(db, db_artist.id, db_song.id)
-            crud.delete_artist_song_from_db(db, artist_song_item.id)
-    # now check if any artist has been added
-    for artist in song.artists:
-        if artist not in current_artists:
-            # if an artist's been added
-            # make sure it already exists in the database
-            db_artist = get_artist_by_name(db, artist, current_user)
-            if not db_artist:
-                raise_http_404(f"Cannot add artist '{artist}' to song '{db_song.title}' because the artist does not exist.")
-            # associate the artist to the Song object
-            artist_song_item = schemas.ArtistSongCreate(song_id=db_song.id, artist_id=db_artist.id)
-            crud.create_artist_song(db, artist_song_item)
+    # look up all the artists at once, and make sure they already exist in the database
+    artist_ids = get_item_ids_by_names(db, models.Artist, song.artists, current_user.id)
+    for artist in remove_duplicates(song.artists):
+        if artist not in artist_ids:
+            raise_http_404(f"Cannot add artist '{artist}' to song '{db_song.title}' because the artist does not exist.")
+    # remove the artists that aren't listed anymore & associate the new ones
+    update_associations(db, models.ArtistSong, "song_id", db_song.id, "artist_id", artist_ids.values())
     return True
 
 
@@ -514,7 +727,38 @@ def update_song(db: Session, artist_name: str, song_title: str, song: schemas.So
         setattr(db_song, var, value) if value else None
     if song.new_title is not None:
         db_song.title = song.new_title
+    db_song.key_code = parse_key_code(db_song.key)
     db.add(db_song)
     db.commit()
-    db.refresh(db_song)
     return db_song
+
+
+# compute the key code of the songs stored before it existed
+# the songs are updated with a single statement per key code (per chunk of MAX_IN_VALUES key spellings)
+# --> the number of statements doesn't depend on the number of songs
+
+def backfill_song_key_codes(db: Session) -> int:
+    """
+
+    Compute the key code of every Song object that doesn't have one yet.
+
+    Args:
+        db (Session): The session used to access the database.
+
+    Returns:
+        int: The number of Song objects updated.
+    """
+    keys_by_code: Dict[int, List[str]] = {}
+    for key, in db.query(models.Song.key).filter(models.Song.key_code == None).distinct().all():
+        key_code = parse_key_code(key)
+        if key_code is not None:
+            keys_by_code.setdefault(key_code, []).append(key)
+    nb_updated = 0
+    for key_code, keys in keys_by_code.items():
+        for chunk in split_in_chunks(keys):
+            nb_updated += db.query(models.Song) \
+                .filter(models.Song.key_code == None) \
+                .filter(models.Song.key.in_(chunk)) \
+                .update({"key_code": key_code}, synchronize_session=False)
+    db.commit()
+    return nb_updated
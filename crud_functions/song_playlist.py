@@ -7,6 +7,9 @@ from .. import models, schemas
 # checks for appropriate permissions aren't performed here
 # rather, they're performed in the files calling the following functions
 
+# these functions only flush their changes, they don't commit them
+# --> the function handling the whole operation (creating a song, updating a playlist, ...) commits once, at the end
+
 def get_song_playlist_by_id(db: Session, id: int) -> models.SongPlaylist:
     """
 
@@ -64,8 +67,8 @@ def create_song_playlist(db: Session, song_playlist: schemas.SongPlaylistCreate)
     """
     db_song_playlist = models.SongPlaylist(**song_playlist.dict())
     db.add(db_song_playlist)
-    db.commit()
-    db.refresh(db_song_playlist)
+    # the ID is sent back by the INSERT statement, no need to refresh the object
+    db.flush()
     return db_song_playlist
 
 def delete_song_playlist_from_db(db: Session, id: int) -> models.SongPlaylist:
@@ -82,7 +85,7 @@ def delete_song_playlist_from_db(db: Session, id: int) -> models.SongPlaylist:
     """
     song_playlist = get_song_playlist_by_id(db, id)
     db.delete(song_playlist)
-    db.commit()
+    db.flush()
     return song_playlist
 
 
@@ -106,6 +109,5 @@ def update_song_playlist(db: Session, id: int, song_playlist: schemas.SongPlayli
     if song_playlist.song_id is not None:
         db_song_playlist.song_id = song_playlist.song_id
     db.add(db_song_playlist)
-    db.commit()
-    db.refresh(db_song_playlist)
+    db.flush()
     return db_song_playlist
\ No newline at end of file
@@ -1,7 +1,8 @@
-from typing import List
-from sqlalchemy.orm import Session
+from typing import List, Optional, Tuple
+from sqlalchemy.orm import Query, Session
 
-from ..crud_functions.utils import get_full_song_title
+from ..crud_functions.utils import associate_item_to_songs, create_named_items, dissociate_item_from_songs, get_full_song_titles, merge_named_items, rename_named_items
+from ..crud_functions.vocabulary import get_item_by_name, invalidate_vocabulary
 
 from .. import models, schemas, crud
 
@@ -27,6 +28,35 @@ def get_tag_tag_song_objects(db: Session, tag: models.Tag) -> List[models.TagSon
     tag_song_items = db.query(models.TagSong).filter(models.TagSong.tag_id == tag.id).all()
     return tag_song_items
 
+def get_tag_song_objects(db: Session, tag: models.Tag, current_user: schemas.User, skip: Optional[int] = None, max: Optional[int] = None) -> List[models.Song]:
+    """
+
+    Retrieve the Song objects associated to a Tag object, using a single query.
+
+    Args:
+        db (Session): The session used to access the database.
+        tag (models.Tag): The provided Tag object.
+        current_user (schemas.User): The user who's music library we're working in.
+        skip (Optional[int]): If provided, represents the number of songs to skip.
+        max (Optional[int]): if provided, represents the maximum number of songs to return.
+
+    Returns:
+        List[models.Song]: The retrieved Song objects.
+    """
+    if tag is None:
+        return None
+    songs = db.query(models.Song) \
+        .join(models.TagSong, models.TagSong.song_id == models.Song.id) \
+        .filter(models.TagSong.tag_id == tag.id) \
+        .filter(models.Song.user_id == current_user.id) \
+        .distinct() \
+        .order_by(models.Song.id)
+    if skip is not None:
+        songs = songs.offset(skip)
+    if max is not None:
+        songs = songs.limit(max)
+    return songs.all()
+
 def get_tag_songs(db: Session, tag: models.Tag, current_user: schemas.User) -> List[str]:
     """
 
@@ -42,10 +72,9 @@ def get_tag_songs(db: Session, tag: models.Tag, current_user: schemas.User) -> L
     """
     if tag is None:
         return None
-    tag_song_items = get_tag_tag_song_objects(db, tag)
-    song_ids = [tag_song_item.song_id for tag_song_item in tag_song_items]
-    db_songs = [crud.get_song_by_id(db, song_id, current_user) for song_id in song_ids]
-    return [get_full_song_title(db, db_song) for db_song in db_songs]
+    db_songs = get_tag_song_objects(db, tag, current_user)
+    full_titles = get_full_song_titles(db, [db_song.id for db_song in db_songs])
+    return [full_titles[db_song.id] for db_song in db_songs if db_song.id in full_titles]
 
 def get_tag_tag_playlist_objects(db: Session, tag: models.Tag) -> List[models.TagPlaylist]:
     """
@@ -65,6 +94,35 @@ def get_tag_tag_playlist_objects(db: Session, tag: models.Tag) -> List[models.Ta
     return tag_playlist_items
 
 
+def get_tag_playlist_objects(db: Session, tag: models.Tag, current_user: schemas.User, skip: Optional[int] = None, max: Optional[int] = None) -> List[models.Playlist]:
+    """
+
+    Retrieve the Playlist objects associated to a Tag object, using a single query.
+
+    Args:
+        db (Session): The session used to access the database.
+        tag (models.Tag): The provided Tag object.
+        current_user (schemas.User): The user who's music library we're working in.
+        skip (Optional[int]): If provided, represents the number of playlists to skip.
+        max (Optional[int]): if provided, represents the maximum number of playlists to return.
+
+    Returns:
+        List[models.Playlist]: The retrieved Playlist objects.
+    """
+    if tag is None:
+        return None
+    playlists = db.query(models.Playlist) \
+        .join(models.TagPlaylist, models.TagPlaylist.playlist_id == models.Playlist.id) \
+        .filter(models.TagPlaylist.tag_id == tag.id) \
+        .filter(models.Playlist.user_id == current_user.id) \
+        .distinct() \
+        .order_by(models.Playlist.id)
+    if skip is not None:
+        playlists = playlists.offset(skip)
+    if max is not None:
+        playlists = playlists.limit(max)
+    return playlists.all()
+
 def get_tag_playlists(db: Session, tag: models.Tag, current_user: schemas.User) -> List[str]:
     """
 
@@ -80,9 +138,7 @@ def get_tag_playlists(db: Session, tag: models.Tag, current_user: schemas.User)
     """
     if tag is None:
         return None
-    tag_playlist_items = get_tag_tag_playlist_objects(db, tag)
-    playlist_ids = [tag_playlist_item.playlist_id for tag_playlist_item in tag_playlist_items]
-    db_playlists = [crud.get_playlist_by_id(db, playlist_id, current_user) for playlist_id in playlist_ids]
+    db_playlists = get_tag_playlist_objects(db, tag, current_user)
     return [db_playlist.name for db_playlist in db_playlists]
 
 
@@ -114,7 +170,8 @@ def get_tag_by_name(db: Session, name: str, current_user: schemas.User) -> model
     Returns:
         models.Tag: The retrieved Tag object (if found), None (if not found).
     """
-    return db.query(models.Tag).filter(models.Tag.user_id == current_user.id).filter(models.Tag.name == name).first()
+    # name -> id lookups go through the vocabulary cache, see vocabulary.py
+    return get_item_by_name(db, models.Tag, name, current_user)
 
 def get_all_tags(db: Session, current_user: schemas.User) -> List[models.Tag]:
     """
@@ -128,7 +185,7 @@ def get_all_tags(db: Session, current_user: schemas.User) -> List[models.Tag]:
     Returns:
         List[models.Tag]: The list of objects.
     """
-    return db.query(models.Tag).filter(models.Tag.user_id == current_user.id).all()
+    return db.query(models.Tag).filter(models.Tag.user_id == current_user.id).order_by(models.Tag.id).all()
 
 
 def create_tag(db: Session, tag: schemas.TagCreate, current_user: schemas.User) -> models.Tag:
@@ -148,9 +205,116 @@ def create_tag(db: Session, tag: schemas.TagCreate, current_user: schemas.User)
     db_tag = models.Tag(**new_tag_dict)
     db.add(db_tag)
     db.commit()
-    db.refresh(db_tag)
+    invalidate_vocabulary(db, models.Tag, current_user.id)
     return db_tag
 
+# create many Tag objects at once
+# used by the bulk POST API endpoint for Tag objects
+
+def create_tags(db: Session, tags: List[schemas.TagCreate], current_user: schemas.User) -> Tuple[List[models.Tag], List[str]]:
+    """
+
+    Create many Tag objects in the database, using a single INSERT statement.
+
+    Args:
+        db (Session): The session used to access the database.
+        tags (List[schemas.TagCreate]): The objects to be created.
+        current_user (schemas.User): The user who's music library we're working in.
+
+    Returns:
+        Tuple[List[models.Tag], List[str]]: The newly created objects, and the names that were already in use.
+    """
+    created, conflicts = create_named_items(db, models.Tag, [tag.name for tag in tags], current_user.id)
+    db.commit()
+    if len(created) != 0:
+        invalidate_vocabulary(db, models.Tag, current_user.id)
+    return created, conflicts
+
+# associate a Tag object to many Song objects at once
+# used by the bulk POST API endpoint for the songs of a Tag object
+
+def add_tag_to_songs(db: Session, db_tag: models.Tag, songs: Query) -> int:
+    """
+
+    Associate a Tag object to all the Song objects selected by a query, using a single INSERT ... SELECT statement.
+
+    Args:
+        db (Session): The session used to access the database.
+        db_tag (models.Tag): The Tag object to be associated to the songs.
+        songs (Query): Selects the Song objects.
+
+    Returns:
+        int: The number of songs the tag was added to (the songs that already had it aren't counted).
+    """
+    nb_affected = associate_item_to_songs(db, models.TagSong, "tag_id", db_tag.id, songs)
+    db.commit()
+    return nb_affected
+
+# dissociate a Tag object from many Song objects at once
+# used by the bulk DELETE API endpoint for the songs of a Tag object
+
+def remove_tag_from_songs(db: Session, db_tag: models.Tag, songs: Query) -> int:
+    """
+
+    Dissociate a Tag object from all the Song objects selected by a query, using a single DELETE statement.
+
+    Args:
+        db (Session): The session used to access the database.
+        db_tag (models.Tag): The Tag object to be dissociated from the songs.
+        songs (Query): Selects the Song objects.
+
+    Returns:
+        int: The number of songs the tag was removed from.
+    """
+    nb_affected = dissociate_item_from_songs(db, models.TagSong, "tag_id", db_tag.id, songs)
+    db.commit()
+    return nb_affected
+
+# merge a Tag object into another one
+# used by the merge API endpoint for Tag objects
+
+def merge_tags(db: Session, db_tag: models.Tag, db_target: models.Tag, current_user: schemas.User) -> models.Tag:
+    """
+
+    Merge a Tag object into another one, in a single transaction.
+    The items associated to the tag are associated to the target instead, then the tag is deleted.
+
+    Args:
+        db (Session): The session used to access the database.
+        db_tag (models.Tag): The Tag object to be merged (and deleted).
+        db_target (models.Tag): The Tag object it's merged into.
+        current_user (schemas.User): The user who's music library we're working in.
+
+    Returns:
+        models.Tag: The target object.
+    """
+    merge_named_items(db, models.Tag, [(models.TagSong, "tag_id", "song_id"), (models.TagPlaylist, "tag_id", "playlist_id")], db_tag.id, db_target.id)
+    db.commit()
+    invalidate_vocabulary(db, models.Tag, current_user.id)
+    return db_target
+
+# rename many Tag objects at once
+# used by the bulk rename API endpoint for Tag objects
+
+def rename_tags(db: Session, renames: List[schemas.TagRename], current_user: schemas.User) -> Tuple[List[models.Tag], List[str], List[str]]:
+    """
+
+    Rename many Tag objects, using a single UPDATE statement.
+
+    Args:
+        db (Session): The session used to access the database.
+        renames (List[schemas.TagRename]): The current & new name of each object.
+        current_user (schemas.User): The user who's music library we're working in.
+
+    Returns:
+        Tuple[List[models.Tag], List[str], List[str]]: The renamed objects, the names that don't exist, and the new names that are already in use.
+    """
+    renamed, not_found, conflicts = rename_named_items(db, models.Tag, [(tag.name, tag.new_name) for tag in renames], current_user.id)
+    db.commit()
+    if len(renamed) != 0:
+        invalidate_vocabulary(db, models.Tag, current_user.id)
+    return renamed, not_found, conflicts
+
 def delete_tag_from_db(db: Session, name: str, current_user: schemas.User) -> models.Tag:
     """
 
@@ -165,16 +329,14 @@ def delete_tag_from_db(db: Session, name: str, current_user: schemas.User) -> mo
         models.Tag: The deleted object.
     """
     tag = get_tag_by_name(db, name, current_user)
-    # dissociate the Tag object from all the TagSong
-    # & TagPlaylist it was associated to
-    association_items = get_tag_tag_song_objects(db, tag)
-    for item in association_items:
-        crud.delete_tag_song_from_db(db, item.id)
-    association_items = get_tag_tag_playlist_objects(db, tag)
-    for item in association_items:
-        crud.delete_tag_playlist_from_db(db, item.id)
-    db.delete(tag)
+    # dissociate the Tag object from all the TagSong & TagPlaylist objects it was associated to
+    # --> a single DELETE statement per table, no matter how many there are
+    for association_model in [models.TagSong, models.TagPlaylist]:
+        db.query(association_model).filter(association_model.tag_id == tag.id).delete(synchronize_session=False)
+    # "evaluate" also removes the object from the session
+    db.query(models.Tag).filter(models.Tag.id == tag.id).delete(synchronize_session="evaluate")
     db.commit()
+    invalidate_vocabulary(db, models.Tag, current_user.id)
     return tag
 
 
@@ -198,5 +360,5 @@ def update_tag(db: Session, name: str, tag: schemas.TagUpdate, current_user: sch
     db_tag.name = tag.new_name
     db.add(db_tag)
     db.commit()
-    db.refresh(db_tag)
+    invalidate_vocabulary(db, models.Tag, current_user.id)
     return db_tag
\ No newline at end of file
@@ -7,6 +7,9 @@ from .. import models, schemas
 # checks for appropriate permissions aren't performed here
 # rather, they're performed in the files calling the following functions
 
+# these functions only flush their changes, they don't commit them
+# --> the function handling the whole operation (creating a song, updating a playlist, ...) commits once, at the end
+
 def get_tag_playlist_by_id(db: Session, id: int) -> models.TagPlaylist:
     """
 
@@ -64,8 +67,8 @@ def create_tag_playlist(db: Session, tag_playlist: schemas.TagPlaylistCreate) ->
     """
     db_tag_playlist = models.TagPlaylist(**tag_playlist.dict())
     db.add(db_tag_playlist)
-    db.commit()
-    db.refresh(db_tag_playlist)
+    # the ID is sent back by the INSERT statement, no need to refresh the object
+    db.flush()
     return db_tag_playlist
 
 def delete_tag_playlist_from_db(db: Session, id: int) -> models.TagPlaylist:
@@ -82,7 +85,7 @@ def delete_tag_playlist_from_db(db: Session, id: int) -> models.TagPlaylist:
     """
     tag_playlist = get_tag_playlist_by_id(db, id)
     db.delete(tag_playlist)
-    db.commit()
+    db.flush()
     return tag_playlist
 
 
@@ -106,6 +109,5 @@ def update_tag_playlist(db: Session, id: int, tag_playlist: schemas.TagPlaylistU
     if tag_playlist.tag_id is not None:
         db_tag_playlist.tag_id = tag_playlist.tag_id
     db.add(db_tag_playlist)
-    db.commit()
-    db.refresh(db_tag_playlist)
+    db.flush()
     return db_tag_playlist
\ No newline at end of file
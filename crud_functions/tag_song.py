@@ -7,6 +7,9 @@ from .. import models, schemas
 # checks for appropriate permissions aren't performed here
 # rather, they're performed in the files calling the following functions
 
+# these functions only flush their changes, they don't commit them
+# --> the function handling the whole operation (creating a song, updating a playlist, ...) commits once, at the end
+
 def get_tag_song_by_id(db: Session, id: int) -> models.TagSong:
     """
 
@@ -64,8 +67,8 @@ def create_tag_song(db: Session, tag_song: schemas.TagSongCreate) -> models.TagS
     """
     db_tag_song = models.TagSong(**tag_song.dict())
     db.add(db_tag_song)
-    db.commit()
-    db.refresh(db_tag_song)
+    # the ID is sent back by the INSERT statement, no need to refresh the object
+    db.flush()
     return db_tag_song
 
 def delete_tag_song_from_db(db: Session, id: int) -> models.TagSong:
@@ -82,7 +85,7 @@ def delete_tag_song_from_db(db: Session, id: int) -> models.TagSong:
     """
     tag_song = get_tag_song_by_id(db, id)
     db.delete(tag_song)
-    db.commit()
+    db.flush()
     return tag_song
 
 
@@ -106,6 +109,5 @@ def update_tag_song(db: Session, id: int, tag_song: schemas.TagSongUpdate) -> mo
     if tag_song.tag_id is not None:
         db_tag_song.tag_id = tag_song.tag_id
     db.add(db_tag_song)
-    db.commit()
-    db.refresh(db_tag_song)
+    db.flush()
     return db_tag_song
\ No newline at end of file
@@ -1,5 +1,12 @@
-from typing import List
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
 from sqlalchemy.orm import Session
+
+from ..cache import LRUCache
+
 from .. import models, schemas
 
 # some of those CRUD operations require the user to be authenticated
@@ -102,28 +109,152 @@ def create_user(db: Session, user: schemas.UserCreate) -> models.User:
     db_user = models.User(**user.dict())
     db.add(db_user)
     db.commit()
-    db.refresh(db_user)
     return db_user
 
-# careful with that one...
+# the users authenticated by the access tokens are cached in memory, indexed by username (the subject of the tokens)
+# --> most requests don't have to look up their user in the database
+# the cache is cleared for a user when they're updated, deactivated or deleted by this process
+# USER_CACHE_TTL bounds how long a change made by another process can go unnoticed
+
+USER_CACHE_SIZE = int(os.environ.get("USER_CACHE_SIZE", 1024))
+
+USER_CACHE_TTL = float(os.environ.get("USER_CACHE_TTL", 60))
+
+user_cache = LRUCache(max_size=USER_CACHE_SIZE, ttl=USER_CACHE_TTL)
+
+
+def get_user_cache_key(db: Session, username: str) -> tuple:
+    # the engine is part of the key, in case the process is connected to several databases
+    return (db.get_bind(), username)
+
 
-def delete_user_from_db(db: Session, username: str) -> models.User:
+def invalidate_user(db: Session, username: str):
+    user_cache.delete(get_user_cache_key(db, username))
+
+
+# doesn't access the database (safe to call from the event loop)
+
+def get_user_from_cache(db: Session, username: str) -> Optional[schemas.User]:
+    return user_cache.get(get_user_cache_key(db, username))
+
+
+def get_cached_user(db: Session, username: str) -> Optional[schemas.User]:
     """
 
-    Delete a User from the database.
+    Retrieve a User from the cache, or from the database if it isn't cached yet.
 
     Args:
         db (Session): The session used to access the database.
         username (str): The value of the record's 'username' cell.
 
     Returns:
-        models.User: The deleted User object.
+        Optional[schemas.User]: The User object (if found), None (if not found).
+    """
+    user = get_user_from_cache(db, username)
+    if user is None:
+        db_user = get_user_by_username(db, username)
+        if db_user is None:
+            return None
+        user = schemas.User.from_orm(db_user)
+        user_cache.set(get_user_cache_key(db, username), user)
+    return user
+
+# the time of the last change made to each user (update, deactivation, deletion), indexed by user ID
+# the access tokens carry a copy of the user (see auth.py), issued at a given time
+# --> a token issued before the last change of its user is out of date, the user is looked up instead
+# the process start time counts as a change for every user (changes made before that are unknown)
+# the changes made by other processes aren't recorded here, TOKEN_CLAIMS_TRUST_SECONDS (see auth.py) bounds how long they go unnoticed
+# USER_CHANGES_RETENTION must exceed TOKEN_CLAIMS_TRUST_SECONDS (the claims of older tokens aren't trusted anyway)
+
+USER_CHANGES_RETENTION = float(os.environ.get("USER_CHANGES_RETENTION", 2 * 60 * 60))
+
+PROCESS_STARTED_AT = time.time()
+
+user_changes: Dict[int, float] = {}
+user_changes_lock = threading.Lock()
+
+
+def record_user_change(user_id: int):
+    now = time.time()
+    with user_changes_lock:
+        user_changes[user_id] = now
+        # forget the changes older than any token still trusted
+        for changed_user_id, changed_at in list(user_changes.items()):
+            if now - changed_at > USER_CHANGES_RETENTION:
+                del user_changes[changed_user_id]
+
+
+def get_user_changed_at(user_id: int) -> float:
+    """
+
+    Get the time of the last change made to a user, by this process.
+
+    Args:
+        user_id (int): The ID of the user.
+
+    Returns:
+        float: The time of the last change (as a UNIX timestamp), the process start time if there wasn't any.
+    """
+    with user_changes_lock:
+        return user_changes.get(user_id, PROCESS_STARTED_AT)
+
+def deactivate_user(db: Session, username: str) -> models.User:
+    """
+
+    Mark a User as inactive, so that they can't log in or make changes anymore.
+
+    Args:
+        db (Session): The session used to access the database.
+        username (str): The value of the record's 'username' cell.
+
+    Returns:
+        models.User: The deactivated User object.
     """
     user = get_user_by_username(db, username=username)
-    db.delete(user)
+    user.is_active = False
     db.commit()
+    invalidate_user(db, username)
+    record_user_change(user.id)
     return user
 
+def request_user_deletion(db: Session, username: str) -> models.User:
+    """
+
+    Deactivate a User & record that their account must be deleted.
+    The user is only deleted once their music library is purged, in the background (see purge.py).
+
+    Args:
+        db (Session): The session used to access the database.
+        username (str): The value of the record's 'username' cell.
+
+    Returns:
+        models.User: The deactivated User object.
+    """
+    user = get_user_by_username(db, username=username)
+    user.is_active = False
+    user.deletion_requested_at = datetime.utcnow()
+    db.commit()
+    invalidate_user(db, username)
+    record_user_change(user.id)
+    return user
+
+def update_user_password_hash(db: Session, db_user: models.User, hashed_password: str) -> models.User:
+    """
+
+    Replace the password hash of a User (used to upgrade the hashes made under an older hashing policy).
+
+    Args:
+        db (Session): The session used to access the database.
+        db_user (models.User): The User object stored in the database.
+        hashed_password (str): The new hash of the user's password.
+
+    Returns:
+        models.User: The updated User object.
+    """
+    db_user.hashed_password = hashed_password
+    db.commit()
+    return db_user
+
 def update_user(db: Session, updater: str, username: str, user: schemas.UserUpdate) -> models.User:
     """
 
@@ -153,5 +284,6 @@ def update_user(db: Session, updater: str, username: str, user: schemas.UserUpda
         db_user.username = user.new_username
     db.add(db_user)
     db.commit()
-    db.refresh(db_user)
+    invalidate_user(db, username)
+    record_user_change(db_user.id)
     return db_user
@@ -1,6 +1,7 @@
 import re
-from typing import List
-from sqlalchemy.orm import Session
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from sqlalchemy import case, exists, insert, literal
+from sqlalchemy.orm import Query, Session
 
 from ..utility import raise_http_400
 
@@ -8,11 +9,191 @@ from .. import models, crud
 
 # this file is used simply to privide tools used in our crud functions
 
+# the maximum number of values sent in a single IN (...) filter
+# bigger lists are split into several queries
+
+MAX_IN_VALUES = 500
+
+
+def split_in_chunks(items: List, chunk_size: int = MAX_IN_VALUES) -> List[List]:
+    return [items[i:i + chunk_size] for i in range(0, len(items), chunk_size)]
+
+
+# for a provided list of names, return the ID of each Tag (or Genre, or Artist) object owned by the user
+# using a single query per chunk of names (names that weren't found are missing)
+
+def get_item_ids_by_names(db: Session, model, names: List[str], user_id: int) -> Dict[str, int]:
+    ids = {}
+    for chunk in split_in_chunks(list(set(names))):
+        rows = db.query(model.id, model.name) \
+            .filter(model.user_id == user_id) \
+            .filter(model.name.in_(chunk)) \
+            .order_by(model.id) \
+            .all()
+        for item_id, name in rows:
+            ids.setdefault(name, item_id)
+    return ids
+
+
+# create many Tag (or Genre, or Artist, or Playlist) objects at once, using a single INSERT statement
+# the names already used by the user (or listed twice) are returned as conflicts instead of being created
+# the changes aren't committed, that's up to the caller
+
+def create_named_items(db: Session, model, names: List[str], user_id: int) -> Tuple[List, List[str]]:
+    existing_ids = get_item_ids_by_names(db, model, names, user_id)
+    new_names = []
+    conflicts = []
+    for name in names:
+        if name in existing_ids:
+            conflicts.append(name)
+        else:
+            new_names.append(name)
+            existing_ids[name] = None
+    if len(new_names) == 0:
+        return [], conflicts
+    db.execute(insert(model), [{"name": name, "user_id": user_id} for name in new_names])
+    created = []
+    for chunk in split_in_chunks(new_names):
+        created += db.query(model).filter(model.user_id == user_id).filter(model.name.in_(chunk)).all()
+    created.sort(key=lambda item: item.id)
+    return created, conflicts
+
+
+# replace the items associated to an object (a Song or a Playlist) with a new set of items, using their IDs
+# the difference is computed in memory, then applied with a single DELETE & a single INSERT statement
+# --> the number of queries doesn't depend on the number of items
+# the changes aren't committed, that's up to the caller
+
+def update_associations(db: Session, association_model, owner_column: str, owner_id: int, item_column: str, item_ids: Iterable[int]) -> Tuple[Set[int], Set[int]]:
+    owner_key = getattr(association_model, owner_column)
+    item_key = getattr(association_model, item_column)
+    current_ids = {item_id for item_id, in db.query(item_key).filter(owner_key == owner_id).all()}
+    new_ids = set(item_ids)
+    removed_ids = current_ids - new_ids
+    added_ids = new_ids - current_ids
+    for chunk in split_in_chunks(sorted(removed_ids)):
+        db.query(association_model) \
+            .filter(owner_key == owner_id) \
+            .filter(item_key.in_(chunk)) \
+            .delete(synchronize_session=False)
+    if len(added_ids) > 0:
+        db.execute(insert(association_model), [{owner_column: owner_id, item_column: item_id} for item_id in sorted(added_ids)])
+    return added_ids, removed_ids
+
+
+# associate an item (a Tag or a Genre) to all the songs selected by a query, using a single INSERT ... SELECT statement
+# the songs already associated to the item are skipped
+# the changes aren't committed, that's up to the caller
+
+def associate_item_to_songs(db: Session, association_model, item_column: str, item_id: int, songs: Query) -> int:
+    item_key = getattr(association_model, item_column)
+    already_associated = exists() \
+        .where(association_model.song_id == models.Song.id) \
+        .where(item_key == item_id)
+    selected = songs.order_by(None) \
+        .filter(~already_associated) \
+        .with_entities(literal(item_id), models.Song.id)
+    result = db.execute(insert(association_model).from_select([item_column, "song_id"], selected.statement))
+    return result.rowcount
+
+
+# dissociate an item (a Tag or a Genre) from all the songs selected by a query, using a single DELETE statement
+# the changes aren't committed, that's up to the caller
+
+def dissociate_item_from_songs(db: Session, association_model, item_column: str, item_id: int, songs: Query) -> int:
+    item_key = getattr(association_model, item_column)
+    song_ids = songs.order_by(None).with_entities(models.Song.id)
+    return db.query(association_model) \
+        .filter(item_key == item_id) \
+        .filter(association_model.song_id.in_(song_ids.statement)) \
+        .delete(synchronize_session=False)
+
+
+# merge an item (a Tag, a Genre or an Artist) into another one owned by the same user
+# associations lists each association table, with the column referencing the item & the one referencing the other side
+# - the links the target already has are removed from the source
+# - the remaining links of the source are repointed to the target, with a single UPDATE statement per table
+# - the source item is deleted
+# the changes aren't committed, that's up to the caller
+
+def merge_named_items(db: Session, model, associations: List[Tuple], source_id: int, target_id: int):
+    for association_model, item_column, other_column in associations:
+        item_key = getattr(association_model, item_column)
+        other_key = getattr(association_model, other_column)
+        target_links = db.query(other_key).filter(item_key == target_id)
+        db.query(association_model) \
+            .filter(item_key == source_id) \
+            .filter(other_key.in_(target_links.statement)) \
+            .delete(synchronize_session=False)
+        db.query(association_model) \
+            .filter(item_key == source_id) \
+            .update({item_column: target_id}, synchronize_session=False)
+    # "evaluate" also removes the object from the session
+    db.query(model).filter(model.id == source_id).delete(synchronize_session="evaluate")
+
+
+# rename many Tag (or Genre, or Artist) objects at once, using a single UPDATE statement (per chunk of items)
+# returns the renamed items, the names that don't exist, and the new names that are already in use (or requested twice)
+# the changes aren't committed, that's up to the caller
+
+def rename_named_items(db: Session, model, renames: List[Tuple[str, str]], user_id: int) -> Tuple[List, List[str], List[str]]:
+    ids = get_item_ids_by_names(db, model, [name for pair in renames for name in pair], user_id)
+    new_names = {}
+    not_found = []
+    conflicts = []
+    for name, new_name in renames:
+        if name not in ids:
+            not_found.append(name)
+        elif ids[name] in new_names or new_name in new_names.values() or (new_name != name and new_name in ids):
+            conflicts.append(new_name)
+        else:
+            new_names[ids[name]] = new_name
+    renamed = []
+    for chunk in split_in_chunks(list(new_names)):
+        db.query(model) \
+            .filter(model.id.in_(chunk)) \
+            .update({model.name: case({item_id: new_names[item_id] for item_id in chunk}, value=model.id)}, synchronize_session=False)
+        # the items may already be in the session, with their old name
+        renamed += db.query(model).filter(model.id.in_(chunk)).populate_existing().all()
+    renamed.sort(key=lambda item: item.id)
+    return renamed, not_found, conflicts
+
+
 # for a provided Song object, return its full title
 # formatted as such --> '<artist> - <song_title>'
 
 def get_full_song_title(db: Session, song: models.Song) -> str:
-    return f"{crud.get_song_artists(db, song)[0]} - {song.title}"
+    return get_full_song_titles(db, [song.id])[song.id]
+
+
+# for a provided list of Song IDs, return the full title of each song
+# using a single query per chunk of MAX_IN_VALUES songs
+# the artist used in the title is the first one associated to the song
+
+def get_full_song_titles(db: Session, song_ids: List[int]) -> Dict[int, str]:
+    full_titles = {}
+    if len(song_ids) == 0:
+        return full_titles
+    for chunk in split_in_chunks(list(set(song_ids))):
+        rows = db.query(models.Song.id, models.Song.title, models.Artist.name) \
+            .join(models.ArtistSong, models.ArtistSong.song_id == models.Song.id) \
+            .join(models.Artist, models.Artist.id == models.ArtistSong.artist_id) \
+            .filter(models.Song.id.in_(chunk)) \
+            .order_by(models.Artist.id) \
+            .all()
+        for song_id, song_title, artist_name in rows:
+            if song_id not in full_titles:
+                full_titles[song_id] = f"{artist_name} - {song_title}"
+    return full_titles
+
+
+# each item can only be associated once to a song or a playlist
+# --> used to ignore the items listed more than once (keeps the first occurrence)
+
+def remove_duplicates(items: Optional[List[str]]) -> Optional[List[str]]:
+    if items is None:
+        return None
+    return list(dict.fromkeys(items))
 
 
 # The following function verifies that the string given as an argument
@@ -28,4 +209,80 @@ def unpack_full_song_title(full_song_title: str) -> List[str]:
     if not is_song_title_formatted_correctly(full_song_title):
         raise_http_400(f"'{full_song_title}' is not a valid song title.")
     return full_song_title.split(' - ')
-    
\ No newline at end of file
+    
+
+# harmonic mixing
+# each key is stored as a code derived from its position on the Camelot wheel
+# --> key_code = (camelot_number - 1) * 2 + (1 if major else 0), between 0 & 23
+# e.g. 'G Major' == 9B --> 17, 'C# Minor' == 12A --> 22
+
+NOTE_PITCH_CLASSES = {"c": 0, "d": 2, "e": 4, "f": 5, "g": 7, "a": 9, "b": 11}
+
+KEY_NAME_PATTERN = re.compile(r"^([a-g])\s*(#|♯|b|♭|sharp|flat)?\s*(major|maj|minor|min|m)?$")
+CAMELOT_KEY_PATTERN = re.compile(r"^(1[0-2]|[1-9])\s*([ab])$")
+OPEN_KEY_PATTERN = re.compile(r"^(1[0-2]|[1-9])\s*([dm])$")
+
+
+def get_key_code(camelot_number: int, is_major: bool) -> int:
+    return (camelot_number - 1) * 2 + (1 if is_major else 0)
+
+
+def parse_key_code(key: str) -> Optional[int]:
+    """
+
+    Compute the key code of a musical key.
+
+    Args:
+        key (str): The key, written either as a name ('G Major', 'C#m', 'Bb min'), in Camelot notation ('9B') or in Open Key notation ('2d').
+
+    Returns:
+        Optional[int]: The key code, None if the key couldn't be parsed.
+    """
+    key = key.strip().lower()
+    match = CAMELOT_KEY_PATTERN.match(key)
+    if match:
+        return get_key_code(int(match.group(1)), match.group(2) == "b")
+    match = OPEN_KEY_PATTERN.match(key)
+    if match:
+        # 1d (C Major) is 8B on the Camelot wheel
+        return get_key_code((int(match.group(1)) + 6) % 12 + 1, match.group(2) == "d")
+    match = KEY_NAME_PATTERN.match(key)
+    if not match:
+        return None
+    note, accidental, mode = match.groups()
+    pitch_class = NOTE_PITCH_CLASSES[note]
+    if accidental in ("#", "♯", "sharp"):
+        pitch_class += 1
+    elif accidental in ("b", "♭", "flat"):
+        pitch_class -= 1
+    is_major = mode is None or mode in ("major", "maj")
+    # minor keys share their number with their relative major
+    if not is_major:
+        pitch_class += 3
+    # moving up a fifth moves one step clockwise on the wheel, C Major being 8B
+    camelot_number = ((pitch_class * 7) % 12 + 7) % 12 + 1
+    return get_key_code(camelot_number, is_major)
+
+
+def get_compatible_key_codes(key_code: int) -> List[int]:
+    """
+
+    List the key codes that can be mixed harmonically with a given key
+    (same key, one step away on the wheel or relative major / minor).
+
+    Args:
+        key_code (int): The key code.
+
+    Returns:
+        List[int]: The compatible key codes, including the provided one.
+    """
+    camelot_number = key_code // 2 + 1
+    is_major = key_code % 2 == 1
+    previous_number = (camelot_number - 2) % 12 + 1
+    next_number = camelot_number % 12 + 1
+    return [
+        key_code,
+        get_key_code(previous_number, is_major),
+        get_key_code(next_number, is_major),
+        get_key_code(camelot_number, not is_major)
+    ]
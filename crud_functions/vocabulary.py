@@ -0,0 +1,107 @@
+import os
+import threading
+from typing import Dict, Tuple
+from sqlalchemy.orm import Session
+
+from ..cache import LRUCache
+
+from .. import schemas
+
+# this file implements the cache used to look up tags, genres & artists by name
+#
+# the vocabulary of a user is the name -> id map of their Tag (or Genre, or Artist) objects
+# - it's loaded with a single query the first time it's needed, then kept in memory (LRU eviction)
+# - each vocabulary has a version number, bumped every time one of its items is created, renamed or deleted
+#   --> a map loaded before a change is never stored after it
+# - the version is kept in the cache entry, along with the map, so that forgotten vocabularies don't use any memory
+# - a cache hit is always checked against the database (by primary key), since other processes may have changed it
+#   --> the cache can be out of date, but the lookups can't
+#   the entries also expire after VOCABULARY_CACHE_TTL seconds, so that an out of date map gets reloaded
+
+
+# the number of vocabularies kept in memory (one per user & per model)
+
+VOCABULARY_CACHE_SIZE = int(os.environ.get("VOCABULARY_CACHE_SIZE", 1024))
+
+VOCABULARY_CACHE_TTL = float(os.environ.get("VOCABULARY_CACHE_TTL", 60))
+
+# each entry is a (version, vocabulary) pair, the vocabulary is None once it's been invalidated
+
+vocabulary_cache = LRUCache(max_size=VOCABULARY_CACHE_SIZE, ttl=VOCABULARY_CACHE_TTL)
+vocabulary_lock = threading.Lock()
+
+
+def get_vocabulary_key(db: Session, model, user_id: int) -> Tuple:
+    # the engine is part of the key, in case the process is connected to several databases
+    return (db.get_bind(), model.__tablename__, user_id)
+
+
+def invalidate_vocabulary(db: Session, model, user_id: int):
+    """
+
+    Make sure the cached vocabulary of a user isn't used anymore, after one of its items was created, renamed or deleted.
+
+    Args:
+        db (Session): The session used to access the database.
+        model: The model the vocabulary is made of (models.Tag, models.Genre or models.Artist).
+        user_id (int): The ID of the user who's vocabulary changed.
+    """
+    key = get_vocabulary_key(db, model, user_id)
+    with vocabulary_lock:
+        version, _ = vocabulary_cache.get(key, (0, None))
+        vocabulary_cache.set(key, (version + 1, None))
+
+
+def get_vocabulary(db: Session, model, user_id: int) -> Dict[str, int]:
+    """
+
+    Get the name -> id map of a user's Tag (or Genre, or Artist) objects, from the cache if possible.
+
+    Args:
+        db (Session): The session used to access the database.
+        model: The model the vocabulary is made of (models.Tag, models.Genre or models.Artist).
+        user_id (int): The ID of the user who's vocabulary we want.
+
+    Returns:
+        Dict[str, int]: The ID of each item, indexed by name.
+    """
+    key = get_vocabulary_key(db, model, user_id)
+    version, vocabulary = vocabulary_cache.get(key, (0, None))
+    if vocabulary is None:
+        rows = db.query(model.id, model.name).filter(model.user_id == user_id).order_by(model.id).all()
+        vocabulary = {}
+        for item_id, name in rows:
+            vocabulary.setdefault(name, item_id)
+        with vocabulary_lock:
+            # the vocabulary may have changed while it was being loaded
+            if vocabulary_cache.get(key, (0, None))[0] == version:
+                vocabulary_cache.set(key, (version, vocabulary))
+    return vocabulary
+
+
+def get_item_by_name(db: Session, model, name: str, current_user: schemas.User):
+    """
+
+    Retrieve a Tag (or Genre, or Artist) object from the database using the value of its 'name' cell, using the vocabulary cache.
+
+    Args:
+        db (Session): The session used to access the database.
+        model: The model of the object (models.Tag, models.Genre or models.Artist).
+        name (str): The value of the record's 'name' cell.
+        current_user (schemas.User): The user who's music library we're working in.
+
+    Returns:
+        The retrieved object (if found), None (if not found).
+    """
+    item_id = get_vocabulary(db, model, current_user.id).get(name)
+    if item_id is not None:
+        # usually found in the session's identity map, or fetched by primary key
+        item = db.get(model, item_id)
+        if item is not None and item.name == name and item.user_id == current_user.id:
+            return item
+    # not in the cache (or out of date)
+    # --> ask the database, the item may have been created or renamed by another process
+    item = db.query(model).filter(model.user_id == current_user.id).filter(model.name == name).first()
+    if item is not None or item_id is not None:
+        invalidate_vocabulary(db, model, current_user.id)
+    return item
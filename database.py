@@ -21,8 +21,9 @@ engine = create_engine(
 
 
 # fresh session
+# objects aren't expired on commit, so that they can still be used (and sent back) without being reloaded
 
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=engine)
 
 
 # fresh base
@@ -11,7 +11,10 @@ from .auth import *
 
 from . import models
 from .database import engine
+from .migrations import run_migrations
 from .utility import *
+from .search_functions.text_index import setup_text_index
+from .crud_functions.purge import resume_purges
 
 # import our routers
 
@@ -25,6 +28,12 @@ from .routers import playlists
 # init
 
 models.Base.metadata.create_all(bind=engine)
+# create_all() skips the tables that already exist
+# --> the columns & indexes added since then are added by the migrations
+run_migrations(engine)
+setup_text_index(engine)
+# the accounts deleted before the last shutdown may still have a music library
+resume_purges(engine)
 
 
 app = FastAPI()
@@ -37,6 +46,7 @@ app = FastAPI()
 app.include_router(users.router)
 app.include_router(tags.router)
 app.include_router(genres.router)
+# before the songs router, see get_artist_songs_using_name()
 app.include_router(artists.router)
 app.include_router(songs.router)
 app.include_router(playlists.router)
@@ -48,7 +58,7 @@ app.include_router(playlists.router)
 
 @app.post("/token/", response_model=Token)
 async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
-    user = authenticate_user(db, form_data.username, form_data.password)
+    user = await authenticate_user_async(db, form_data.username, form_data.password)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED, 
@@ -57,7 +67,7 @@ async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(
         )
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
-        data={"sub": user.username},
+        data=get_token_claims(user),
         expires_delta=access_token_expires
     )
     return {"access_token": access_token, "token_type": "bearer"}
@@ -0,0 +1,224 @@
+from datetime import datetime
+from typing import Callable, List, Optional, Tuple
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, inspect, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from . import crud
+from .search_functions.text_index import TEXT_INDEXED_COLUMNS
+
+
+# this file implements the versioned migrations applied to existing databases
+# (create_all() only creates the tables that don't exist yet, not the columns & indexes added since then)
+#
+# - each migration has a version number, and is applied once, in order
+# - the versions already applied are stored in the schema_version table
+# - migrations are idempotent, so that a database created by create_all() (which already has everything)
+#   or a migration interrupted half-way through can safely go through them again
+# - on PostgreSQL, indexes are built with CREATE INDEX CONCURRENTLY
+#   --> the tables stay readable & writable while the indexes are being built
+
+
+# the table storing the versions already applied
+# declared in its own MetaData object, it's not part of our database diagram
+
+migrations_metadata = MetaData()
+
+schema_version = Table(
+    "schema_version", migrations_metadata,
+    Column("version", Integer, primary_key=True),
+    Column("description", String),
+    Column("applied_at", DateTime),
+)
+
+
+# the association tables & the columns referencing the two associated tables
+
+ASSOCIATION_TABLES = {
+    "tag_song": ("tag_id", "song_id"),
+    "tag_playlist": ("tag_id", "playlist_id"),
+    "genre_song": ("genre_id", "song_id"),
+    "artist_song": ("artist_id", "song_id"),
+    "song_playlist": ("song_id", "playlist_id"),
+}
+
+
+# tools used by the migrations
+
+def create_index(
+    engine: Engine,
+    name: str,
+    table_name: str,
+    column_names: List[str],
+    unique: bool = False,
+    using: Optional[str] = None,
+    expressions: Optional[List[str]] = None
+):
+    """
+
+    Create an index if it doesn't exist yet, without locking the table on PostgreSQL.
+
+    Args:
+        engine (Engine): The engine connected to the database.
+        name (str): The name of the index.
+        table_name (str): The table to index.
+        column_names (List[str]): The indexed columns, in order.
+        unique (bool): Whether the index should enforce uniqueness.
+        using (Optional[str]): The index method (e.g. 'gin'), the database's default if not provided.
+        expressions (Optional[List[str]]): The SQL expressions indexed instead of the plain columns.
+    """
+    columns = ", ".join(expressions or [f'"{column_name}"' for column_name in column_names])
+    unique_keyword = "UNIQUE " if unique else ""
+    using_clause = f" USING {using}" if using is not None else ""
+    if engine.dialect.name == "postgresql":
+        # CREATE INDEX CONCURRENTLY can't run inside a transaction
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+            # an interrupted concurrent build leaves an invalid index behind
+            # --> drop it, or IF NOT EXISTS would skip it forever
+            is_invalid = connection.execute(
+                text(
+                    "SELECT 1 FROM pg_index JOIN pg_class ON pg_class.oid = pg_index.indexrelid "
+                    "WHERE pg_class.relname = :name AND NOT pg_index.indisvalid"
+                ),
+                {"name": name}
+            ).first() is not None
+            if is_invalid:
+                connection.execute(text(f'DROP INDEX CONCURRENTLY IF EXISTS "{name}"'))
+            connection.execute(text(
+                f'CREATE {unique_keyword}INDEX CONCURRENTLY IF NOT EXISTS "{name}" ON "{table_name}"{using_clause} ({columns})'
+            ))
+    else:
+        with engine.begin() as connection:
+            connection.execute(text(
+                f'CREATE {unique_keyword}INDEX IF NOT EXISTS "{name}" ON "{table_name}"{using_clause} ({columns})'
+            ))
+
+
+def has_column(engine: Engine, table_name: str, column_name: str) -> bool:
+    return column_name in [column["name"] for column in inspect(engine).get_columns(table_name)]
+
+
+# the migrations
+
+def add_song_key_code(engine: Engine):
+    # the key code used by the harmonic mixing search
+    if not has_column(engine, "song", "key_code"):
+        with engine.begin() as connection:
+            connection.execute(text("ALTER TABLE song ADD COLUMN key_code INTEGER"))
+    with Session(bind=engine) as db:
+        crud.backfill_song_key_codes(db)
+
+
+def add_song_search_indexes(engine: Engine):
+    # used by the range & harmonic mixing filters of the song search
+    for column_name in ["bpm", "duration", "release_date", "key_code"]:
+        create_index(engine, f"ix_song_user_id_{column_name}", "song", ["user_id", column_name])
+
+
+def add_name_indexes(engine: Engine):
+    # every get_*_by_name() lookup filters on the owner & the name
+    for table_name in ["tag", "genre", "artist", "playlist"]:
+        create_index(engine, f"ix_{table_name}_user_id_name", table_name, ["user_id", "name"])
+    create_index(engine, "ix_song_user_id_title", "song", ["user_id", "title"])
+
+
+def add_association_indexes(engine: Engine):
+    # each pair can only be stored once
+    # --> remove the duplicates before creating the unique indexes
+    for table_name, (first_column, second_column) in ASSOCIATION_TABLES.items():
+        with engine.begin() as connection:
+            connection.execute(text(
+                f'DELETE FROM "{table_name}" WHERE id NOT IN '
+                f'(SELECT MIN(id) FROM "{table_name}" GROUP BY "{first_column}", "{second_column}")'
+            ))
+        # used to look up a pair & the items associated to the first column
+        create_index(engine, f"ix_{table_name}_{first_column}_{second_column}", table_name, [first_column, second_column], unique=True)
+        # used to look up the items associated to the second column
+        create_index(engine, f"ix_{table_name}_{second_column}_{first_column}", table_name, [second_column, first_column])
+
+
+def add_user_deletion_requested_at(engine: Engine):
+    # the accounts waiting for their music library to be purged (see purge.py)
+    if not has_column(engine, "user", "deletion_requested_at"):
+        with engine.begin() as connection:
+            connection.execute(text('ALTER TABLE "user" ADD COLUMN deletion_requested_at TIMESTAMP'))
+
+
+def add_text_search_indexes(engine: Engine):
+    # the pg_trgm GIN indexes used by the substring search on PostgreSQL (see text_index.py)
+    # SQLite uses FTS5 tables instead, set up by setup_text_index()
+    if engine.dialect.name != "postgresql":
+        return
+    try:
+        with engine.begin() as connection:
+            connection.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+    except Exception:
+        # not allowed to install the extension
+        # --> the search falls back to the plain LIKE filters
+        return
+    for table_name, column_names in TEXT_INDEXED_COLUMNS.items():
+        for column_name in column_names:
+            create_index(
+                engine, f"ix_{table_name}_{column_name}_trgm", table_name, [column_name],
+                using="gin", expressions=[f'lower("{column_name}") gin_trgm_ops']
+            )
+
+
+MIGRATIONS: List[Tuple[int, str, Callable[[Engine], None]]] = [
+    (1, "Add song.key_code", add_song_key_code),
+    (2, "Add the song search indexes", add_song_search_indexes),
+    (3, "Add the (user_id, name) & (user_id, title) indexes", add_name_indexes),
+    (4, "Add the association tables indexes", add_association_indexes),
+    (5, "Add user.deletion_requested_at", add_user_deletion_requested_at),
+    (6, "Add the pg_trgm text search indexes", add_text_search_indexes),
+]
+
+
+def get_schema_version(engine: Engine) -> int:
+    """
+
+    Get the version of the database schema.
+
+    Args:
+        engine (Engine): The engine connected to the database.
+
+    Returns:
+        int: The version of the last migration applied, 0 if none were.
+    """
+    migrations_metadata.create_all(bind=engine)
+    with engine.connect() as connection:
+        versions = [row.version for row in connection.execute(schema_version.select())]
+    return max(versions, default=0)
+
+
+def run_migrations(engine: Engine) -> List[int]:
+    """
+
+    Apply the migrations that haven't been applied yet.
+    This function is called every time the API starts, after create_all().
+
+    Args:
+        engine (Engine): The engine connected to the database.
+
+    Returns:
+        List[int]: The versions of the migrations applied.
+    """
+    current_version = get_schema_version(engine)
+    applied = []
+    for version, description, migrate in MIGRATIONS:
+        if version <= current_version:
+            continue
+        migrate(engine)
+        try:
+            with engine.begin() as connection:
+                connection.execute(schema_version.insert().values(
+                    version=version,
+                    description=description,
+                    applied_at=datetime.utcnow()
+                ))
+        except IntegrityError:
+            # another instance of the API applied it at the same time
+            continue
+        applied.append(version)
+    return applied
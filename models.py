@@ -1,6 +1,6 @@
 from datetime import datetime
 
-from sqlalchemy import Boolean, Column, ForeignKey, Integer, Interval, String, Date
+from sqlalchemy import Boolean, Column, DateTime, ForeignKey, Index, Integer, Interval, String, Date
 from sqlalchemy.orm import relationship
 from .database import Base
 
@@ -18,6 +18,8 @@ class User(Base):
     email = Column(String, unique=True, index=True)
     hashed_password = Column(String)
     is_active = Column(Boolean, default=True)
+    # set when the account is deleted, the user is removed once their music library is purged
+    deletion_requested_at = Column(DateTime)
     tags = relationship("Tag")
     genres = relationship("Genre")
     artists = relationship("Artist")
@@ -33,6 +35,11 @@ class Tag(Base):
     songs = relationship("TagSong")
     playlists = relationship("TagPlaylist")
 
+    # used by get_tag_by_name()
+    __table_args__ = (
+        Index("ix_tag_user_id_name", "user_id", "name"),
+    )
+
 
 class TagSong(Base):
     __tablename__ = "tag_song"
@@ -41,6 +48,12 @@ class TagSong(Base):
     tag_id = Column(Integer, ForeignKey('tag.id'))
     song_id = Column(Integer, ForeignKey('song.id'))
 
+    # each pair is stored once, and can be looked up from both sides
+    __table_args__ = (
+        Index("ix_tag_song_tag_id_song_id", "tag_id", "song_id", unique=True),
+        Index("ix_tag_song_song_id_tag_id", "song_id", "tag_id"),
+    )
+
 class TagPlaylist(Base):
     __tablename__ = "tag_playlist"
 
@@ -48,6 +61,12 @@ class TagPlaylist(Base):
     tag_id = Column(Integer, ForeignKey('tag.id'))
     playlist_id = Column(Integer, ForeignKey('playlist.id'))
 
+    # each pair is stored once, and can be looked up from both sides
+    __table_args__ = (
+        Index("ix_tag_playlist_tag_id_playlist_id", "tag_id", "playlist_id", unique=True),
+        Index("ix_tag_playlist_playlist_id_tag_id", "playlist_id", "tag_id"),
+    )
+
 class Genre(Base):
     __tablename__ = "genre"
 
@@ -56,6 +75,11 @@ class Genre(Base):
     user_id = Column(Integer, ForeignKey('user.id'))
     songs = relationship("GenreSong")
 
+    # used by get_genre_by_name()
+    __table_args__ = (
+        Index("ix_genre_user_id_name", "user_id", "name"),
+    )
+
 class GenreSong(Base):
     __tablename__ = "genre_song"
 
@@ -63,6 +87,12 @@ class GenreSong(Base):
     genre_id = Column(Integer, ForeignKey('genre.id'))
     song_id = Column(Integer, ForeignKey('song.id'))
 
+    # each pair is stored once, and can be looked up from both sides
+    __table_args__ = (
+        Index("ix_genre_song_genre_id_song_id", "genre_id", "song_id", unique=True),
+        Index("ix_genre_song_song_id_genre_id", "song_id", "genre_id"),
+    )
+
 class Artist(Base):
     __tablename__ = "artist"
 
@@ -71,6 +101,11 @@ class Artist(Base):
     user_id = Column(Integer, ForeignKey('user.id'))
     songs = relationship("ArtistSong")
 
+    # used by get_artist_by_name()
+    __table_args__ = (
+        Index("ix_artist_user_id_name", "user_id", "name"),
+    )
+
 class ArtistSong(Base):
     __tablename__ = "artist_song"
 
@@ -78,6 +113,12 @@ class ArtistSong(Base):
     artist_id = Column(Integer, ForeignKey('artist.id'))
     song_id = Column(Integer, ForeignKey('song.id'))
 
+    # each pair is stored once, and can be looked up from both sides
+    __table_args__ = (
+        Index("ix_artist_song_artist_id_song_id", "artist_id", "song_id", unique=True),
+        Index("ix_artist_song_song_id_artist_id", "song_id", "artist_id"),
+    )
+
 
 class Song(Base):
     __tablename__ = "song"
@@ -85,6 +126,9 @@ class Song(Base):
     id = Column(Integer, primary_key=True, index=True)
     title = Column(String, index=True, nullable=False)
     key = Column(String, nullable=False)
+    # position of the key on the Camelot wheel, computed from 'key' when the song is written
+    # (see parse_key_code() in crud_functions/utils.py)
+    key_code = Column(Integer)
     bpm = Column(Integer, nullable=False)
     url = Column(String, nullable=False)
     duration = Column(Interval, nullable=False)
@@ -95,6 +139,17 @@ class Song(Base):
     artists = relationship("ArtistSong")
     playlists = relationship("SongPlaylist")
 
+    # used by the range & harmonic mixing filters of the song search
+    # (songs are always searched within a user's library)
+    __table_args__ = (
+        Index("ix_song_user_id_bpm", "user_id", "bpm"),
+        Index("ix_song_user_id_duration", "user_id", "duration"),
+        Index("ix_song_user_id_release_date", "user_id", "release_date"),
+        Index("ix_song_user_id_key_code", "user_id", "key_code"),
+        # used by get_song_by_title()
+        Index("ix_song_user_id_title", "user_id", "title"),
+    )
+
 class SongPlaylist(Base):
     __tablename__ = "song_playlist"
 
@@ -102,6 +157,12 @@ class SongPlaylist(Base):
     song_id = Column(Integer, ForeignKey('song.id'))
     playlist_id = Column(Integer, ForeignKey('playlist.id'))
 
+    # each pair is stored once, and can be looked up from both sides
+    __table_args__ = (
+        Index("ix_song_playlist_song_id_playlist_id", "song_id", "playlist_id", unique=True),
+        Index("ix_song_playlist_playlist_id_song_id", "playlist_id", "song_id"),
+    )
+
 
 class Playlist(Base):
     __tablename__ = "playlist"
@@ -112,3 +173,8 @@ class Playlist(Base):
     tags = relationship("TagPlaylist")
     songs = relationship("SongPlaylist")
 
+    # used by get_playlist_by_name()
+    __table_args__ = (
+        Index("ix_playlist_user_id_name", "user_id", "name"),
+    )
+
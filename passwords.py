@@ -0,0 +1,82 @@
+import os
+from typing import List, Optional
+from passlib.context import CryptContext
+from passlib.hash import argon2
+
+
+# this file defines how passwords are hashed (the hashing policy)
+# it's configured through environment variables, so that each deployment can choose how much CPU time
+# is spent per login, against how expensive it is to brute-force a leaked hash
+#
+# - PASSWORD_HASH_SCHEMES: comma-separated list ("argon2", "bcrypt"), the first one is used for new hashes
+#   the others are only used to verify existing hashes (bcrypt is always accepted)
+# - BCRYPT_ROUNDS: log2 of the number of bcrypt iterations
+# - ARGON2_TIME_COST, ARGON2_MEMORY_COST (in KiB) & ARGON2_PARALLELISM: the argon2id parameters
+#
+# hashes made under an older policy (another scheme, fewer rounds) are upgraded when their owner logs in
+# argon2 requires the argon2-cffi package
+
+
+SUPPORTED_SCHEMES = ["argon2", "bcrypt"]
+
+PASSWORD_HASH_SCHEMES = [scheme.strip() for scheme in os.environ.get("PASSWORD_HASH_SCHEMES", "bcrypt").split(",") if scheme.strip()]
+
+BCRYPT_ROUNDS = int(os.environ.get("BCRYPT_ROUNDS", 12))
+
+ARGON2_TIME_COST = int(os.environ.get("ARGON2_TIME_COST", 3))
+ARGON2_MEMORY_COST = int(os.environ.get("ARGON2_MEMORY_COST", 65536))
+ARGON2_PARALLELISM = int(os.environ.get("ARGON2_PARALLELISM", 4))
+
+
+def build_password_context(
+    schemes: Optional[List[str]] = None,
+    bcrypt_rounds: Optional[int] = None,
+    argon2_time_cost: Optional[int] = None,
+    argon2_memory_cost: Optional[int] = None,
+    argon2_parallelism: Optional[int] = None
+) -> CryptContext:
+    """
+
+    Create the object used to hash & verify passwords, following a hashing policy.
+    The parameters that aren't provided are read from the environment (see above).
+
+    Args:
+        schemes (Optional[List[str]]): The hash schemes accepted, the first one is used for new hashes.
+        bcrypt_rounds (Optional[int]): log2 of the number of bcrypt iterations.
+        argon2_time_cost (Optional[int]): The number of argon2 iterations.
+        argon2_memory_cost (Optional[int]): The memory used by argon2, in KiB.
+        argon2_parallelism (Optional[int]): The number of argon2 lanes.
+
+    Raises:
+        ValueError: Raised if one of the schemes isn't supported.
+        RuntimeError: Raised if argon2 is required but argon2-cffi isn't installed.
+
+    Returns:
+        CryptContext: The password hashing context.
+    """
+    schemes = list(schemes or PASSWORD_HASH_SCHEMES)
+    for scheme in schemes:
+        if scheme not in SUPPORTED_SCHEMES:
+            raise ValueError(f"Unsupported password hash scheme : '{scheme}'.")
+    if "argon2" in schemes and not argon2.has_backend():
+        raise RuntimeError("The argon2 password hash scheme requires the argon2-cffi package.")
+    # the existing hashes can always be verified (and upgraded)
+    if "bcrypt" not in schemes:
+        schemes.append("bcrypt")
+    # the minimum values make needs_update() true for the hashes made with a lower cost
+    bcrypt_rounds = bcrypt_rounds or BCRYPT_ROUNDS
+    settings = {
+        "bcrypt__default_rounds": bcrypt_rounds,
+        "bcrypt__min_rounds": bcrypt_rounds,
+    }
+    if "argon2" in schemes:
+        argon2_time_cost = argon2_time_cost or ARGON2_TIME_COST
+        settings.update({
+            "argon2__type": "ID",
+            "argon2__default_rounds": argon2_time_cost,
+            "argon2__min_rounds": argon2_time_cost,
+            "argon2__memory_cost": argon2_memory_cost or ARGON2_MEMORY_COST,
+            "argon2__parallelism": argon2_parallelism or ARGON2_PARALLELISM,
+        })
+    # every scheme but the first one is deprecated
+    return CryptContext(schemes=schemes, deprecated="auto", **settings)
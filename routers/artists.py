@@ -1,6 +1,8 @@
 from typing import List
 from fastapi import APIRouter, Depends
 
+from ..search_functions.utils import search_check_boundaries
+
 from .. import schemas, crud
 from ..auth import *
 from ..utility import *
@@ -8,6 +10,10 @@ from . import users
 
 router = APIRouter(tags=["artists"])
 
+# the maximum number of artists that can be sent to the bulk endpoint
+
+MAX_BULK_ARTISTS = 10000
+
 # /!\ Artist endpoints /!\
 
 # all these endpoints require the user to be logged in
@@ -34,6 +40,27 @@ def get_artist_using_name(name: str, current_user: schemas.User = Depends(users.
         raise_http_404(f"Artist '{name}' does not exist.")
     return db_artist
 
+# get the list of Song objects associated to a specific Artist object (using its name)
+# the path without the trailing slash would otherwise be taken for the song titled 'songs' (see routers/songs.py)
+# --> this router must be included before the songs router, and that title is reserved
+
+@router.get("/api/artists/{name}/songs", response_model=List[schemas.Song], include_in_schema=False)
+@router.get("/api/artists/{name}/songs/", response_model=List[schemas.Song])
+def get_artist_songs_using_name(
+    name: str, 
+    skip: Optional[int] = None, 
+    max: Optional[int] = None, 
+    current_user: schemas.User = Depends(users.read_users_me), 
+    db: Session = Depends(get_db)
+):
+    search_check_boundaries(skip, max)
+    # make sure the artist exists before looking for its songs
+    db_artist = crud.get_artist_by_name(db, name, current_user)
+    if not db_artist:
+        raise_http_404(f"Artist '{name}' does not exist.")
+    db_songs = crud.get_artist_song_objects(db, db_artist, current_user, skip, max)
+    return crud.get_songs_data(db, db_songs)
+
 # add a new 'Artist' object to the database
 
 @router.post("/api/artists/", response_model=schemas.Artist)
@@ -43,6 +70,44 @@ def post_artist(artist: schemas.ArtistCreate, current_user: schemas.User = Depen
         raise_http_409(f"Artist '{artist.name}' already exists.'")
     return crud.create_artist(db, artist, current_user)
 
+# add many 'Artist' objects to the database at once
+# the names already in use are sent back in 'conflicts' instead of being created
+
+@router.post("/api/artists/bulk", response_model=schemas.ArtistBulkResult)
+def post_artists_bulk(artists: List[schemas.ArtistCreate], current_user: schemas.User = Depends(users.read_users_me), db: Session = Depends(get_db)):
+    if len(artists) > MAX_BULK_ARTISTS:
+        raise_http_400(f"Cannot add more than {MAX_BULK_ARTISTS} artists at once (got {len(artists)}).")
+    created, conflicts = crud.create_artists(db, artists, current_user)
+    return {"created": created, "conflicts": conflicts}
+
+# merge a Artist object into another one
+# the items associated to it are associated to the target instead, then it's deleted
+
+@router.post("/api/artists/{name}/merge", response_model=schemas.Artist)
+def merge_artist(name: str, merge: schemas.ArtistMerge, current_user: schemas.User = Depends(users.read_users_me), db: Session = Depends(get_db)):
+    # make sure both objects exist
+    db_artist = crud.get_artist_by_name(db, name, current_user)
+    if not db_artist:
+        raise_http_404(f"Artist '{name}' does not exist.")
+    db_target = crud.get_artist_by_name(db, merge.target, current_user)
+    if not db_target:
+        raise_http_404(f"Artist '{merge.target}' does not exist.")
+    if db_target.id == db_artist.id:
+        raise_http_400(f"Cannot merge artist '{name}' into itself.")
+    # songs of both artists can't have the same title
+    conflicts = crud.get_artist_merge_conflicts(db, db_artist, db_target)
+    if len(conflicts) != 0:
+        raise_http_409(f"Cannot merge artist '{name}' into '{merge.target}' because both have a song named '{conflicts[0]}'.")
+    return crud.merge_artists(db, db_artist, db_target, current_user)
+
+# rename many Artist objects at once
+# the names that don't exist are sent back in 'not_found', the new names already in use in 'conflicts'
+
+@router.post("/api/artists/rename", response_model=schemas.ArtistBulkRenameResult)
+def rename_artists(renames: List[schemas.ArtistRename], current_user: schemas.User = Depends(users.read_users_me), db: Session = Depends(get_db)):
+    renamed, not_found, conflicts = crud.rename_artists(db, renames, current_user)
+    return {"renamed": renamed, "not_found": not_found, "conflicts": conflicts}
+
 # make changes to a Artist object
 
 @router.put("/api/artists/{name}", response_model=schemas.Artist)
@@ -16,17 +16,15 @@ def put_song_data_check(artist_name: str, song_title: str, song: schemas.SongUpd
         raise_http_404(f"Song '{song_title} by {artist_name}' does not exist.")
     # if the title is also changing, 
     # make sure there isn't already a song with that same title
+    if song.new_title in crud.RESERVED_SONG_TITLES:
+        raise_http_400(f"Cannot rename song '{song_title}' to '{song.new_title}': this title is reserved.")
     if song.new_title is not None: 
-        duplicate = None
-        artist = None
         if song.artists is not None and len(song.artists) != 0:
-            for artist in song.artists:
-                duplicate = crud.get_song_by_title(db, artist, song.new_title, current_user)
-                if duplicate is not None:
-                    raise_http_409(f"Song '{song.new_title} by {artist}' already exists.")
+            artists = song.artists
         else: 
             artists = crud.get_song_artists(db, db_song)
-            for artist in artists:
-                duplicate = crud.get_song_by_title(db, artist, song.new_title, current_user)
-                if duplicate is not None:
-                    raise_http_409(f"Song '{song.new_title} by {artist}' already exists.")
\ No newline at end of file
+        # all the artists are checked at once
+        duplicates = crud.get_songs_by_titles(db, [(artist, song.new_title) for artist in artists], current_user)
+        for artist in artists:
+            if (artist, song.new_title) in duplicates:
+                raise_http_409(f"Song '{song.new_title} by {artist}' already exists.")
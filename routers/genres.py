@@ -1,13 +1,19 @@
 from typing import List
 from fastapi import APIRouter, Depends
 
-from .. import schemas, crud, models
+from ..search_functions.utils import search_check_boundaries
+
+from .. import schemas, crud, models, search
 from ..auth import *
 from ..utility import *
 from . import users
 
 router = APIRouter(tags=["genres"])
 
+# the maximum number of genres that can be sent to the bulk endpoint
+
+MAX_BULK_GENRES = 10000
+
 # /!\ Genre endpoints /!\
 
 # all these endpoints require the user to be logged in
@@ -34,6 +40,51 @@ def get_genre_using_name(name: str, current_user: schemas.User = Depends(users.r
         raise_http_404(f"Genre '{name}' does not exist.")
     return db_genre
 
+# get the list of Song objects associated to a specific Genre object (using its name)
+
+@router.get("/api/genres/{name}/songs/", response_model=List[schemas.Song])
+def get_genre_songs_using_name(
+    name: str, 
+    skip: Optional[int] = None, 
+    max: Optional[int] = None, 
+    current_user: schemas.User = Depends(users.read_users_me), 
+    db: Session = Depends(get_db)
+):
+    search_check_boundaries(skip, max)
+    # make sure the genre exists before looking for its songs
+    db_genre = crud.get_genre_by_name(db, name, current_user)
+    if not db_genre:
+        raise_http_404(f"Genre '{name}' does not exist.")
+    db_songs = crud.get_genre_song_objects(db, db_genre, current_user, skip, max)
+    return crud.get_songs_data(db, db_songs)
+
+# add a Genre object to many Song objects at once
+# the songs are either listed by their full title, or selected by a search (see schemas.SongSelection)
+
+@router.post("/api/genres/{name}/songs/", response_model=schemas.BulkResult)
+def post_genre_songs(name: str, selection: schemas.SongSelection, current_user: schemas.User = Depends(users.read_users_me), db: Session = Depends(get_db)):
+    # make sure the genre exists before adding it to the songs
+    db_genre = crud.get_genre_by_name(db, name, current_user)
+    if not db_genre:
+        raise_http_404(f"Genre '{name}' does not exist.")
+    songs = search.get_song_selection_query(db, selection, current_user)
+    if songs is None:
+        return {"nb_affected": 0}
+    return {"nb_affected": crud.add_genre_to_songs(db, db_genre, songs)}
+
+# remove a Genre object from many Song objects at once
+
+@router.delete("/api/genres/{name}/songs/", response_model=schemas.BulkResult)
+def delete_genre_songs(name: str, selection: schemas.SongSelection, current_user: schemas.User = Depends(users.read_users_me), db: Session = Depends(get_db)):
+    # make sure the genre exists before removing it from the songs
+    db_genre = crud.get_genre_by_name(db, name, current_user)
+    if not db_genre:
+        raise_http_404(f"Genre '{name}' does not exist.")
+    songs = search.get_song_selection_query(db, selection, current_user)
+    if songs is None:
+        return {"nb_affected": 0}
+    return {"nb_affected": crud.remove_genre_from_songs(db, db_genre, songs)}
+
 # add a new 'Genre' object to the database
 
 @router.post("/api/genres/", response_model=schemas.Genre)
@@ -43,6 +94,40 @@ def post_genre(genre: schemas.GenreCreate, current_user: schemas.User = Depends(
         raise_http_409(f"Genre '{genre.name}' already exists.'")
     return crud.create_genre(db, genre, current_user)
 
+# add many 'Genre' objects to the database at once
+# the names already in use are sent back in 'conflicts' instead of being created
+
+@router.post("/api/genres/bulk", response_model=schemas.GenreBulkResult)
+def post_genres_bulk(genres: List[schemas.GenreCreate], current_user: schemas.User = Depends(users.read_users_me), db: Session = Depends(get_db)):
+    if len(genres) > MAX_BULK_GENRES:
+        raise_http_400(f"Cannot add more than {MAX_BULK_GENRES} genres at once (got {len(genres)}).")
+    created, conflicts = crud.create_genres(db, genres, current_user)
+    return {"created": created, "conflicts": conflicts}
+
+# merge a Genre object into another one
+# the items associated to it are associated to the target instead, then it's deleted
+
+@router.post("/api/genres/{name}/merge", response_model=schemas.Genre)
+def merge_genre(name: str, merge: schemas.GenreMerge, current_user: schemas.User = Depends(users.read_users_me), db: Session = Depends(get_db)):
+    # make sure both objects exist
+    db_genre = crud.get_genre_by_name(db, name, current_user)
+    if not db_genre:
+        raise_http_404(f"Genre '{name}' does not exist.")
+    db_target = crud.get_genre_by_name(db, merge.target, current_user)
+    if not db_target:
+        raise_http_404(f"Genre '{merge.target}' does not exist.")
+    if db_target.id == db_genre.id:
+        raise_http_400(f"Cannot merge genre '{name}' into itself.")
+    return crud.merge_genres(db, db_genre, db_target, current_user)
+
+# rename many Genre objects at once
+# the names that don't exist are sent back in 'not_found', the new names already in use in 'conflicts'
+
+@router.post("/api/genres/rename", response_model=schemas.GenreBulkRenameResult)
+def rename_genres(renames: List[schemas.GenreRename], current_user: schemas.User = Depends(users.read_users_me), db: Session = Depends(get_db)):
+    renamed, not_found, conflicts = crud.rename_genres(db, renames, current_user)
+    return {"renamed": renamed, "not_found": not_found, "conflicts": conflicts}
+
 # make changes to a Genre object
 
 @router.put("/api/genres/{name}", response_model=schemas.Genre)
@@ -1,6 +1,6 @@
 from re import T
 from typing import List
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Response
 
 from ..search_functions.utils import search_check_boundaries
 
@@ -11,6 +11,10 @@ from . import users
 
 router = APIRouter(tags=["playlists"])
 
+# the maximum number of playlists that can be sent to the bulk endpoint
+
+MAX_BULK_PLAYLISTS = 10000
+
 # /!\ Playlist endpoints /!\
 
 # all these endpoints require the user to be logged in
@@ -32,9 +36,21 @@ def get_req_playlists(max: Optional[int] = None, current_user: schemas.User = De
     else :
         db_playlists = crud.get_all_playlists(db, current_user)
     # for each 'Playlist' object, add the associated Song and Tag objects to it
-    playlists = [{**db_playlist.__dict__, "tags": crud.get_playlist_tags(db, db_playlist), "songs": crud.get_playlist_songs(db, db_playlist)} for db_playlist in db_playlists]
-    return playlists
+    return crud.get_playlists_data(db, db_playlists)
+
+
+# get a page of the Playlist objects owned by the current user
+# pages are fetched using the 'next_cursor' value sent back with the previous page
+# --> fetching page 500 costs as much as fetching the first one
 
+@router.get("/api/playlists/page/", response_model=schemas.PlaylistPage)
+def get_playlists_page(cursor: Optional[int] = None, max: int = 50, current_user: schemas.User = Depends(users.read_users_me), db: Session = Depends(get_db)):
+    if max < 1:
+        raise_http_400(f"Cannot process request : max value must be at least 1 (max={max}).")
+    if max > MAX_PAGE_SIZE:
+        raise_http_400(f"Cannot process request : max value cannot be greater than {MAX_PAGE_SIZE} (max={max}).")
+    db_playlists, next_cursor = crud.get_playlists_page(db, max, current_user, cursor)
+    return {"items": crud.get_playlists_data(db, db_playlists), "next_cursor": next_cursor}
 
 # get info about a specific Playlist object (using its name)
 
@@ -44,12 +60,8 @@ def get_playlist_using_name(name: str, current_user: schemas.User = Depends(user
     db_playlist = crud.get_playlist_by_name(db, name, current_user)
     if not db_playlist:
         raise_http_404(f"Playlist '{name}' does not exist.")
-    # get the list of songs associated to this Playlist object
-    songs = crud.get_playlist_songs(db, db_playlist)
-    # get the list of tags associated to this Playlist object
-    tags = crud.get_playlist_tags(db, db_playlist)
-    playlist = { **db_playlist.__dict__, "songs": songs, "tags": tags }
-    return playlist
+    # add the associated Song and Tag objects to it
+    return crud.get_playlist_data(db, db_playlist)
 
 # add a new 'Playlist' object to the database
 
@@ -59,34 +71,43 @@ def post_playlist(playlist: schemas.PlaylistCreate, current_user: schemas.User =
     if crud.get_playlist_by_name(db, playlist.name, current_user) is not None:
         raise_http_409(f"Playlist '{playlist.name}' already exists.'")
     db_playlist = crud.create_playlist(db, playlist, current_user)
-    # get the list of songs associated to this Playlist object
-    songs = crud.get_playlist_songs(db, db_playlist)
-    # get the list of tags associated to this Playlist object
-    tags = crud.get_playlist_tags(db, db_playlist)
-    new_playlist = { **db_playlist.__dict__, "tags": tags, "songs": songs }
-    return new_playlist
+    # add the associated Song and Tag objects to it
+    return crud.get_playlist_data(db, db_playlist)
+
+# add many 'Playlist' objects to the database at once
+# the names already in use are sent back in 'conflicts' instead of being created
+
+@router.post("/api/playlists/bulk", response_model=schemas.PlaylistBulkResult)
+def post_playlists_bulk(playlists: List[schemas.PlaylistCreate], current_user: schemas.User = Depends(users.read_users_me), db: Session = Depends(get_db)):
+    if len(playlists) > MAX_BULK_PLAYLISTS:
+        raise_http_400(f"Cannot add more than {MAX_BULK_PLAYLISTS} playlists at once (got {len(playlists)}).")
+    created, conflicts = crud.create_playlists(db, playlists, current_user)
+    return {"created": crud.get_playlists_data(db, created), "conflicts": conflicts}
 
 # search Playlist objects matching the parameters in the provided schemas.PlaylistSearchParams object
+# if 'with_total' is true, the total number of results is sent back in the 'X-Total-Count' header
 
 @router.post("/api/playlists/search/", response_model=List[schemas.Playlist])
 def search_playlists(
     search_params: schemas.PlaylistSearchParams, 
+    response: Response,
     skip: Optional[int] = None, 
     max: Optional[int] = None, 
+    with_total: bool = False,
     current_user: schemas.User = Depends(users.read_users_me), 
     db: Session = Depends(get_db)
 ):
     search_check_boundaries(skip, max)
     db_playlists = search.search_playlists(db, search_params, current_user, skip, max)
-    playlists = [{**db_playlist.__dict__, "tags": crud.get_playlist_tags(db, db_playlist), "songs": crud.get_playlist_songs(db, db_playlist)} for db_playlist in db_playlists]
-    return playlists
+    if with_total:
+        response.headers["X-Total-Count"] = str(search.count_playlists(db, search_params, current_user))
+    return crud.get_playlists_data(db, db_playlists)
 
 # get the number of Playlist objects matching the parameters in the provided schemas.PlaylistSearchParams object
 
 @router.post("/api/playlists/search/nb")
 def search_playlists_nb(search_params: schemas.PlaylistSearchParams, current_user: schemas.User = Depends(users.read_users_me), db: Session = Depends(get_db)):
-    db_playlists = search.search_playlists(db, search_params, current_user)
-    return {"nb_results": len(db_playlists)}
+    return {"nb_results": search.count_playlists(db, search_params, current_user)}
 
 
 
@@ -103,8 +124,7 @@ def put_playlist(name: str, playlist: schemas.PlaylistUpdate, current_user: sche
     if crud.get_playlist_by_name(db, playlist.new_name, current_user) is not None:
         raise_http_409(f"Playlist '{playlist.new_name}' already exists.")
     db_playlist = crud.update_playlist(db, name, playlist, current_user)
-    updated_playlist = { **db_playlist.__dict__, "tags": crud.get_playlist_tags(db, db_playlist), "songs": crud.get_playlist_songs(db, db_playlist) }
-    return updated_playlist
+    return crud.get_playlist_data(db, db_playlist)
 
 
 
@@ -116,6 +136,6 @@ def delete_playlist(name: str, current_user: schemas.User = Depends(users.read_u
     db_playlist = crud.get_playlist_by_name(db, name, current_user)
     if not db_playlist:
         raise_http_404(f"Playlist '{name}' does not exist.")
-    playlist = { **db_playlist.__dict__, "tags": crud.get_playlist_tags(db, db_playlist), "songs": crud.get_playlist_songs(db, db_playlist) }
+    playlist = crud.get_playlist_data(db, db_playlist)
     crud.delete_playlist(db, name, current_user)
     return playlist
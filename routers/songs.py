@@ -1,5 +1,5 @@
 from typing import List
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Response
 
 from ..search_functions.utils import search_check_boundaries
 
@@ -12,6 +12,10 @@ from .data_validation.songs_data_check import *
 
 router = APIRouter(tags=["songs"])
 
+# the maximum number of songs that can be sent to the bulk endpoint
+
+MAX_BULK_SONGS = 10000
+
 # /!\ Song endpoints /!\
 
 # all these endpoints require the user to be logged in
@@ -33,8 +37,20 @@ def get_req_songs(max: Optional[int] = None, current_user: schemas.User = Depend
     else :
         db_songs = crud.get_all_songs(db, current_user)
     # for each 'Song' object, add the associated Tag, Genre and Artist objects to it
-    songs = [{**db_song.__dict__, "tags": crud.get_song_tags(db, db_song), "genres": crud.get_song_genres(db, db_song), "artists": crud.get_song_artists(db, db_song)} for db_song in db_songs]
-    return songs
+    return crud.get_songs_data(db, db_songs)
+
+# get a page of the Song objects owned by the current user
+# pages are fetched using the 'next_cursor' value sent back with the previous page
+# --> fetching page 500 costs as much as fetching the first one
+
+@router.get("/api/songs/page/", response_model=schemas.SongPage)
+def get_songs_page(cursor: Optional[int] = None, max: int = 50, current_user: schemas.User = Depends(users.read_users_me), db: Session = Depends(get_db)):
+    if max < 1:
+        raise_http_400(f"Cannot process request : max value must be at least 1 (max={max}).")
+    if max > MAX_PAGE_SIZE:
+        raise_http_400(f"Cannot process request : max value cannot be greater than {MAX_PAGE_SIZE} (max={max}).")
+    db_songs, next_cursor = crud.get_songs_page(db, max, current_user, cursor)
+    return {"items": crud.get_songs_data(db, db_songs), "next_cursor": next_cursor}
 
 # get info about a specific Song object (using its name)
 
@@ -44,13 +60,8 @@ def get_song_using_name(artist_name: str, song_title: str, current_user: schemas
     db_song = crud.get_song_by_title(db, artist_name, song_title, current_user)
     if not db_song:
         raise_http_404(f"Song '{song_title} by {artist_name}' does not exist.")
-    # get the list of tags associated to this song object
-    tags = crud.get_song_tags(db, db_song)
-    # get the list of genres associated to this song object
-    genres = crud.get_song_genres(db, db_song)
-    # get the list of artists associated to this song object
-    artists = crud.get_song_artists(db, db_song)
-    song = { **db_song.__dict__, "tags": tags, "genres": genres, "artists": artists }
+    # add the associated Tag, Genre and Artist objects to it
+    song = crud.get_song_data(db, db_song)
     return song
 
 # add a new 'Song' object to the database
@@ -60,43 +71,58 @@ def post_song(song: schemas.SongCreate, current_user: schemas.User = Depends(use
     # make sure the song is associated to at least one artist
     if len(song.artists) == 0:
         raise_http_400(f"Cannot add new song '{song.title}' to the library: no artist specified.")
+    if song.title in crud.RESERVED_SONG_TITLES:
+        raise_http_400(f"Cannot add new song '{song.title}' to the library: this title is reserved.")
     # make sure an object with the same name doesn't already exist in the DB
+    duplicates = crud.get_songs_by_titles(db, [(artist, song.title) for artist in song.artists], current_user)
     for artist in song.artists:
-        if crud.get_song_by_title(db, artist, song.title, current_user) is not None:
+        if (artist, song.title) in duplicates:
             raise_http_409(f"Song '{song.title} by {artist}' already exists.'")
     db_song = crud.create_song(db, song, current_user)
-    # get the list of tags associated to this song object
-    tags = crud.get_song_tags(db, db_song)
-    # get the list of genres associated to this song object
-    genres = crud.get_song_genres(db, db_song)
-    # get the list of artists associated to this song object
-    artists = crud.get_song_artists(db, db_song)
-    song = { **db_song.__dict__, "tags": tags, "genres": genres, "artists": artists }
+    # add the associated Tag, Genre and Artist objects to it
+    song = crud.get_song_data(db, db_song)
     return song
 
 
+# add many 'Song' objects to the database at once (in a single transaction)
+# the songs that can't be created are reported in 'errors', the others are still created
+
+@router.post("/api/songs/bulk", response_model=schemas.SongBulkResult)
+def post_songs_bulk(songs: List[schemas.SongCreate], current_user: schemas.User = Depends(users.read_users_me), db: Session = Depends(get_db)):
+    if len(songs) > MAX_BULK_SONGS:
+        raise_http_400(f"Cannot add more than {MAX_BULK_SONGS} songs at once (got {len(songs)}).")
+    ids, errors = crud.create_songs(db, songs, current_user)
+    return {
+        "nb_created": len([song_id for song_id in ids if song_id is not None]),
+        "ids": ids,
+        "errors": [{"index": index, "detail": detail} for index, detail in errors]
+    }
+
 
 # search Song objects matching the parameters in the provided schemas.SongSearchParams object
+# if 'with_total' is true, the total number of results is sent back in the 'X-Total-Count' header
 
 @router.post("/api/songs/search/", response_model=List[schemas.Song])
 def search_songs(
     search_params: schemas.SongSearchParams, 
+    response: Response,
     skip: Optional[int] = None, 
     max: Optional[int] = None, 
+    with_total: bool = False,
     current_user: schemas.User = Depends(users.read_users_me), 
     db: Session = Depends(get_db)
 ):
     search_check_boundaries(skip, max)
     db_songs = search.search_songs(db, search_params, current_user, skip, max)
-    songs = [{**db_song.__dict__, "tags": crud.get_song_tags(db, db_song), "genres": crud.get_song_genres(db, db_song), "artists": crud.get_song_artists(db, db_song)} for db_song in db_songs]
-    return songs
+    if with_total:
+        response.headers["X-Total-Count"] = str(search.count_songs(db, search_params, current_user))
+    return crud.get_songs_data(db, db_songs)
 
 # get the number of Song objects matching the parameters in the provided schemas.SongSearchParams object
 
 @router.post("/api/songs/search/nb")
 def search_songs_nb(search_params: schemas.SongSearchParams, current_user: schemas.User = Depends(users.read_users_me), db: Session = Depends(get_db)):
-    db_songs = search.search_songs(db, search_params, current_user)
-    return {"nb_results": len(db_songs)}
+    return {"nb_results": search.count_songs(db, search_params, current_user)}
 
 
 # make changes to a Song object's data
@@ -106,13 +132,8 @@ def put_song(artist_name: str, song_title: str, song: schemas.SongUpdate, curren
     # perform data validation before trying to apply the changes to the Song object
     put_song_data_check(artist_name, song_title, song, current_user, db)
     db_song = crud.update_song(db, artist_name, song_title, song, current_user)
-    # get the list of tags associated to this song object
-    tags = crud.get_song_tags(db, db_song)
-    # get the list of genres associated to this song object
-    genres = crud.get_song_genres(db, db_song)
-    # get the list of artists associated to this song object
-    artists = crud.get_song_artists(db, db_song)
-    song = { **db_song.__dict__, "tags": tags, "genres": genres, "artists": artists }
+    # add the associated Tag, Genre and Artist objects to it
+    song = crud.get_song_data(db, db_song)
     return song
 
 
@@ -125,13 +146,8 @@ def delete_song(artist_name: str, song_title: str, current_user: schemas.User =
     db_song = crud.get_song_by_title(db, artist_name, song_title, current_user)
     if not db_song:
         raise_http_404(f"Song '{song_title} by {artist_name}' does not exist.")
-    # get the list of tags associated to this song object
-    tags = crud.get_song_tags(db, db_song)
-    # get the list of genres associated to this song object
-    genres = crud.get_song_genres(db, db_song)
-    # get the list of artists associated to this song object
-    artists = crud.get_song_artists(db, db_song)
-    song = { **db_song.__dict__, "tags": tags, "genres": genres, "artists": artists }
+    # add the associated Tag, Genre and Artist objects to it
+    song = crud.get_song_data(db, db_song)
     crud.delete_song(db, artist_name, song_title, current_user)
     return song
 
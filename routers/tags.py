@@ -1,13 +1,19 @@
 from typing import List
 from fastapi import APIRouter, Depends
 
-from .. import schemas, crud, models
+from ..search_functions.utils import search_check_boundaries
+
+from .. import schemas, crud, models, search
 from ..auth import *
 from ..utility import *
 from . import users
 
 router = APIRouter(tags=["tags"])
 
+# the maximum number of tags that can be sent to the bulk endpoint
+
+MAX_BULK_TAGS = 10000
+
 # /!\ Tag endpoints /!\
 
 # all these endpoints require the user to be logged in
@@ -34,6 +40,69 @@ def get_tag_using_name(name: str, current_user: schemas.User = Depends(users.rea
         raise_http_404(f"Tag '{name}' does not exist.")
     return db_tag
 
+# get the list of Song objects associated to a specific Tag object (using its name)
+
+@router.get("/api/tags/{name}/songs/", response_model=List[schemas.Song])
+def get_tag_songs_using_name(
+    name: str, 
+    skip: Optional[int] = None, 
+    max: Optional[int] = None, 
+    current_user: schemas.User = Depends(users.read_users_me), 
+    db: Session = Depends(get_db)
+):
+    search_check_boundaries(skip, max)
+    # make sure the tag exists before looking for its songs
+    db_tag = crud.get_tag_by_name(db, name, current_user)
+    if not db_tag:
+        raise_http_404(f"Tag '{name}' does not exist.")
+    db_songs = crud.get_tag_song_objects(db, db_tag, current_user, skip, max)
+    return crud.get_songs_data(db, db_songs)
+
+# add a Tag object to many Song objects at once
+# the songs are either listed by their full title, or selected by a search (see schemas.SongSelection)
+
+@router.post("/api/tags/{name}/songs/", response_model=schemas.BulkResult)
+def post_tag_songs(name: str, selection: schemas.SongSelection, current_user: schemas.User = Depends(users.read_users_me), db: Session = Depends(get_db)):
+    # make sure the tag exists before adding it to the songs
+    db_tag = crud.get_tag_by_name(db, name, current_user)
+    if not db_tag:
+        raise_http_404(f"Tag '{name}' does not exist.")
+    songs = search.get_song_selection_query(db, selection, current_user)
+    if songs is None:
+        return {"nb_affected": 0}
+    return {"nb_affected": crud.add_tag_to_songs(db, db_tag, songs)}
+
+# remove a Tag object from many Song objects at once
+
+@router.delete("/api/tags/{name}/songs/", response_model=schemas.BulkResult)
+def delete_tag_songs(name: str, selection: schemas.SongSelection, current_user: schemas.User = Depends(users.read_users_me), db: Session = Depends(get_db)):
+    # make sure the tag exists before removing it from the songs
+    db_tag = crud.get_tag_by_name(db, name, current_user)
+    if not db_tag:
+        raise_http_404(f"Tag '{name}' does not exist.")
+    songs = search.get_song_selection_query(db, selection, current_user)
+    if songs is None:
+        return {"nb_affected": 0}
+    return {"nb_affected": crud.remove_tag_from_songs(db, db_tag, songs)}
+
+# get the list of Playlist objects associated to a specific Tag object (using its name)
+
+@router.get("/api/tags/{name}/playlists/", response_model=List[schemas.Playlist])
+def get_tag_playlists_using_name(
+    name: str, 
+    skip: Optional[int] = None, 
+    max: Optional[int] = None, 
+    current_user: schemas.User = Depends(users.read_users_me), 
+    db: Session = Depends(get_db)
+):
+    search_check_boundaries(skip, max)
+    # make sure the tag exists before looking for its playlists
+    db_tag = crud.get_tag_by_name(db, name, current_user)
+    if not db_tag:
+        raise_http_404(f"Tag '{name}' does not exist.")
+    db_playlists = crud.get_tag_playlist_objects(db, db_tag, current_user, skip, max)
+    return crud.get_playlists_data(db, db_playlists)
+
 # add a new 'Tag' object to the database
 
 @router.post("/api/tags/", response_model=schemas.Tag)
@@ -43,6 +112,40 @@ def post_tag(tag: schemas.TagCreate, current_user: schemas.User = Depends(users.
         raise_http_409(f"Tag '{tag.name}' already exists.'")
     return crud.create_tag(db, tag, current_user)
 
+# add many 'Tag' objects to the database at once
+# the names already in use are sent back in 'conflicts' instead of being created
+
+@router.post("/api/tags/bulk", response_model=schemas.TagBulkResult)
+def post_tags_bulk(tags: List[schemas.TagCreate], current_user: schemas.User = Depends(users.read_users_me), db: Session = Depends(get_db)):
+    if len(tags) > MAX_BULK_TAGS:
+        raise_http_400(f"Cannot add more than {MAX_BULK_TAGS} tags at once (got {len(tags)}).")
+    created, conflicts = crud.create_tags(db, tags, current_user)
+    return {"created": created, "conflicts": conflicts}
+
+# merge a Tag object into another one
+# the items associated to it are associated to the target instead, then it's deleted
+
+@router.post("/api/tags/{name}/merge", response_model=schemas.Tag)
+def merge_tag(name: str, merge: schemas.TagMerge, current_user: schemas.User = Depends(users.read_users_me), db: Session = Depends(get_db)):
+    # make sure both objects exist
+    db_tag = crud.get_tag_by_name(db, name, current_user)
+    if not db_tag:
+        raise_http_404(f"Tag '{name}' does not exist.")
+    db_target = crud.get_tag_by_name(db, merge.target, current_user)
+    if not db_target:
+        raise_http_404(f"Tag '{merge.target}' does not exist.")
+    if db_target.id == db_tag.id:
+        raise_http_400(f"Cannot merge tag '{name}' into itself.")
+    return crud.merge_tags(db, db_tag, db_target, current_user)
+
+# rename many Tag objects at once
+# the names that don't exist are sent back in 'not_found', the new names already in use in 'conflicts'
+
+@router.post("/api/tags/rename", response_model=schemas.TagBulkRenameResult)
+def rename_tags(renames: List[schemas.TagRename], current_user: schemas.User = Depends(users.read_users_me), db: Session = Depends(get_db)):
+    renamed, not_found, conflicts = crud.rename_tags(db, renames, current_user)
+    return {"renamed": renamed, "not_found": not_found, "conflicts": conflicts}
+
 # make changes to a Tag object
 
 @router.put("/api/tags/{name}", response_model=schemas.Tag)
@@ -1,5 +1,6 @@
 from typing import List
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, BackgroundTasks, Depends, Response
+from fastapi.concurrency import run_in_threadpool
 
 from ..schema_classes.user import UserUpdate
 from .. import schemas, crud
@@ -11,26 +12,38 @@ router = APIRouter(tags=["users"])
 
 
 
-# return the current user's info (token provided)
+# the current user (token provided), used by all the endpoints requiring the user to be logged in
+# it's usually read from the token, without the user's profile (see auth.py)
 
-@router.get("/api/users/me", response_model=schemas.User)
 def read_users_me(current_user: schemas.User = Depends(get_current_active_user)):
     return current_user
 
+# return the current user's info (token provided)
+
+@router.get("/api/users/me", response_model=schemas.User)
+def read_users_me_profile(current_user: schemas.User = Depends(read_users_me), db: Session = Depends(get_db)):
+    # the profile isn't in the token, it's read from the cache (or from the database)
+    user = crud.get_cached_user(db, current_user.username)
+    if user is None:
+        raise_http_404(f"User '{current_user.username}' does not exist.")
+    return user
+
 # used to register
 # this function :
 # -- checks whether a user with the same username or email exists
 # -- if not, creates the user in the database
 # -- returns the newly created user
 # -- lets the frontend handle the login with another API call
+# the database is accessed in the default thread pool, the password is hashed in a dedicated one (see auth.py)
+# --> none of it blocks the event loop
 
 @router.post("/api/users/", response_model=schemas.User)
-def register_new_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
+async def register_new_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
     # first, check that the data is correct
-    register_new_user_data_check(user, db)
+    await run_in_threadpool(register_new_user_data_check, user, db)
     # if it is, create the user in the database and return it
-    user.hashed_password = get_password_hash(user.hashed_password)
-    return crud.create_user(db=db, user=user)
+    user.hashed_password = await get_password_hash_async(user.hashed_password)
+    return await run_in_threadpool(crud.create_user, db=db, user=user)
 
 
 # return a list of all the users
@@ -56,10 +69,26 @@ def put_user_me(user: schemas.UserUpdate, current_user: schemas.User = Depends(r
     user_update = UserUpdate(**user.dict(), username=current_user.username)
     return crud.update_user(db, current_user.username, current_user.username, user_update)
 
-# delete a user from the database
-# admin-only operation
+# delete the current user
+# the account is deactivated right away, then its music library is deleted in the background
+# the progress of the purge can be followed at the URL sent in the Location header
 
 @router.delete("/api/users/me", response_model=schemas.User)
-def delete_user(current_user: schemas.User = Depends(read_users_me), db: Session = Depends(get_db)):
-    return crud.delete_user_from_db(db, current_user.username)
-
+def delete_user(response: Response, background_tasks: BackgroundTasks, current_user: schemas.User = Depends(read_users_me), db: Session = Depends(get_db)):
+    user = crud.request_user_deletion(db, current_user.username)
+    job = crud.create_purge_job(user.id)
+    # the request's session is closed once the response is sent
+    # --> the purge opens its own sessions
+    background_tasks.add_task(crud.purge_user, db.get_bind(), user.id, job["job_id"])
+    response.headers["Location"] = f"/api/users/purges/{job['job_id']}"
+    return user
+
+# progress of the purge started by a DELETE at '/api/users/me'
+# the deleted user can't log in anymore, the (random) job ID is enough to access it
+
+@router.get("/api/users/purges/{job_id}", response_model=schemas.PurgeJob)
+def read_purge_job(job_id: str):
+    job = crud.get_purge_job(job_id)
+    if job is None:
+        raise_http_404(f"Purge job '{job_id}' does not exist.")
+    return job
@@ -1,3 +1,4 @@
+from typing import List
 from pydantic import BaseModel
 
 
@@ -21,4 +22,31 @@ class Artist(ArtistBase):
     id: int
 
     class Config:
-        orm_mode = True
\ No newline at end of file
+        orm_mode = True
+
+
+# used to create many Artist objects at once
+# conflicts contains the names that were already in use
+
+class ArtistBulkResult(BaseModel):
+    created: List[Artist]
+    conflicts: List[str]
+
+
+# used to merge a Artist object into another one (the target)
+
+class ArtistMerge(BaseModel):
+    target: str
+
+
+# used to rename many Artist objects at once
+# not_found contains the names that don't exist, conflicts the new names that are already in use
+
+class ArtistRename(BaseModel):
+    name: str
+    new_name: str
+
+class ArtistBulkRenameResult(BaseModel):
+    renamed: List[Artist]
+    not_found: List[str]
+    conflicts: List[str]
@@ -1,3 +1,4 @@
+from typing import List
 from pydantic import BaseModel
 
 
@@ -21,4 +22,31 @@ class Genre(GenreBase):
     id: int
 
     class Config:
-        orm_mode = True
\ No newline at end of file
+        orm_mode = True
+
+
+# used to create many Genre objects at once
+# conflicts contains the names that were already in use
+
+class GenreBulkResult(BaseModel):
+    created: List[Genre]
+    conflicts: List[str]
+
+
+# used to merge a Genre object into another one (the target)
+
+class GenreMerge(BaseModel):
+    target: str
+
+
+# used to rename many Genre objects at once
+# not_found contains the names that don't exist, conflicts the new names that are already in use
+
+class GenreRename(BaseModel):
+    name: str
+    new_name: str
+
+class GenreBulkRenameResult(BaseModel):
+    renamed: List[Genre]
+    not_found: List[str]
+    conflicts: List[str]
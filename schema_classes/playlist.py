@@ -35,4 +35,19 @@ class Playlist(PlaylistBase):
 
     class Config:
         orm_mode = True
-        
\ No newline at end of file
+
+
+# used for keyset pagination
+# next_cursor is None when there are no more playlists to fetch
+
+class PlaylistPage(BaseModel):
+    items: List[Playlist]
+    next_cursor: Optional[int]
+
+
+# used to create many Playlist objects at once
+# conflicts contains the names that were already in use
+
+class PlaylistBulkResult(BaseModel):
+    created: List[Playlist]
+    conflicts: List[str]
@@ -55,6 +55,19 @@ class SongSearchParams(BaseModel):
     release_year: Optional[int]
     release_month: Optional[int]
     release_day: Optional[int]
+    # ranges (bounds included)
+    bpm_min: Optional[int]
+    bpm_max: Optional[int]
+    duration_min: Optional[timedelta]
+    duration_max: Optional[timedelta]
+    release_from: Optional[date]
+    release_to: Optional[date]
+    # harmonic mixing
+    # returns the songs that can be mixed with a key, or with a song ('<artist> - <song_title>')
+    # when bpm_tolerance is provided, 'bpm' (or the song's BPM) matches the songs within that many BPM
+    compatible_key: Optional[str]
+    compatible_song: Optional[str]
+    bpm_tolerance: Optional[int]
     tags: Optional[List[str]]
     genres: Optional[List[str]]
     artists: Optional[List[str]]
@@ -63,4 +76,41 @@ class Song(SongBase):
     id: int
 
     class Config:
-        orm_mode = True
\ No newline at end of file
+        orm_mode = True
+
+
+# used for keyset pagination
+# next_cursor is None when there are no more songs to fetch
+
+class SongPage(BaseModel):
+    items: List[Song]
+    next_cursor: Optional[int]
+
+
+# used to create many Song objects at once
+# ids contains the ID of each created song, in the order they were sent (None for the songs that couldn't be created)
+# errors contains the reason why each of those songs couldn't be created
+
+class SongBulkError(BaseModel):
+    index: int
+    detail: str
+
+class SongBulkResult(BaseModel):
+    nb_created: int
+    ids: List[Optional[int]]
+    errors: List[SongBulkError]
+
+
+# used to apply a change to many Song objects at once (e.g. adding a tag to them)
+# the songs are either listed by their full title ('<artist> - <song_title>'), or selected by a search
+
+class SongSelection(BaseModel):
+    songs: Optional[List[str]]
+    search: Optional[SongSearchParams]
+
+
+# the result of a change applied to many Song objects at once (see schemas.SongSelection)
+# nb_affected is the number of songs that were actually changed
+
+class BulkResult(BaseModel):
+    nb_affected: int
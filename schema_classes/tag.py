@@ -22,4 +22,31 @@ class Tag(TagBase):
     id: int
 
     class Config:
-        orm_mode = True
\ No newline at end of file
+        orm_mode = True
+
+
+# used to create many Tag objects at once
+# conflicts contains the names that were already in use
+
+class TagBulkResult(BaseModel):
+    created: List[Tag]
+    conflicts: List[str]
+
+
+# used to merge a Tag object into another one (the target)
+
+class TagMerge(BaseModel):
+    target: str
+
+
+# used to rename many Tag objects at once
+# not_found contains the names that don't exist, conflicts the new names that are already in use
+
+class TagRename(BaseModel):
+    name: str
+    new_name: str
+
+class TagBulkRenameResult(BaseModel):
+    renamed: List[Tag]
+    not_found: List[str]
+    conflicts: List[str]
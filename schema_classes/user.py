@@ -1,4 +1,5 @@
-from typing import Optional
+from datetime import datetime
+from typing import Dict, Optional
 
 from pydantic import BaseModel
 
@@ -36,4 +37,15 @@ class User(UserBase):
     is_active: bool
     
     class Config:
-        orm_mode = True
\ No newline at end of file
+        orm_mode = True
+
+
+# progress of the purge started when a user deletes their account
+
+class PurgeJob(BaseModel):
+    job_id: str
+    status: str
+    deleted: Dict[str, int]
+    created_at: datetime
+    finished_at: Optional[datetime]
+    error: Optional[str]
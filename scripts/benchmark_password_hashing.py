@@ -0,0 +1,62 @@
+# Measure how many logins (password verifications) a single core can handle per second,
+# under several password hashing policies
+# used to choose the values of PASSWORD_HASH_SCHEMES, BCRYPT_ROUNDS & ARGON2_* for a deployment (see passwords.py)
+
+# /!\ this script must run from the root of the project /!\
+# --> python scripts/benchmark_password_hashing.py [--seconds 2]
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from passlib.hash import argon2
+from passwords import build_password_context
+
+
+# the policies to compare
+# argon2 lanes run in parallel threads: with a parallelism above 1, a verification uses several cores
+
+POLICIES = [
+    ("bcrypt, 10 rounds", {"schemes": ["bcrypt"], "bcrypt_rounds": 10}),
+    ("bcrypt, 12 rounds (default)", {"schemes": ["bcrypt"], "bcrypt_rounds": 12}),
+    ("bcrypt, 14 rounds", {"schemes": ["bcrypt"], "bcrypt_rounds": 14}),
+    ("argon2id, t=2, m=19 MiB, p=1", {"schemes": ["argon2"], "argon2_time_cost": 2, "argon2_memory_cost": 19456, "argon2_parallelism": 1}),
+    ("argon2id, t=3, m=64 MiB, p=4 (default)", {"schemes": ["argon2"], "argon2_time_cost": 3, "argon2_memory_cost": 65536, "argon2_parallelism": 4}),
+]
+
+
+def benchmark(policy: dict, seconds: float) -> float:
+    """
+
+    Verify the same password in a loop, on the current thread.
+
+    Args:
+        policy (dict): The parameters of build_password_context().
+        seconds (float): How long to run the benchmark for (at least one verification is made).
+
+    Returns:
+        float: The number of verifications per second.
+    """
+    context = build_password_context(**policy)
+    hashed_password = context.hash("benchmark password")
+    count = 0
+    start = time.perf_counter()
+    while count == 0 or time.perf_counter() - start < seconds:
+        context.verify("benchmark password", hashed_password)
+        count += 1
+    return count / (time.perf_counter() - start)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the password hashing policies.")
+    parser.add_argument("--seconds", type=float, default=2, help="time spent on each policy")
+    args = parser.parse_args()
+    for name, policy in POLICIES:
+        if "argon2" in policy["schemes"] and not argon2.has_backend():
+            print(f"{name:<40} skipped (argon2-cffi isn't installed)")
+            continue
+        logins_per_second = benchmark(policy, args.seconds)
+        print(f"{name:<40} {logins_per_second:8.1f} logins/s/core   {1000 / logins_per_second:8.1f} ms/login")
@@ -1,63 +1,106 @@
 from typing import List, Optional
-from sqlalchemy.orm import Session
-from sqlalchemy import extract, func
+from sqlalchemy.orm import Query, Session
+from sqlalchemy import exists, func
 
 from ..crud_functions.utils import unpack_full_song_title
+from .text_index import text_contains, text_relevance
 
-from .. import models, schemas, crud
+from .. import models, schemas
 
 # search Playlist objects
 
-def search_playlists(db: Session, search_params: schemas.PlaylistSearchParams, current_user: schemas.User, skip: Optional[int] = None, max: Optional[int] = None) -> List[models.Playlist]:
+def get_playlist_search_query(db: Session, search_params: schemas.PlaylistSearchParams, current_user: schemas.User) -> Optional[Query]:
     """
-    Retrieve from the database a List of Playlist objects matching the provided parameters.
+    Build the query selecting the Playlist objects matching the provided parameters (sorted by relevance, then insertion order).
 
     Args:
         db (Session): The session used to access the database.
         search_params (schemas.PlaylistSearchParams): The list of search parameters.
         current_user (schemas.User): The user who's music library we're working in.
-        skip (Optional[int]): If provided, represents the number of search results to skip.
-        max (Optional[int]): if provided, represents the maximum number of search results to return.
     
     Returns:
-        List[models.Playlist]: The list of Playlist objects matching the parameters.
+        Optional[Query]: The query (not executed yet), None if we already know there won't be any results.
     """
     playlists = db.query(models.Playlist).filter(models.Playlist.user_id == current_user.id)
+    # the results are sorted by relevance when searching by name (if the text search index is available)
+    # then in insertion order
+    relevance = None
     if search_params.name is not None:
-        # this filter is a bit long to write
-        # because we're doing case-insensitive search
-        # ==> we convert both the column & the search parameters to lowercase
-        playlists = playlists.filter(
-            func.lower(models.Playlist.name)
-            .contains(search_params.name.lower())
-        )
+        # case-insensitive substring search
+        # ==> uses the text search index when possible, see text_index.py
+        playlists = playlists.filter(text_contains(db, models.Playlist, "name", search_params.name))
+        relevance = text_relevance(db, models.Playlist, "name", search_params.name)
     
+    # the following filters are compiled into correlated EXISTS subqueries
+    # --> the whole search runs as a single statement
+    # and a tag / song that doesn't exist simply matches no playlist
     if search_params.tags is not None:
         for tag in search_params.tags:
-            db_tag = crud.get_tag_by_name(db, tag, current_user)
-            if db_tag is None:
-                return [] # empty search results if the tag doesn't exist
-            # get a list of the Playlist objects associated to the current TagPlaylist object
-            tag_playlist_items = db.query(models.TagPlaylist).filter(models.TagPlaylist.tag_id == db_tag.id).all()
-            # get the IDs of each Playlist object that appears in this list
-            playlists_ids = [tag_playlist_item.playlist_id for tag_playlist_item in tag_playlist_items]
-            playlists = playlists.filter(models.Playlist.id.in_(playlists_ids))
+            playlists = playlists.filter(
+                exists()
+                .where(models.TagPlaylist.playlist_id == models.Playlist.id)
+                .where(models.TagPlaylist.tag_id == models.Tag.id)
+                .where(models.Tag.user_id == current_user.id)
+                .where(models.Tag.name == tag)
+            )
 
     if search_params.songs is not None:
         for song in search_params.songs:
             artist_name, song_title = unpack_full_song_title(song)
-            db_song = crud.get_song_by_title(db, artist_name, song_title, current_user)
-            if db_song is None:
-                return [] # empty search results if the song doesn't exist
-            # get a list of the Playlist objects associated to the current SongPlaylist object
-            song_playlist_items = db.query(models.SongPlaylist).filter(models.SongPlaylist.song_id == db_song.id).all()
-            # get the IDs of each Playlist object that appears in this list
-            playlists_ids = [song_playlist_item.playlist_id for song_playlist_item in song_playlist_items]
-            playlists = playlists.filter(models.Playlist.id.in_(playlists_ids))
+            playlists = playlists.filter(
+                exists()
+                .where(models.SongPlaylist.playlist_id == models.Playlist.id)
+                .where(models.SongPlaylist.song_id == models.Song.id)
+                .where(models.Song.user_id == current_user.id)
+                .where(models.Song.title == song_title)
+                .where(models.ArtistSong.song_id == models.Song.id)
+                .where(models.ArtistSong.artist_id == models.Artist.id)
+                .where(models.Artist.name == artist_name)
+            )
+    
+    if relevance is not None:
+        return playlists.order_by(relevance, models.Playlist.id)
+    return playlists.order_by(models.Playlist.id)
+
+
+def search_playlists(db: Session, search_params: schemas.PlaylistSearchParams, current_user: schemas.User, skip: Optional[int] = None, max: Optional[int] = None) -> List[models.Playlist]:
+    """
+    Retrieve from the database a List of Playlist objects matching the provided parameters.
+
+    Args:
+        db (Session): The session used to access the database.
+        search_params (schemas.PlaylistSearchParams): The list of search parameters.
+        current_user (schemas.User): The user who's music library we're working in.
+        skip (Optional[int]): If provided, represents the number of search results to skip.
+        max (Optional[int]): if provided, represents the maximum number of search results to return.
     
+    Returns:
+        List[models.Playlist]: The list of Playlist objects matching the parameters.
+    """
+    playlists = get_playlist_search_query(db, search_params, current_user)
+    if playlists is None:
+        return []
     if skip is not None:
         playlists = playlists.offset(skip)
     if max is not None:
         playlists = playlists.limit(max)
     
-    return playlists.all()
\ No newline at end of file
+    return playlists.all()
+
+
+def count_playlists(db: Session, search_params: schemas.PlaylistSearchParams, current_user: schemas.User) -> int:
+    """
+    Count the Playlist objects matching the provided parameters, using an SQL COUNT (no Playlist object is loaded).
+
+    Args:
+        db (Session): The session used to access the database.
+        search_params (schemas.PlaylistSearchParams): The list of search parameters.
+        current_user (schemas.User): The user who's music library we're working in.
+    
+    Returns:
+        int: The number of Playlist objects matching the parameters.
+    """
+    playlists = get_playlist_search_query(db, search_params, current_user)
+    if playlists is None:
+        return 0
+    return playlists.order_by(None).with_entities(func.count(models.Playlist.id)).scalar()
\ No newline at end of file
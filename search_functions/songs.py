@@ -1,102 +1,261 @@
-from datetime import timedelta
-from typing import List, Optional
-from sqlalchemy.orm import Session
-from sqlalchemy import extract, func
+from datetime import date, timedelta
+from typing import List, Optional, Tuple
+from sqlalchemy.orm import Query, Session
+from sqlalchemy import exists, extract, func
+
+from .text_index import text_contains, text_relevance
+
+from .. import crud, models, schemas
+from ..crud_functions.utils import get_compatible_key_codes, parse_key_code, unpack_full_song_title
+from ..utility import raise_http_400, raise_http_404
+
+# used to filter Song objects on the items they're associated to
+
+def song_has_related_item(model, association_model, foreign_key, name: str, current_user: schemas.User):
+    """
+    Build an EXISTS clause, true when a Song object is associated to the item with the provided name.
+
+    Args:
+        model: The associated model (models.Tag, models.Genre or models.Artist).
+        association_model: The association model (models.TagSong, models.GenreSong or models.ArtistSong).
+        foreign_key: The association model's column referencing the associated model.
+        name (str): The value of the associated item's 'name' cell.
+        current_user (schemas.User): The user who's music library we're working in.
+    
+    Returns:
+        The EXISTS clause, correlated to the song table of the enclosing query.
+    """
+    return exists() \
+        .where(association_model.song_id == models.Song.id) \
+        .where(foreign_key == model.id) \
+        .where(model.user_id == current_user.id) \
+        .where(model.name == name)
 
-from .. import models, schemas, crud
 
 # search Song objects
 
-def search_songs(db: Session, search_params: schemas.SongSearchParams, current_user: schemas.User, skip: Optional[int] = None, max: Optional[int] = None) -> List[models.Song]:
+# used to turn the duration & release date search parameters into range predicates
+
+def get_duration_range(minutes: int, seconds: Optional[int] = None) -> Tuple[timedelta, timedelta]:
     """
-    Retrieve from the database a List of Song objects matching the provided parameters.
+    Compute the range of durations matching a number of minutes (and optionally seconds).
+
+    Args:
+        minutes (int): The number of minutes.
+        seconds (Optional[int]): If provided, the number of seconds.
+    
+    Returns:
+        Tuple[timedelta, timedelta]: The lower (included) & upper (excluded) bounds of the range.
+    """
+    if seconds is None:
+        return timedelta(minutes=minutes), timedelta(minutes=minutes + 1)
+    return timedelta(minutes=minutes, seconds=seconds), timedelta(minutes=minutes, seconds=seconds + 1)
+
+
+def get_release_date_range(year: int, month: Optional[int] = None, day: Optional[int] = None) -> Optional[Tuple[date, date]]:
+    """
+    Compute the range of dates matching a year (and optionally a month & a day).
+
+    Args:
+        year (int): The year.
+        month (Optional[int]): If provided, the month.
+        day (Optional[int]): If provided, the day of the month.
+    
+    Returns:
+        Optional[Tuple[date, date]]: The lower (included) & upper (excluded) bounds of the range, None if there's no such date.
+    """
+    try:
+        if month is None:
+            # without a month, the day can't narrow the range down
+            return date(year, 1, 1), date(year + 1, 1, 1)
+        if day is None:
+            start = date(year, month, 1)
+            return start, date(year + month // 12, month % 12 + 1, 1)
+        start = date(year, month, day)
+        return start, start + timedelta(days=1)
+    except (ValueError, OverflowError):
+        return None
+
+
+def get_song_search_query(db: Session, search_params: schemas.SongSearchParams, current_user: schemas.User) -> Optional[Query]:
+    """
+    Build the query selecting the Song objects matching the provided parameters (sorted by relevance, then insertion order).
 
     Args:
         db (Session): The session used to access the database.
         search_params (schemas.SongSearchParams): The list of search parameters.
         current_user (schemas.User): The user who's music library we're working in.
-        skip (Optional[int]): If provided, represents the number of search results to skip.
-        max (Optional[int]): if provided, represents the maximum number of search results to return.
     
     Returns:
-        List[models.Song]: The list of Song objects matching the parameters.
+        Optional[Query]: The query (not executed yet), None if we already know there won't be any results.
     """
     songs = db.query(models.Song).filter(models.Song.user_id == current_user.id)
+    # the results are sorted by relevance when searching by title (if the text search index is available)
+    # then in insertion order
+    relevance = None
+    # case-insensitive substring search
+    # ==> uses the text search index when possible, see text_index.py
     if search_params.title is not None:
-        # this filter is a bit long to write
-        # because we're doing case-insensitive search
-        # ==> we convert both the column & the search parameters to lowercase
-        songs = songs.filter(
-            func.lower(models.Song.title)
-            .contains(search_params.title.lower())
-        )
+        songs = songs.filter(text_contains(db, models.Song, "title", search_params.title))
+        relevance = text_relevance(db, models.Song, "title", search_params.title)
     if search_params.key is not None:
-        songs = songs.filter(
-            func.lower(models.Song.key)
-            .contains(search_params.key.lower())
-        )
+        songs = songs.filter(text_contains(db, models.Song, "key", search_params.key))
     if search_params.url is not None:
+        songs = songs.filter(text_contains(db, models.Song, "url", search_params.url))
+    # the following filters are all range predicates on plain columns
+    # --> they can use the (user_id, bpm), (user_id, duration) & (user_id, release_date) indexes
+    # harmonic mixing
+    reference_bpm = search_params.bpm
+    if search_params.compatible_song is not None:
+        artist_name, song_title = unpack_full_song_title(search_params.compatible_song)
+        reference_song = crud.get_song_by_title(db, artist_name, song_title, current_user)
+        if reference_song is None or reference_song.key_code is None:
+            return None
         songs = songs.filter(
-            func.lower(models.Song.url)
-            .contains(search_params.url.lower())
+            models.Song.id != reference_song.id,
+            models.Song.key_code.in_(get_compatible_key_codes(reference_song.key_code))
         )
-    if search_params.bpm is not None:
-        songs = songs.filter(models.Song.bpm == search_params.bpm)
+        # the song's BPM is only a reference for the tolerance, it's never matched exactly
+        if reference_bpm is None and search_params.bpm_tolerance is not None:
+            reference_bpm = reference_song.bpm
+    if search_params.compatible_key is not None:
+        key_code = parse_key_code(search_params.compatible_key)
+        if key_code is None:
+            raise_http_400(f"'{search_params.compatible_key}' is not a valid key.")
+        songs = songs.filter(models.Song.key_code.in_(get_compatible_key_codes(key_code)))
+    
+    if reference_bpm is not None:
+        if search_params.bpm_tolerance is not None:
+            songs = songs.filter(
+                models.Song.bpm >= reference_bpm - search_params.bpm_tolerance,
+                models.Song.bpm <= reference_bpm + search_params.bpm_tolerance
+            )
+        else:
+            songs = songs.filter(models.Song.bpm == reference_bpm)
+    if search_params.bpm_min is not None:
+        songs = songs.filter(models.Song.bpm >= search_params.bpm_min)
+    if search_params.bpm_max is not None:
+        songs = songs.filter(models.Song.bpm <= search_params.bpm_max)
     
     if search_params.duration_minutes is not None:
-        minutes = timedelta(minutes=search_params.duration_minutes)
-        minutes_plus_one = timedelta(minutes=search_params.duration_minutes + 1)
-        songs = songs.filter(models.Song.duration >= minutes, models.Song.duration < minutes_plus_one)
-        if search_params.duration_seconds is not None:
-            seconds = timedelta(seconds=search_params.duration_seconds)
-            songs = songs.filter(models.Song.duration == minutes + seconds)
+        duration_range = get_duration_range(search_params.duration_minutes, search_params.duration_seconds)
+        songs = songs.filter(models.Song.duration >= duration_range[0], models.Song.duration < duration_range[1])
+    if search_params.duration_min is not None:
+        songs = songs.filter(models.Song.duration >= search_params.duration_min)
+    if search_params.duration_max is not None:
+        songs = songs.filter(models.Song.duration <= search_params.duration_max)
     
+    if search_params.release_year is not None:
+        release_range = get_release_date_range(search_params.release_year, search_params.release_month, search_params.release_day)
+        if release_range is None:
+            # there's no such date
+            return None
+        songs = songs.filter(models.Song.release_date >= release_range[0], models.Song.release_date < release_range[1])
+    # without a year (or a month for the day), these can't be turned into a date range
+    if search_params.release_month is not None and search_params.release_year is None:
+        songs = songs.filter(extract("month", models.Song.release_date) == search_params.release_month)
+    if search_params.release_day is not None and (search_params.release_year is None or search_params.release_month is None):
+        songs = songs.filter(extract("day", models.Song.release_date) == search_params.release_day)
+    if search_params.release_from is not None:
+        songs = songs.filter(models.Song.release_date >= search_params.release_from)
+    if search_params.release_to is not None:
+        songs = songs.filter(models.Song.release_date <= search_params.release_to)
 
+    # the following filters are compiled into correlated EXISTS subqueries
+    # --> the whole search runs as a single statement
+    # and a tag / genre / artist that doesn't exist simply matches no song
     if search_params.tags is not None:
         for tag in search_params.tags:
-            db_tag = crud.get_tag_by_name(db, tag, current_user)
-            if db_tag is None:
-                return [] # empty search results if the tag doesn't exist
-            # get a list of the Song objects associated to the current TagSong object
-            tag_song_items = db.query(models.TagSong).filter(models.TagSong.tag_id == db_tag.id).all()
-            # get the IDs of each Song object that appears in this list
-            tag_songs_ids = [tag_song_item.song_id for tag_song_item in tag_song_items]
-            songs = songs.filter(models.Song.id.in_(tag_songs_ids))
+            songs = songs.filter(song_has_related_item(models.Tag, models.TagSong, models.TagSong.tag_id, tag, current_user))
     
     if search_params.genres is not None:
         for genre in search_params.genres:
-            db_genre = crud.get_genre_by_name(db, genre, current_user)
-            if db_genre is None:
-                return [] # empty search results if the genre doesn't exist
-            # get a list of the Song objects associated to the current GenreSong object
-            genre_song_items = db.query(models.GenreSong).filter(models.GenreSong.genre_id == db_genre.id).all()
-            # get the IDs of each Song object that appears in this list
-            genre_songs_ids = [genre_song_item.song_id for genre_song_item in genre_song_items]
-            songs = songs.filter(models.Song.id.in_(genre_songs_ids))
+            songs = songs.filter(song_has_related_item(models.Genre, models.GenreSong, models.GenreSong.genre_id, genre, current_user))
     
     if search_params.artists is not None:
         for artist in search_params.artists:
-            db_artist = crud.get_artist_by_name(db, artist, current_user)
-            if db_artist is None:
-                return [] # empty search results if the artist doesn't exist
-            # get a list of the Song objects associated to the current ArtistSong object
-            artist_song_items = db.query(models.ArtistSong).filter(models.ArtistSong.artist_id == db_artist.id).all()
-            # get the IDs of each Song object that appears in this list
-            artist_songs_ids = [artist_song_item.song_id for artist_song_item in artist_song_items]
-            songs = songs.filter(models.Song.id.in_(artist_songs_ids))
+            songs = songs.filter(song_has_related_item(models.Artist, models.ArtistSong, models.ArtistSong.artist_id, artist, current_user))
     
 
 
-    if search_params.release_year is not None:
-        songs = songs.filter(extract("year", models.Song.release_date) == search_params.release_year)
-    if search_params.release_month is not None:
-        songs = songs.filter(extract("month", models.Song.release_date) == search_params.release_month)
-    if search_params.release_day is not None:
-        songs = songs.filter(extract("day", models.Song.release_date) == search_params.release_day)
+    if relevance is not None:
+        return songs.order_by(relevance, models.Song.id)
+    return songs.order_by(models.Song.id)
+
+
+# used by the endpoints applying a change to many Song objects at once
+
+def get_song_selection_query(db: Session, selection: schemas.SongSelection, current_user: schemas.User) -> Optional[Query]:
+    """
+    Build the query selecting the Song objects listed (or matched by the search) in a schemas.SongSelection object.
+
+    Args:
+        db (Session): The session used to access the database.
+        selection (schemas.SongSelection): The full titles of the songs, or the search parameters.
+        current_user (schemas.User): The user who's music library we're working in.
+
+    Raises:
+        HTTPException: Raise a "400 BAD REQUEST" error if the selection is empty or ambiguous,
+        and a "404 NOT FOUND" error if one of the listed songs can't be found.
+
+    Returns:
+        Optional[Query]: The query (not executed yet), None if we already know there won't be any results.
+    """
+    if (selection.songs is None) == (selection.search is None):
+        raise_http_400("Either 'songs' or 'search' must be provided.")
+    if selection.search is not None:
+        return get_song_search_query(db, selection.search, current_user)
+    # all the listed songs are looked up at once
+    full_titles = { full_song_title: tuple(unpack_full_song_title(full_song_title)) for full_song_title in selection.songs }
+    db_songs = crud.get_songs_by_titles(db, list(full_titles.values()), current_user)
+    for full_song_title, full_title in full_titles.items():
+        if full_title not in db_songs:
+            raise_http_404(f"Song '{full_song_title}' does not exist.")
+    if len(db_songs) == 0:
+        return None
+    return db.query(models.Song) \
+        .filter(models.Song.user_id == current_user.id) \
+        .filter(models.Song.id.in_({db_song.id for db_song in db_songs.values()}))
+
+
+def search_songs(db: Session, search_params: schemas.SongSearchParams, current_user: schemas.User, skip: Optional[int] = None, max: Optional[int] = None) -> List[models.Song]:
+    """
+    Retrieve from the database a List of Song objects matching the provided parameters.
+
+    Args:
+        db (Session): The session used to access the database.
+        search_params (schemas.SongSearchParams): The list of search parameters.
+        current_user (schemas.User): The user who's music library we're working in.
+        skip (Optional[int]): If provided, represents the number of search results to skip.
+        max (Optional[int]): if provided, represents the maximum number of search results to return.
     
+    Returns:
+        List[models.Song]: The list of Song objects matching the parameters.
+    """
+    songs = get_song_search_query(db, search_params, current_user)
+    if songs is None:
+        return []
     if skip is not None:
         songs = songs.offset(skip)
     if max is not None:
         songs = songs.limit(max)
     
-    return songs.all()
\ No newline at end of file
+    return songs.all()
+
+
+def count_songs(db: Session, search_params: schemas.SongSearchParams, current_user: schemas.User) -> int:
+    """
+    Count the Song objects matching the provided parameters, using an SQL COUNT (no Song object is loaded).
+
+    Args:
+        db (Session): The session used to access the database.
+        search_params (schemas.SongSearchParams): The list of search parameters.
+        current_user (schemas.User): The user who's music library we're working in.
+    
+    Returns:
+        int: The number of Song objects matching the parameters.
+    """
+    songs = get_song_search_query(db, search_params, current_user)
+    if songs is None:
+        return 0
+    return songs.order_by(None).with_entities(func.count(models.Song.id)).scalar()
\ No newline at end of file
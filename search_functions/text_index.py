@@ -0,0 +1,207 @@
+from typing import Dict, List
+from sqlalchemy import Column, Integer, MetaData, String, Table, func, literal_column, select, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+# this file implements the indexes used for case-insensitive substring search
+# (on song titles, keys & URLs, and on playlist names)
+# --> without them, each search is a LIKE '%x%' that scans the whole user's library
+#
+# - on SQLite, each table gets an FTS5 virtual table using the trigram tokenizer,
+#   kept up to date by triggers
+# - on PostgreSQL, each column gets a pg_trgm GIN index on lower(column),
+#   which the LIKE '%x%' filter uses directly
+#   these indexes are built by a migration (see migrations.py), without locking the tables
+#
+# when the indexes can't be created (old SQLite, missing extension, ...)
+# the search functions fall back to the plain LIKE filters
+
+
+# the columns we index, for each table
+
+TEXT_INDEXED_COLUMNS: Dict[str, List[str]] = {
+    "song": ["title", "key", "url"],
+    "playlist": ["name"],
+}
+
+# trigram indexes can't be used to look for less than 3 characters
+
+MIN_INDEXED_TERM_LENGTH = 3
+
+
+# the FTS5 tables used on SQLite
+# they're declared in their own MetaData object, so that create_all() doesn't try to create them
+
+fts_metadata = MetaData()
+
+fts_tables: Dict[str, Table] = {
+    table_name: Table(
+        f"{table_name}_fts", fts_metadata,
+        Column("rowid", Integer),
+        *[Column(column_name, String) for column_name in column_names]
+    )
+    for table_name, column_names in TEXT_INDEXED_COLUMNS.items()
+}
+
+
+# the engines on which the indexes were successfully set up
+
+indexed_engines = set()
+
+
+def setup_sqlite_text_index(engine: Engine):
+    """
+    Create the FTS5 tables & the triggers keeping them up to date on SQLite.
+
+    Args:
+        engine (Engine): The engine connected to the database.
+    """
+    with engine.begin() as connection:
+        for table_name, column_names in TEXT_INDEXED_COLUMNS.items():
+            fts_name = f"{table_name}_fts"
+            columns = ", ".join(f'"{column_name}"' for column_name in column_names)
+            new_values = ", ".join(f'new."{column_name}"' for column_name in column_names)
+            old_values = ", ".join(f'old."{column_name}"' for column_name in column_names)
+            already_exists = connection.execute(
+                text("SELECT name FROM sqlite_master WHERE type = 'table' AND name = :name"),
+                {"name": fts_name}
+            ).first() is not None
+            connection.execute(text(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts_name} USING fts5("
+                f"{columns}, content='{table_name}', content_rowid='id', tokenize='trigram')"
+            ))
+            connection.execute(text(
+                f"CREATE TRIGGER IF NOT EXISTS {fts_name}_insert AFTER INSERT ON {table_name} BEGIN "
+                f"INSERT INTO {fts_name}(rowid, {columns}) VALUES (new.id, {new_values}); "
+                f"END"
+            ))
+            connection.execute(text(
+                f"CREATE TRIGGER IF NOT EXISTS {fts_name}_delete AFTER DELETE ON {table_name} BEGIN "
+                f"INSERT INTO {fts_name}({fts_name}, rowid, {columns}) VALUES ('delete', old.id, {old_values}); "
+                f"END"
+            ))
+            connection.execute(text(
+                f"CREATE TRIGGER IF NOT EXISTS {fts_name}_update AFTER UPDATE ON {table_name} BEGIN "
+                f"INSERT INTO {fts_name}({fts_name}, rowid, {columns}) VALUES ('delete', old.id, {old_values}); "
+                f"INSERT INTO {fts_name}(rowid, {columns}) VALUES (new.id, {new_values}); "
+                f"END"
+            ))
+            # index the rows that were stored before the FTS table existed
+            if not already_exists:
+                connection.execute(text(f"INSERT INTO {fts_name}({fts_name}) VALUES ('rebuild')"))
+
+
+def setup_postgresql_text_index(engine: Engine):
+    """
+    Make sure the pg_trgm extension is installed on PostgreSQL.
+    The GIN indexes themselves are built by the migrations.
+
+    Args:
+        engine (Engine): The engine connected to the database.
+
+    Raises:
+        RuntimeError: Raised if the extension isn't installed (the migration couldn't install it).
+    """
+    with engine.connect() as connection:
+        installed = connection.execute(text("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")).first() is not None
+    if not installed:
+        raise RuntimeError("The pg_trgm extension isn't installed.")
+
+
+def setup_text_index(engine: Engine) -> bool:
+    """
+    Create the text search indexes, if the database supports them.
+    This function can safely be called every time the API starts.
+
+    Args:
+        engine (Engine): The engine connected to the database.
+
+    Returns:
+        bool: True if the indexes are available, False if not.
+    """
+    try:
+        if engine.dialect.name == "sqlite":
+            setup_sqlite_text_index(engine)
+        elif engine.dialect.name == "postgresql":
+            setup_postgresql_text_index(engine)
+        else:
+            return False
+    except Exception:
+        # we can still search without the indexes
+        indexed_engines.discard(engine)
+        return False
+    indexed_engines.add(engine)
+    return True
+
+
+def is_text_index_available(db: Session) -> bool:
+    """
+    Check whether the text search indexes can be used with a given session.
+
+    Args:
+        db (Session): The session used to access the database.
+
+    Returns:
+        bool: True if the indexes are available, False if not.
+    """
+    return db.get_bind() in indexed_engines
+
+
+def can_use_text_index(db: Session, term: str) -> bool:
+    return len(term) >= MIN_INDEXED_TERM_LENGTH and is_text_index_available(db)
+
+
+def fts_phrase(term: str) -> str:
+    # FTS5 phrases are delimited by double quotes
+    # (double quotes inside the phrase must be doubled)
+    return '"' + term.replace('"', '""') + '"'
+
+
+def text_contains(db: Session, model, column_name: str, term: str):
+    """
+    Build a case-insensitive substring filter on a text column, using the text search index when possible.
+
+    Args:
+        db (Session): The session used to access the database.
+        model: The model the column belongs to (models.Song or models.Playlist).
+        column_name (str): The name of the column.
+        term (str): The substring we're looking for.
+
+    Returns:
+        The filter clause.
+    """
+    column = getattr(model, column_name)
+    if can_use_text_index(db, term) and db.get_bind().dialect.name == "sqlite":
+        fts_table = fts_tables[model.__tablename__]
+        return model.id.in_(
+            select(fts_table.c.rowid)
+            .where(fts_table.c[column_name].match(fts_phrase(term)))
+        )
+    # the lower() expression is the one indexed on PostgreSQL
+    return func.lower(column).contains(term.lower())
+
+
+def text_relevance(db: Session, model, column_name: str, term: str):
+    """
+    Build an expression used to sort search results by relevance (most relevant results first, in ascending order).
+
+    Args:
+        db (Session): The session used to access the database.
+        model: The model the column belongs to (models.Song or models.Playlist).
+        column_name (str): The name of the column.
+        term (str): The substring we're looking for.
+
+    Returns:
+        The expression, None if the text search index can't be used.
+    """
+    if not can_use_text_index(db, term):
+        return None
+    if db.get_bind().dialect.name == "sqlite":
+        fts_table = fts_tables[model.__tablename__]
+        # bm25() is negative, the lower the better
+        return select(func.bm25(literal_column(fts_table.name))) \
+            .where(fts_table.c.rowid == model.id) \
+            .where(fts_table.c[column_name].match(fts_phrase(term))) \
+            .scalar_subquery()
+    # similarity() is between 0 & 1, the higher the better
+    return -func.similarity(func.lower(getattr(model, column_name)), term.lower())
@@ -1,5 +1,7 @@
 
+import json
 import os
+import time
 from fastapi.testclient import TestClient
 from sqlalchemy.engine.base import NestedTransaction
 from starlette.testclient import TestClient
@@ -7,6 +9,8 @@ from starlette.testclient import TestClient
 # necessary imports to open & use a database connection
 
 from ..main import app, get_db
+from .. import models
+from ..crud_functions import purge
 from .utility import *
 
 # /!\ test environment setup /!\
@@ -139,6 +143,26 @@ def test_login():
     assert "access_token" in data, "Pas de token valide dans la réponse."
     assert "token_type" in data, "La réponse ne contient pas le token."
 
+def test_login_password_hashing_pool():
+    """
+    Make sure that a POST at '/token/':
+    - verifies the password in the password hashing thread pool, not on the event loop.
+    """
+    import threading
+    from .. import auth
+    threads = []
+    verify_and_update_password = auth.verify_and_update_password
+    def record_thread(plain_password, hashed_password):
+        threads.append(threading.current_thread().name)
+        return verify_and_update_password(plain_password, hashed_password)
+    auth.verify_and_update_password = record_thread
+    try:
+        response = client.post("/token/", data={"username": "test", "password": "testpassword123"})
+    finally:
+        auth.verify_and_update_password = verify_and_update_password
+    assert response.status_code == 200, response.text
+    assert len(threads) == 1 and threads[0].startswith("password-hashing"), f"Unexpected threads : {threads}."
+
 # --------------------------------------------------------------------------
 # /!\ TEST GET CURRENT USER'S INFO /!\
 
@@ -290,6 +314,132 @@ def test_put_current_user():
     # making sure the data is what it's supposed to be
     assert data == expected_data, "Incorrect response format or data."
 
+def test_user_cache():
+    """
+    Make sure that authenticated requests:
+    - don't look up the user in the database once it's cached.
+    - see the changes made to the user right away.
+    """
+    auth_header = get_auth_header(login_as_test1(client))
+    client.get("/api/users/me", headers=auth_header)
+    with record_statements(db) as statements:
+        response = client.get("/api/users/me", headers=auth_header)
+    assert response.status_code == 200, response.text
+    assert statements == [], f"Unexpected statements : {statements}."
+    # update the user, then make sure the next request sees the change
+    response = client.put("/api/users/me", headers=auth_header, json={"first_name": "Cached"})
+    assert response.status_code == 200, response.text
+    response = client.get("/api/users/me", headers=auth_header)
+    assert response.json()["first_name"] == "Cached", "The cached user wasn't invalidated."
+    response = client.put("/api/users/me", headers=auth_header, json={"first_name": "Test"})
+    assert response.status_code == 200, response.text
+
+
+def test_login_upgrades_password_hash():
+    """
+    Make sure that a POST at '/token/':
+    - replaces a password hash made under an older hashing policy (fewer bcrypt rounds).
+    """
+    from passlib.hash import bcrypt
+    from .. import auth
+    crud.create_user(db, schemas.UserCreate(
+            username="legacy",
+            first_name="Legacy",
+            family_name="Legacy",
+            email="legacy@example.com",
+            hashed_password=bcrypt.using(rounds=4).hash("legacypassword123")
+    ))
+    response = client.post("/token/", data={"username": "legacy", "password": "legacypassword123"})
+    assert response.status_code == 200, response.text
+    new_db = TestingSessionLocal()
+    hashed_password = crud.get_user_by_username(new_db, "legacy").hashed_password
+    new_db.close()
+    assert not auth.pwd_context.needs_update(hashed_password), f"The hash wasn't upgraded : {hashed_password}."
+    assert auth.verify_password("legacypassword123", hashed_password), "The new hash doesn't match the password."
+
+
+def test_build_password_context():
+    """
+    Make sure that the password hashing policy:
+    - rejects the unsupported schemes.
+    - flags the hashes made with fewer rounds than configured.
+    """
+    import pytest
+    from ..passwords import build_password_context
+    with pytest.raises(ValueError):
+        build_password_context(["md5_crypt"])
+    weak_context = build_password_context(["bcrypt"], bcrypt_rounds=4)
+    strong_context = build_password_context(["bcrypt"], bcrypt_rounds=5)
+    weak_hash = weak_context.hash("password")
+    assert not weak_context.needs_update(weak_hash), "The hash matches the policy."
+    assert strong_context.needs_update(weak_hash), "The hash was made with fewer rounds."
+
+
+def wait_for_new_token(username: str):
+    # the tokens issued in the same second as a change of their user aren't trusted
+    db_user = crud.get_user_by_username(db, username)
+    time.sleep(max(0, crud.get_user_changed_at(db_user.id) + 1 - time.time()))
+
+
+def test_token_claims():
+    """
+    Make sure that authenticated requests:
+    - use the user stored in the access token, without looking it up in the database.
+    - don't find the user's profile in the access token.
+    """
+    from jose import jwt
+    from ..auth import ALGORITHM, SECRET_KEY
+    wait_for_new_token("test1")
+    response = login_as_test1(client)
+    payload = jwt.decode(response.json()["access_token"], SECRET_KEY, algorithms=ALGORITHM)
+    assert payload["sub"] == "test1" and payload["act"] is True, f"Incorrect token claims : {payload}."
+    assert "uid" in payload and "iat" in payload, f"Incorrect token claims : {payload}."
+    assert "usr" not in payload and "email" not in json.dumps(payload), f"Incorrect token claims : {payload}."
+    auth_header = get_auth_header(response)
+    # make sure the user isn't cached either
+    crud.user_cache.clear()
+    with record_statements(db) as statements:
+        response = client.get("/api/tags/", headers=auth_header)
+    assert response.status_code == 200, response.text
+    user_statements = [statement for statement in statements if "FROM user" in statement.replace('"', "")]
+    assert user_statements == [], f"Unexpected statements : {user_statements}."
+    # the profile is looked up
+    response = client.get("/api/users/me", headers=auth_header)
+    assert response.status_code == 200, response.text
+    assert response.json()["email"] == crud.get_user_by_username(db, "test1").email, "Incorrect response format or data."
+
+
+def test_token_out_of_date(monkeypatch):
+    """
+    Make sure that authenticated requests:
+    - don't use the user stored in a token issued before the user was changed.
+    - don't use the user stored in a token issued more than TOKEN_CLAIMS_TRUST_SECONDS ago.
+    """
+    from .. import auth
+    wait_for_new_token("test1")
+    auth_header = get_auth_header(login_as_test1(client))
+    response = client.put("/api/users/me", headers=auth_header, json={"first_name": "Changed"})
+    assert response.status_code == 200, response.text
+    response = client.get("/api/users/me", headers=auth_header)
+    assert response.json()["first_name"] == "Changed", "Incorrect response format or data."
+    crud.user_cache.clear()
+    with record_statements(db) as statements:
+        response = client.get("/api/tags/", headers=auth_header)
+    assert response.status_code == 200, response.text
+    assert any("FROM user" in statement.replace('"', "") for statement in statements), "The token is out of date, it shouldn't be trusted."
+    response = client.put("/api/users/me", headers=auth_header, json={"first_name": "Test"})
+    assert response.status_code == 200, response.text
+    # a new token is trusted, unless it's too old
+    wait_for_new_token("test1")
+    auth_header = get_auth_header(login_as_test1(client))
+    monkeypatch.setattr(auth, "TOKEN_CLAIMS_TRUST_SECONDS", -1)
+    crud.user_cache.clear()
+    with record_statements(db) as statements:
+        response = client.get("/api/tags/", headers=auth_header)
+    assert response.status_code == 200, response.text
+    assert any("FROM user" in statement.replace('"', "") for statement in statements), "The token is too old, it shouldn't be trusted."
+
+
 # --------------------------------------------------------------------------
 # /!\ TEST DELETE /!\
 
@@ -321,4 +471,80 @@ def test_delete_user():
     response = client.get("/api/users/", headers=auth_header)
     assert response.status_code == 200, response.text
     current_db_users = response.json()
-    assert deleted_user not in current_db_users, "The user was not deleted from the database."
\ No newline at end of file
+    assert deleted_user not in current_db_users, "The user was not deleted from the database."
+
+
+def test_delete_user_purges_library(monkeypatch):
+    """
+    Make sure that a DELETE at '/api/users/me':
+    - deactivates the user & starts a purge, which can be followed using the Location header.
+    - deletes the user's music library (items & associations), chunk by chunk.
+    - deletes the user once the purge is over.
+    """
+    # register & log in as a user with a music library
+    client.post("/api/users/", json={**new_user, "username": "purged", "email": "purged@example.com"})
+    auth_header = get_auth_header(login(client, "purged", new_user["hashed_password"]))
+    for kind in ["tags", "genres", "artists", "songs", "playlists"]:
+        with open(f"backend/json/{kind}.json", "r") as data_file:
+            response = client.post(f"/api/{kind}/bulk", headers=auth_header, json=json.load(data_file))
+        assert response.status_code == 200, response.text
+    # small chunks, so that the purge goes through several transactions per table
+    monkeypatch.setattr(purge, "PURGE_CHUNK_SIZE", 2)
+    monkeypatch.setattr(purge, "PURGE_PAUSE", 0)
+    response = client.delete("/api/users/me", headers=auth_header)
+    assert response.status_code == 200, response.text
+    assert response.json()["is_active"] is False, "The user wasn't deactivated."
+    # the token of the deleted user can't be used anymore
+    assert client.get("/api/users/me", headers=auth_header).status_code == 401, "The token wasn't revoked."
+    # the purge is run before the test client returns
+    response = client.get(response.headers["Location"])
+    assert response.status_code == 200, response.text
+    job = response.json()
+    assert job["status"] == "done", job["error"]
+    assert job["deleted"]["song"] > purge.PURGE_CHUNK_SIZE, f"Incorrect purge progress : {job}."
+    assert job["deleted"]["tag_song"] > 0, f"Incorrect purge progress : {job}."
+    db = TestingSessionLocal()
+    assert crud.get_user_by_username(db, "purged") is None, "The user was not deleted from the database."
+    for model, _ in purge.PURGE_STEPS:
+        assert db.query(model).count() == 0, f"Rows left in {model.__tablename__}."
+    db.close()
+    # unknown jobs
+    response = client.get("/api/users/purges/unknown")
+    assert response.status_code == 404, response.text
+
+
+def test_resume_purges(monkeypatch):
+    """
+    Make sure that the purges stopped by a restart:
+    - are started again for every user marked for deletion, and delete their music library & the user.
+    - leave the users that were only deactivated alone.
+    - can be followed until they're over, even once many other jobs were created.
+    """
+    from ..cache import LRUCache
+    # register a user with a music library, then mark it for deletion without purging it
+    client.post("/api/users/", json={**new_user, "username": "interrupted", "email": "interrupted@example.com"})
+    auth_header = get_auth_header(login(client, "interrupted", new_user["hashed_password"]))
+    with open("backend/json/tags.json", "r") as data_file:
+        response = client.post("/api/tags/bulk", headers=auth_header, json=json.load(data_file))
+    assert response.status_code == 200, response.text
+    crud.request_user_deletion(db, "interrupted")
+    client.post("/api/users/", json={**new_user, "username": "suspended", "email": "suspended@example.com"})
+    crud.deactivate_user(db, "suspended")
+    # only keep the last finished job
+    monkeypatch.setattr(purge, "active_purge_jobs", {})
+    monkeypatch.setattr(purge, "purge_jobs", LRUCache(max_size=1))
+    jobs = purge.resume_purges(TestingSessionLocal.kw["bind"])
+    assert len(jobs) == 1, f"Incorrect purge jobs : {jobs}."
+    for _ in range(3):
+        purge.create_purge_job(0)
+    deadline = time.time() + 10
+    while purge.get_purge_job(jobs[0]["job_id"])["status"] in ["pending", "running"] and time.time() < deadline:
+        time.sleep(0.05)
+    job = purge.get_purge_job(jobs[0]["job_id"])
+    assert job["status"] == "done", job["error"]
+    assert job["deleted"]["tag"] > 0, f"Incorrect purge progress : {job}."
+    new_db = TestingSessionLocal()
+    assert crud.get_user_by_username(new_db, "interrupted") is None, "The user was not deleted from the database."
+    assert new_db.query(models.Tag).count() == 0, "Rows left in tag."
+    assert crud.get_user_by_username(new_db, "suspended") is not None, "The deactivated user shouldn't be deleted."
+    new_db.close()
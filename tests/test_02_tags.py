@@ -6,6 +6,8 @@ import os
 # necessary imports to open & use a database connection
 
 from ..main import app, get_db
+from .. import models
+from ..routers.tags import MAX_BULK_TAGS
 from .utility import *
 
 # /!\ test environment setup /!\
@@ -315,3 +317,128 @@ def test_delete_tag():
         "user_id": 1
     }
     assert data == expected_data, "Incorrect response format or data."
+
+
+# --------------------------------------------------------------------------
+# /!\ TEST CACHE /!\
+
+def test_lru_cache():
+    """
+    Make sure that the LRUCache class:
+    - evicts the least recently used entry when it's full.
+    - forgets the entries once they've expired.
+    """
+    from ..cache import LRUCache
+    cache = LRUCache(max_size=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1, "Incorrect cached value."
+    # "b" is now the least recently used entry
+    cache.set("c", 3)
+    assert cache.get("b") is None and cache.get("a") == 1 and cache.get("c") == 3, "Incorrect eviction."
+    cache = LRUCache(max_size=2, ttl=0)
+    cache.set("a", 1)
+    assert cache.get("a", "expired") == "expired", "Entry should have expired."
+
+
+def test_tag_vocabulary_cache():
+    """
+    Make sure that looking up tags by name through the vocabulary cache:
+    - finds the tags created, renamed & deleted through the API.
+    - only looks up the tag by primary key once the vocabulary is cached.
+    - isn't fooled by changes made outside of the cache (by another process).
+    """
+    current_user = crud.get_user_by_username(db, "test")
+    auth_header = get_auth_header(login_as_test(client))
+    response = client.post("/api/tags/", headers=auth_header, json={"name": "Cached"})
+    assert response.status_code == 200, response.text
+    tag_id = response.json()["id"]
+    assert crud.get_tag_by_name(db, "Cached", current_user).id == tag_id, "Tag should be found."
+    response = client.put("/api/tags/Cached", headers=auth_header, json={"new_name": "Still Cached"})
+    assert response.status_code == 200, response.text
+    assert crud.get_tag_by_name(db, "Cached", current_user) is None, "Tag shouldn't be found under its old name."
+    assert crud.get_tag_by_name(db, "Still Cached", current_user).id == tag_id, "Tag should be found under its new name."
+    new_db = TestingSessionLocal()
+    with record_statements(new_db) as statements:
+        db_tag = crud.get_tag_by_name(new_db, "Still Cached", current_user)
+    assert db_tag.id == tag_id and db_tag.name == "Still Cached", "Tag should be found under its new name."
+    assert len(statements) == 1 and "tag.id = ?" in statements[0], f"Unexpected statements : {statements}."
+    new_db.close()
+    # rename the tag behind the cache's back
+    db.query(models.Tag).filter(models.Tag.id == tag_id).update({"name": "Not Cached"}, synchronize_session=False)
+    db.commit()
+    assert crud.get_tag_by_name(db, "Still Cached", current_user) is None, "Out of date cache entry shouldn't be used."
+    assert crud.get_tag_by_name(db, "Not Cached", current_user).id == tag_id, "Tag should be found under its new name."
+    response = client.delete("/api/tags/Not Cached", headers=auth_header)
+    assert response.status_code == 200, response.text
+    assert crud.get_tag_by_name(db, "Not Cached", current_user) is None, "Deleted tag shouldn't be found."
+
+
+# --------------------------------------------------------------------------
+# /!\ TEST BULK POST /!\
+
+def test_post_tags_bulk_401_login():
+    """
+    Make sure that a POST at '/api/tags/bulk':
+    - returns an HTTP 401 when the user isn't logged in.
+    """
+    response = client.post("/api/tags/bulk", json=[{"name": "Bulk 1"}])
+    assert response.status_code == 401, response.text
+
+
+def test_post_tags_bulk():
+    """
+    Make sure that a POST at '/api/tags/bulk':
+    - creates the Tag objects that don't exist yet.
+    - sends back the names already in use (in the database or earlier in the list) as conflicts.
+    - returns an HTTP 400 when more than MAX_BULK_TAGS tags are sent at once.
+    """
+    # log in as the test user
+    auth_header = get_auth_header(login_as_test(client))
+    response = client.post("/api/tags/bulk", headers=auth_header, json=[{"name": "Bulk 1"}, {"name": "Bulk 2"}, {"name": "Bulk 1"}])
+    assert response.status_code == 200, response.text
+    data = response.json()
+    assert [item["name"] for item in data["created"]] == ["Bulk 1", "Bulk 2"], "Incorrect response format or data."
+    assert data["conflicts"] == ["Bulk 1"], "Incorrect response format or data."
+    response = client.post("/api/tags/bulk", headers=auth_header, json=[{"name": "Bulk 2"}, {"name": "Bulk 3"}])
+    assert response.status_code == 200, response.text
+    data = response.json()
+    assert [item["name"] for item in data["created"]] == ["Bulk 3"], "Incorrect response format or data."
+    assert data["conflicts"] == ["Bulk 2"], "Incorrect response format or data."
+    # the new objects can be looked up by name
+    response = client.get("/api/tags/Bulk 3", headers=auth_header)
+    assert response.status_code == 200, response.text
+    assert response.json() == data["created"][0], "Incorrect response format or data."
+    # make sure we get an HTTP 400 when too many tags are sent at once
+    response = client.post("/api/tags/bulk", headers=auth_header, json=[{"name": f"Bulk {i}"} for i in range(MAX_BULK_TAGS + 1)])
+    assert response.status_code == 400, response.text
+
+
+# --------------------------------------------------------------------------
+# /!\ TEST BULK RENAME /!\
+
+def test_rename_tags():
+    """
+    Make sure that a POST at '/api/tags/rename':
+    - renames the existing tags.
+    - sends back the names that don't exist, and the new names that are already in use.
+    """
+    # log in as the test user
+    auth_header = get_auth_header(login_as_test(client))
+    client.post("/api/tags/bulk", headers=auth_header, json=[{"name": "Rename 1"}, {"name": "Rename 2"}, {"name": "Rename 3"}])
+    response = client.post("/api/tags/rename", headers=auth_header, json=[
+        {"name": "Rename 1", "new_name": "Renamed 1"},
+        {"name": "Rename 2", "new_name": "Renamed 2"},
+        {"name": "Rename 3", "new_name": "Renamed 1"},
+        {"name": "Rename 4", "new_name": "Renamed 4"},
+    ])
+    assert response.status_code == 200, response.text
+    data = response.json()
+    assert [tag["name"] for tag in data["renamed"]] == ["Renamed 1", "Renamed 2"], "Incorrect response format or data."
+    assert data["not_found"] == ["Rename 4"], "Incorrect response format or data."
+    assert data["conflicts"] == ["Renamed 1"], "Incorrect response format or data."
+    # the cached lookups see the new names
+    response = client.get("/api/tags/Renamed 2", headers=auth_header)
+    assert response.status_code == 200, response.text
+    response = client.get("/api/tags/Rename 2", headers=auth_header)
+    assert response.status_code == 404, response.text
@@ -6,6 +6,7 @@ import os
 # necessary imports to open & use a database connection
 
 from ..main import app, get_db
+from ..routers.artists import MAX_BULK_ARTISTS
 from .utility import *
 
 # /!\ test environment setup /!\
@@ -315,3 +316,43 @@ def test_delete_artist():
         "user_id": 1
     }
     assert data == expected_data, "Incorrect response format or data."
+
+
+# --------------------------------------------------------------------------
+# /!\ TEST BULK POST /!\
+
+def test_post_artists_bulk_401_login():
+    """
+    Make sure that a POST at '/api/artists/bulk':
+    - returns an HTTP 401 when the user isn't logged in.
+    """
+    response = client.post("/api/artists/bulk", json=[{"name": "Bulk 1"}])
+    assert response.status_code == 401, response.text
+
+
+def test_post_artists_bulk():
+    """
+    Make sure that a POST at '/api/artists/bulk':
+    - creates the Artist objects that don't exist yet.
+    - sends back the names already in use (in the database or earlier in the list) as conflicts.
+    - returns an HTTP 400 when more than MAX_BULK_ARTISTS artists are sent at once.
+    """
+    # log in as the test user
+    auth_header = get_auth_header(login_as_test(client))
+    response = client.post("/api/artists/bulk", headers=auth_header, json=[{"name": "Bulk 1"}, {"name": "Bulk 2"}, {"name": "Bulk 1"}])
+    assert response.status_code == 200, response.text
+    data = response.json()
+    assert [item["name"] for item in data["created"]] == ["Bulk 1", "Bulk 2"], "Incorrect response format or data."
+    assert data["conflicts"] == ["Bulk 1"], "Incorrect response format or data."
+    response = client.post("/api/artists/bulk", headers=auth_header, json=[{"name": "Bulk 2"}, {"name": "Bulk 3"}])
+    assert response.status_code == 200, response.text
+    data = response.json()
+    assert [item["name"] for item in data["created"]] == ["Bulk 3"], "Incorrect response format or data."
+    assert data["conflicts"] == ["Bulk 2"], "Incorrect response format or data."
+    # the new objects can be looked up by name
+    response = client.get("/api/artists/Bulk 3", headers=auth_header)
+    assert response.status_code == 200, response.text
+    assert response.json() == data["created"][0], "Incorrect response format or data."
+    # make sure we get an HTTP 400 when too many artists are sent at once
+    response = client.post("/api/artists/bulk", headers=auth_header, json=[{"name": f"Bulk {i}"} for i in range(MAX_BULK_ARTISTS + 1)])
+    assert response.status_code == 400, response.text
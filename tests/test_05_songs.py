@@ -7,6 +7,8 @@ import os
 # necessary imports to open & use a database connection
 
 from ..main import app, get_db
+from .. import search
+from ..utility import MAX_PAGE_SIZE
 from .utility import *
 
 # /!\ test environment setup /!\
@@ -287,6 +289,193 @@ def test_get_all_songs():
 
 
 
+def test_get_latest_songs():
+    """
+    Make sure that a GET at '/api/songs/?max={max}':
+    - returns the 'max' most recently added 'Song' objects.
+    """
+    # logging in as the test user 
+    auth_header = get_auth_header(login_as_test(client))
+    response = client.get("/api/songs/?max=1", headers=auth_header)
+    assert response.status_code == 200, response.text
+    assert [song["title"] for song in response.json()] == ["Diamonds"], "Incorrect response format or data."
+    # asking for more songs than there are in the library
+    response = client.get("/api/songs/?max=10", headers=auth_header)
+    assert response.status_code == 200, response.text
+    assert [song["title"] for song in response.json()] == ["Legacy", "Diamonds"], "Incorrect response format or data."
+    # make sure we get an HTTP 400 when max has a negative value
+    response = client.get("/api/songs/?max=-1", headers=auth_header)
+    assert response.status_code == 400, response.text
+
+
+# --------------------------------------------------------------------------
+# /!\ TEST GET PAGE /!\
+
+def test_get_songs_page_401_login():
+    """
+    Make sure that a GET at '/api/songs/page/':
+    - returns an HTTP 401 when the user isn't logged in.
+    """
+    # trying to GET without being logged in
+    response = client.get("/api/songs/page/")
+    assert response.status_code == 401, response.text
+
+def test_get_songs_page():
+    """
+    Make sure that a GET at '/api/songs/page/?cursor={cursor}&max={max}':
+    - returns a page of 'Song' objects along with the cursor to the next page.
+    """
+    # logging in as the test user 
+    auth_header = get_auth_header(login_as_test(client))
+    # get the first page
+    response = client.get("/api/songs/page/?max=1", headers=auth_header)
+    assert response.status_code == 200, response.text
+    data = response.json()
+    assert [song["title"] for song in data["items"]] == ["Legacy"], "Incorrect response format or data."
+    assert data["next_cursor"] == 1, "Incorrect response format or data."
+    # use the cursor to get the next (and last) page
+    response = client.get(f"/api/songs/page/?max=1&cursor={data['next_cursor']}", headers=auth_header)
+    assert response.status_code == 200, response.text
+    data = response.json()
+    assert [song["title"] for song in data["items"]] == ["Diamonds"], "Incorrect response format or data."
+    assert data["next_cursor"] is None, "Incorrect response format or data."
+    # a page holding exactly the remaining songs is the last one
+    response = client.get("/api/songs/page/?max=2", headers=auth_header)
+    data = response.json()
+    assert [song["title"] for song in data["items"]] == ["Legacy", "Diamonds"], "Incorrect response format or data."
+    assert data["next_cursor"] is None, "Incorrect response format or data."
+    # there's nothing after the last song
+    response = client.get("/api/songs/page/?cursor=2", headers=auth_header)
+    assert response.json() == {"items": [], "next_cursor": None}, "Incorrect response format or data."
+    # make sure we get an HTTP 400 when max is out of bounds
+    for max in [-1, 0, MAX_PAGE_SIZE + 1]:
+        response = client.get(f"/api/songs/page/?max={max}", headers=auth_header)
+        assert response.status_code == 400, response.text
+    response = client.get(f"/api/songs/page/?max={MAX_PAGE_SIZE}", headers=auth_header)
+    assert response.status_code == 200, response.text
+    # users can't access each other's music libraries
+    auth_header = get_auth_header(login_as_test1(client))
+    response = client.get("/api/songs/page/", headers=auth_header)
+    assert response.status_code == 200, response.text
+    assert response.json() == {"items": [], "next_cursor": None}, "Incorrect response format or data."
+
+
+
+# --------------------------------------------------------------------------
+# /!\ TEST GET SONGS BY TAG / GENRE / ARTIST /!\
+
+def test_get_tag_songs_401_login():
+    """
+    Make sure that a GET at '/api/tags/{name}/songs/':
+    - returns an HTTP 401 when the user isn't logged in.
+    """
+    # trying to GET without being logged in
+    response = client.get("/api/tags/Energetic/songs/")
+    assert response.status_code == 401, response.text
+
+def test_get_tag_songs_404_ownership():
+    """
+    Make sure that a GET at '/api/tags/{name}/songs/':
+    - returns an HTTP 404 when the tag belongs to another user.
+    """
+    # logging in as the second test user
+    auth_header = get_auth_header(login_as_test1(client))
+    response = client.get("/api/tags/Energetic/songs/", headers=auth_header)
+    assert response.status_code == 404, response.text
+
+def test_get_tag_songs():
+    """
+    Make sure that a GET at '/api/tags/{name}/songs/?skip={skip}&max={max}':
+    - returns the list of 'Song' objects associated to the tag when nothing goes wrong.
+    """
+    # logging in as the test user
+    auth_header = get_auth_header(login_as_test(client))
+    response = client.get("/api/tags/Energetic/songs/", headers=auth_header)
+    assert response.status_code == 200, response.text
+    data = response.json()
+    expected_data = [
+        {
+            "id": 1,
+            "title": "Legacy",
+            "key": "G Major",
+            "bpm": 128,
+            "url": "https://youtu.be/nHn39P1bAT4",
+            "duration": int(timedelta(minutes=2, seconds=39).total_seconds()),
+            "release_date": "2021-12-10",
+            "user_id": 1,
+            "tags": ["Energetic"],
+            "genres": ["EDM", "Bass House"],
+            "artists": ["Dirty Palm", "Benix"]
+        },
+        {
+            "id": 2,
+            "title": "Diamonds",
+            "key": "C# Minor",
+            "bpm": 125,
+            "url": "https://www.beatport.com/track/diamonds/16087263",
+            "duration": int(timedelta(minutes=3, seconds=23).total_seconds()),
+            "release_date": "2021-12-31",
+            "user_id": 1,
+            "tags": ["Energetic"],
+            "genres": ["Bass House"],
+            "artists": ["Martin Garrix", "Julian Jordan"]
+        }
+    ]
+    assert data == expected_data, "Incorrect response format or data."
+    # make sure pagination works
+    response = client.get("/api/tags/Energetic/songs/?skip=1&max=1", headers=auth_header)
+    assert response.status_code == 200, response.text
+    assert [song["id"] for song in response.json()] == [2], "Incorrect response format or data."
+    # a tag that isn't associated to any song
+    response = client.get("/api/tags/Groovy/songs/", headers=auth_header)
+    assert response.status_code == 200, response.text
+    assert response.json() == [], "Incorrect response format or data."
+
+def test_get_genre_songs():
+    """
+    Make sure that a GET at '/api/genres/{name}/songs/':
+    - returns the list of 'Song' objects associated to the genre when nothing goes wrong.
+    """
+    # logging in as the test user
+    auth_header = get_auth_header(login_as_test(client))
+    response = client.get("/api/genres/EDM/songs/", headers=auth_header)
+    assert response.status_code == 200, response.text
+    assert [song["title"] for song in response.json()] == ["Legacy"], "Incorrect response format or data."
+    response = client.get("/api/genres/Bass House/songs/", headers=auth_header)
+    assert response.status_code == 200, response.text
+    assert [song["title"] for song in response.json()] == ["Legacy", "Diamonds"], "Incorrect response format or data."
+    # make sure we get an HTTP 404 when the genre doesn't exist
+    response = client.get("/api/genres/non-existent-genre/songs/", headers=auth_header)
+    assert response.status_code == 404, response.text
+
+def test_get_artist_songs():
+    """
+    Make sure that a GET at '/api/artists/{name}/songs/':
+    - returns the list of 'Song' objects associated to the artist when nothing goes wrong, with or without the trailing slash.
+    - rejects the songs titled 'songs'.
+    """
+    # logging in as the test user
+    auth_header = get_auth_header(login_as_test(client))
+    response = client.get("/api/artists/Julian Jordan/songs/", headers=auth_header)
+    assert response.status_code == 200, response.text
+    assert [song["title"] for song in response.json()] == ["Diamonds"], "Incorrect response format or data."
+    # make sure we get an HTTP 400 when max has a negative value
+    response = client.get("/api/artists/Julian Jordan/songs/?max=-1", headers=auth_header)
+    assert response.status_code == 400, response.text
+    # the path without the trailing slash isn't taken for a song titled 'songs'
+    response = client.get("/api/artists/Julian Jordan/songs", headers=auth_header)
+    assert response.status_code == 200, response.text
+    assert [song["title"] for song in response.json()] == ["Diamonds"], "Incorrect response format or data."
+    # which is why songs can't be called that
+    response = client.post("/api/songs/", headers=auth_header, json={**post_data_1, "title": "songs"})
+    assert response.status_code == 400, response.text
+    response = client.put("/api/artists/Julian Jordan/Diamonds", headers=auth_header, json={"new_title": "songs"})
+    assert response.status_code == 400, response.text
+    response = client.post("/api/songs/bulk", headers=auth_header, json=[{**post_data_1, "title": "songs"}])
+    assert response.json()["nb_created"] == 0, response.text
+
+
+
 # --------------------------------------------------------------------------
 # /!\ TEST SEARCH /!\
 
@@ -1073,6 +1262,27 @@ def test_search_songs_boundaries():
     assert data == expected_data, "Incorrect response format or data."
 
 
+def test_search_songs_with_total():
+    """
+    Make sure that a POST at '/api/songs/search/?skip={skip}&max={max}&with_total=true':
+    - sends back the total number of results in the 'X-Total-Count' header.
+    """
+    # log in
+    auth_header = get_auth_header(login_as_test(client))
+    response = client.post("/api/songs/search/?skip=1&max=1&with_total=true", headers=auth_header, json={})
+    assert response.status_code == 200, response.text
+    assert len(response.json()) == 1, "Incorrect response format or data."
+    assert response.headers["X-Total-Count"] == "2", "Incorrect total number of results."
+    # the header isn't sent unless it's asked for
+    response = client.post("/api/songs/search/?max=1", headers=auth_header, json={})
+    assert response.status_code == 200, response.text
+    assert "X-Total-Count" not in response.headers, "Unexpected 'X-Total-Count' header."
+    # no results
+    response = client.post("/api/songs/search/?with_total=true", headers=auth_header, json={"tags": ["non-existent-tag"]})
+    assert response.status_code == 200, response.text
+    assert response.headers["X-Total-Count"] == "0", "Incorrect total number of results."
+
+
 def test_search_songs_by_release_year():
     """
     Make sure that a POST at '/api/songs/search/?skip={skip}&max={max}':
@@ -1220,6 +1430,174 @@ def test_search_songs_by_release_day():
     expected_data = []
     assert data == expected_data, "Incorrect response format or data."
 
+def test_search_songs_single_statement():
+    """
+    Make sure that searching for songs using tags, genres & artists:
+    - is compiled into a single statement using correlated subqueries.
+    - doesn't send the IDs of the associated songs back to the database.
+    """
+    current_user = crud.get_user_by_username(db, "test")
+    search_params = schemas.SongSearchParams(tags=["Energetic"], genres=["Bass House"], artists=["Martin Garrix"])
+    query = search.get_song_search_query(db, search_params, current_user)
+    # the only bound parameters are the owner & the names we're looking for
+    # no matter how many songs are associated to those items
+    compiled = query.statement.compile(dialect=db.get_bind().dialect)
+    assert len(compiled.params) == 7, f"Unexpected bound parameters : {compiled.params}."
+    # each filter is evaluated as a correlated subquery
+    # instead of a separate query & a literal list of IDs
+    plan = explain_query_plan(db, query)
+    assert len([step for step in plan if "CORRELATED" in step]) == 3, f"Unexpected query plan : {plan}."
+    assert [song.title for song in query.all()] == ["Diamonds"], "Incorrect search results."
+
+
+def test_search_songs_text_index():
+    """
+    Make sure that searching for songs by title:
+    - uses the text search index instead of scanning the song table.
+    - is case-insensitive, just like the search without the index.
+    """
+    current_user = crud.get_user_by_username(db, "test")
+    search_params = schemas.SongSearchParams(title="DIAMOND")
+    query = search.get_song_search_query(db, search_params, current_user)
+    plan = explain_query_plan(db, query)
+    assert any("VIRTUAL TABLE" in step for step in plan), f"Unexpected query plan : {plan}."
+    assert [song.title for song in query.all()] == ["Diamonds"], "Incorrect search results."
+    # terms too short to be indexed still work
+    search_params = schemas.SongSearchParams(title="Di")
+    query = search.get_song_search_query(db, search_params, current_user)
+    assert [song.title for song in query.all()] == ["Diamonds"], "Incorrect search results."
+
+
+def test_search_songs_ranges():
+    """
+    Make sure that a POST at '/api/songs/search/?skip={skip}&max={max}':
+    - returns the list of Song objects matching our range search parameters (bounds included).
+    """
+    # log in
+    auth_header = get_auth_header(login_as_test(client))
+    search_cases = [
+        ({"bpm_min": 126}, ["Legacy"]),
+        ({"bpm_min": 120, "bpm_max": 125}, ["Diamonds"]),
+        ({"duration_min": 159, "duration_max": 203}, ["Legacy", "Diamonds"]),
+        ({"duration_min": 160}, ["Diamonds"]),
+        ({"release_from": "2021-12-11"}, ["Diamonds"]),
+        ({"release_to": "2021-12-10"}, ["Legacy"]),
+        ({"release_year": 2021, "release_month": 12, "release_day": 31}, ["Diamonds"]),
+        ({"release_year": 2021, "release_day": 10}, ["Legacy"]),
+        ({"release_year": 2021, "release_month": 2, "release_day": 30}, []),
+    ]
+    for search_params, expected_titles in search_cases:
+        response = client.post("/api/songs/search/", headers=auth_header, json=search_params)
+        assert response.status_code == 200, response.text
+        assert [song["title"] for song in response.json()] == expected_titles, f"Incorrect search results for {search_params}."
+
+
+def test_search_songs_ranges_use_index():
+    """
+    Make sure that searching for songs by release year & BPM:
+    - uses one of the indexes on the song table instead of scanning it.
+    """
+    current_user = crud.get_user_by_username(db, "test")
+    search_params = schemas.SongSearchParams(release_year=2021, bpm_min=120, bpm_max=130)
+    query = search.get_song_search_query(db, search_params, current_user)
+    plan = explain_query_plan(db, query)
+    assert any("ix_song_user_id_" in step for step in plan), f"Unexpected query plan : {plan}."
+    assert [song.title for song in query.all()] == ["Legacy", "Diamonds"], "Incorrect search results."
+
+
+def test_get_songs_by_titles():
+    """
+    Make sure that looking up songs by their full titles:
+    - works with any of the songs' artists.
+    - leaves out the pairs that don't match any song.
+    """
+    current_user = crud.get_user_by_username(db, "test")
+    full_titles = [("Dirty Palm", "Legacy"), ("Julian Jordan", "Diamonds"), ("Benix", "Diamonds"), ("Unknown", "Legacy")]
+    db_songs = crud.get_songs_by_titles(db, full_titles, current_user)
+    assert {full_title: db_song.title for full_title, db_song in db_songs.items()} == {
+        ("Dirty Palm", "Legacy"): "Legacy",
+        ("Julian Jordan", "Diamonds"): "Diamonds"
+    }, "Incorrect Song objects."
+    assert crud.get_song_by_title(db, "Benix", "Legacy", current_user).title == "Legacy", "Incorrect Song object."
+    assert crud.get_song_by_title(db, "Benix", "Diamonds", current_user) is None, "Song shouldn't be found."
+    assert crud.get_songs_by_titles(db, [], current_user) == {}, "Incorrect Song objects."
+
+def test_parse_key_code():
+    """
+    Make sure that keys written as names, in Camelot notation or in Open Key notation:
+    - are turned into the same key code.
+    """
+    from ..crud_functions.utils import parse_key_code
+    assert parse_key_code("G Major") == parse_key_code("9B") == parse_key_code("2d") == parse_key_code("g"), "Incorrect key code."
+    assert parse_key_code("C# Minor") == parse_key_code("12A") == parse_key_code("Dbm") == parse_key_code("5m"), "Incorrect key code."
+    assert parse_key_code("A minor") == parse_key_code("8A") != parse_key_code("8B"), "Incorrect key code."
+    assert parse_key_code("not a key") is None, "Invalid keys shouldn't be parsed."
+
+
+def test_search_songs_compatible_key():
+    """
+    Make sure that a POST at '/api/songs/search/?skip={skip}&max={max}':
+    - returns the list of Song objects that can be mixed with our 'compatible_key' or 'compatible_song' search parameter.
+    - returns an HTTP 400 error when the key can't be parsed.
+    """
+    # log in
+    auth_header = get_auth_header(login_as_test(client))
+    search_cases = [
+        # Legacy is in G Major (9B), Diamonds is in C# Minor (12A)
+        ({"compatible_key": "G Major"}, ["Legacy"]),
+        ({"compatible_key": "E Minor"}, ["Legacy"]),
+        ({"compatible_key": "8B"}, ["Legacy"]),
+        ({"compatible_key": "1A"}, ["Diamonds"]),
+        ({"compatible_key": "E"}, ["Diamonds"]),
+        ({"compatible_key": "F Major"}, []),
+        ({"compatible_key": "G Major", "bpm": 125, "bpm_tolerance": 3}, ["Legacy"]),
+        ({"compatible_key": "G Major", "bpm": 125, "bpm_tolerance": 2}, []),
+        ({"compatible_song": "Dirty Palm - Legacy"}, []),
+        ({"compatible_song": "Dirty Palm - Unknown"}, []),
+    ]
+    for search_params, expected_titles in search_cases:
+        response = client.post("/api/songs/search/", headers=auth_header, json=search_params)
+        assert response.status_code == 200, response.text
+        assert [song["title"] for song in response.json()] == expected_titles, f"Incorrect search results for {search_params}."
+    response = client.post("/api/songs/search/", headers=auth_header, json={"compatible_key": "H Major"})
+    assert response.status_code == 400, response.text
+
+
+def test_search_songs_compatible_song():
+    """
+    Make sure that a POST at '/api/songs/search/?skip={skip}&max={max}':
+    - returns the songs that can be mixed with our 'compatible_song', whatever their BPM.
+    - only keeps the songs close to the reference song's BPM when 'bpm_tolerance' is provided.
+    """
+    # log in
+    auth_header = get_auth_header(login_as_test(client))
+    # E Minor (9A) mixes with Legacy (G Major, 9B, 128 BPM)
+    response = client.post("/api/songs/", headers=auth_header, json={
+        "title": "Mixable",
+        "key": "E Minor",
+        "bpm": 126,
+        "url": "https://youtu.be/mixable",
+        "duration": int(timedelta(minutes=3).total_seconds()),
+        "release_date": "2022-01-01",
+        "artists": ["Dirty Palm"]
+    })
+    assert response.status_code == 200, response.text
+    search_cases = [
+        ({"compatible_song": "Dirty Palm - Legacy"}, ["Mixable"]),
+        ({"compatible_song": "Dirty Palm - Legacy", "bpm_tolerance": 2}, ["Mixable"]),
+        ({"compatible_song": "Dirty Palm - Legacy", "bpm_tolerance": 1}, []),
+        ({"compatible_song": "Dirty Palm - Legacy", "bpm": 126}, ["Mixable"]),
+        ({"compatible_song": "Dirty Palm - Mixable"}, ["Legacy"]),
+    ]
+    for search_params, expected_titles in search_cases:
+        response = client.post("/api/songs/search/", headers=auth_header, json=search_params)
+        assert response.status_code == 200, response.text
+        assert [song["title"] for song in response.json()] == expected_titles, f"Incorrect search results for {search_params}."
+    response = client.delete("/api/artists/Dirty Palm/Mixable", headers=auth_header)
+    assert response.status_code == 200, response.text
+
+
+
 # --------------------------------------------------------------------------
 # /!\ TEST GET NUMBER SEARCH RESULTS /!\
 
@@ -1804,3 +2182,357 @@ def test_delete_song():
         "artists": ["Dirty Palm", "Benix"]
     }
     assert data == expected_data, "Incorrect response format or data."
+
+
+# --------------------------------------------------------------------------
+# /!\ TEST BULK POST /!\
+
+bulk_post_data = [
+    {
+        "title": "Animals",
+        "key": "F Minor",
+        "bpm": 128,
+        "url": "https://youtu.be/gCYcHz2k5x0",
+        "duration": int(timedelta(minutes=5, seconds=3).total_seconds()),
+        "release_date": "2013-06-17",
+        "tags": ["Energetic", "Heavy"],
+        "genres": ["Big Room"],
+        "artists": ["Martin Garrix"]
+    },
+    {
+        "title": "Animals",
+        "key": "F Minor",
+        "bpm": 128,
+        "url": "https://youtu.be/gCYcHz2k5x0",
+        "duration": int(timedelta(minutes=5, seconds=3).total_seconds()),
+        "release_date": "2013-06-17",
+        "artists": ["David Guetta", "Martin Garrix"]
+    },
+    {
+        "title": "Titanium",
+        "key": "Eb Major",
+        "bpm": 126,
+        "url": "https://youtu.be/JRfuAukYTKg",
+        "duration": int(timedelta(minutes=4, seconds=5).total_seconds()),
+        "release_date": "2011-12-09",
+        "tags": ["non-existent-tag"],
+        "artists": ["David Guetta"]
+    },
+    {
+        "title": "Nobody",
+        "key": "C Major",
+        "bpm": 120,
+        "url": "https://example.com",
+        "duration": 60,
+        "release_date": "2020-01-01",
+        "artists": []
+    }
+]
+
+def test_post_songs_bulk_401_login():
+    """
+    Make sure that a POST at '/api/songs/bulk':
+    - returns an HTTP 401 error when the user isn't logged in.
+    """
+    response = client.post("/api/songs/bulk", json=bulk_post_data)
+    assert response.status_code == 401, response.text
+
+
+def test_post_songs_bulk():
+    """
+    Make sure that a POST at '/api/songs/bulk':
+    - creates the valid songs, with their tags, genres & artists.
+    - reports the duplicates (in the batch & in the database), missing items & songs without artists, without creating them.
+    """
+    # log in as the test user
+    auth_header = get_auth_header(login_as_test(client))
+    response = client.post("/api/songs/bulk", headers=auth_header, json=bulk_post_data)
+    assert response.status_code == 200, response.text
+    data = response.json()
+    assert data["nb_created"] == 1, "Incorrect number of songs created."
+    assert data["ids"][0] is not None and data["ids"][1:] == [None, None, None], "Incorrect song IDs."
+    assert [error["index"] for error in data["errors"]] == [1, 2, 3], "Incorrect errors."
+    response = client.get("/api/artists/Martin Garrix/Animals", headers=auth_header)
+    assert response.status_code == 200, response.text
+    song = response.json()
+    assert song["id"] == data["ids"][0], "Incorrect response format or data."
+    assert song["tags"] == ["Heavy", "Energetic"], "Incorrect response format or data."
+    assert song["genres"] == ["Big Room"], "Incorrect response format or data."
+    assert song["artists"] == ["Martin Garrix"], "Incorrect response format or data."
+    # the song now exists in the database
+    response = client.post("/api/songs/bulk", headers=auth_header, json=bulk_post_data[:1])
+    assert response.status_code == 200, response.text
+    data = response.json()
+    assert data["nb_created"] == 0, "Incorrect number of songs created."
+    assert data["errors"] == [{"index": 0, "detail": "Song 'Animals by Martin Garrix' already exists."}], "Incorrect errors."
+
+
+def test_post_song_single_commit():
+    """
+    Make sure that a POST at '/api/songs/':
+    - commits the song & all its associations at once.
+    """
+    from sqlalchemy import event
+    commits = []
+    def count_commit(session):
+        commits.append(session)
+    event.listen(TestingSessionLocal, "after_commit", count_commit)
+    try:
+        # log in as the test user
+        auth_header = get_auth_header(login_as_test(client))
+        commits.clear()
+        response = client.post("/api/songs/", headers=auth_header, json={
+            "title": "Titanium",
+            "key": "Eb Major",
+            "bpm": 126,
+            "url": "https://youtu.be/JRfuAukYTKg",
+            "duration": int(timedelta(minutes=4, seconds=5).total_seconds()),
+            "release_date": "2011-12-09",
+            "tags": ["Energetic", "Heavy"],
+            "genres": ["Big Room"],
+            "artists": ["David Guetta", "Martin Garrix"]
+        })
+    finally:
+        event.remove(TestingSessionLocal, "after_commit", count_commit)
+    assert response.status_code == 200, response.text
+    assert len(commits) == 1, f"Expected a single commit, got {len(commits)}."
+    assert response.json()["artists"] == ["Martin Garrix", "David Guetta"], "Incorrect response format or data."
+
+
+def test_put_song_set_based():
+    """
+    Make sure that a PUT at '/api/artists/{artist_name}/{song_title}':
+    - replaces the song's tags with a single DELETE & a single INSERT statement.
+    """
+    # log in as the test user
+    auth_header = get_auth_header(login_as_test(client))
+    with record_statements(db) as statements:
+        # Energetic is removed, Groovy is added, Heavy stays
+        response = client.put("/api/artists/David Guetta/Titanium", headers=auth_header, json={"tags": ["Heavy", "Groovy", "Heavy"]})
+    assert response.status_code == 200, response.text
+    assert response.json()["tags"] == ["Groovy", "Heavy"], "Incorrect response format or data."
+    tag_song_statements = [statement for statement in statements if "tag_song" in statement and not statement.startswith("SELECT")]
+    assert len(tag_song_statements) == 2, f"Unexpected statements : {tag_song_statements}."
+
+
+def test_delete_song_set_based():
+    """
+    Make sure that a DELETE at '/api/artists/{artist_name}/{song_title}':
+    - deletes the song's associations with a single statement per table, in a single transaction.
+    """
+    # log in as the test user
+    auth_header = get_auth_header(login_as_test(client))
+    with record_statements(db) as statements:
+        response = client.delete("/api/artists/David Guetta/Titanium", headers=auth_header)
+    assert response.status_code == 200, response.text
+    deletes = [statement for statement in statements if statement.startswith("DELETE")]
+    assert len(deletes) == 5, f"Unexpected DELETE statements : {deletes}."
+    response = client.get("/api/artists/David Guetta/Titanium", headers=auth_header)
+    assert response.status_code == 404, response.text
+    # the associations are gone too
+    current_user = crud.get_user_by_username(db, "test")
+    db_artist = crud.get_artist_by_name(db, "David Guetta", current_user)
+    assert crud.get_artist_song_objects(db, db_artist, current_user) == [], "Associations weren't deleted."
+
+
+def test_get_songs_set_based(monkeypatch):
+    """
+    Make sure that a GET at '/api/songs/':
+    - sends the same number of statements, no matter how many songs are in the library.
+    - returns the same data when the songs are looked up in several chunks.
+    """
+    from ..crud_functions import song as song_crud
+    # log in as the test user
+    auth_header = get_auth_header(login_as_test(client))
+    client.get("/api/songs/", headers=auth_header)
+    with record_statements(db) as statements:
+        response = client.get("/api/songs/", headers=auth_header)
+    assert response.status_code == 200, response.text
+    nb_songs = len(response.json())
+    nb_statements = len(statements)
+    new_songs = [{
+        "title": f"Set Based {i}",
+        "key": "A Minor",
+        "bpm": 120,
+        "url": f"https://youtu.be/set-based-{i}",
+        "duration": int(timedelta(minutes=3).total_seconds()),
+        "release_date": "2022-01-01",
+        "tags": ["Heavy"],
+        "genres": ["Big Room"],
+        "artists": ["Martin Garrix", "David Guetta"]
+    } for i in range(5)]
+    response = client.post("/api/songs/bulk", headers=auth_header, json=new_songs)
+    assert response.json()["nb_created"] == len(new_songs), response.text
+    with record_statements(db) as statements:
+        response = client.get("/api/songs/", headers=auth_header)
+    songs = response.json()
+    assert len(songs) == nb_songs + len(new_songs), "Incorrect response format or data."
+    assert len(statements) == nb_statements, f"Unexpected statements : {statements}."
+    # split the songs in chunks of 2
+    split_in_chunks = song_crud.split_in_chunks
+    monkeypatch.setattr(song_crud, "split_in_chunks", lambda items: split_in_chunks(items, 2))
+    response = client.get("/api/songs/", headers=auth_header)
+    assert response.json() == songs, "Incorrect response format or data."
+    monkeypatch.undo()
+    for new_song in new_songs:
+        response = client.delete(f"/api/artists/Martin Garrix/{new_song['title']}", headers=auth_header)
+        assert response.status_code == 200, response.text
+
+
+def test_get_full_song_titles_set_based(monkeypatch):
+    """
+    Make sure that the full titles of a list of songs:
+    - are retrieved with a single statement per chunk of songs.
+    - are the same when the songs are looked up in several chunks.
+    """
+    from ..crud_functions import utils
+    current_user = crud.get_user_by_username(db, "test")
+    db_songs = crud.get_all_songs(db, current_user)
+    song_ids = [db_song.id for db_song in db_songs]
+    assert len(song_ids) > 1, "The library should have several songs."
+    with record_statements(db) as statements:
+        full_titles = utils.get_full_song_titles(db, song_ids + song_ids)
+    assert len(statements) == 1, f"Unexpected statements : {statements}."
+    for db_song in db_songs:
+        assert full_titles[db_song.id].endswith(f" - {db_song.title}"), "Incorrect full song title."
+    # one song per chunk
+    split_in_chunks = utils.split_in_chunks
+    monkeypatch.setattr(utils, "split_in_chunks", lambda items: split_in_chunks(items, 1))
+    with record_statements(db) as statements:
+        assert utils.get_full_song_titles(db, song_ids) == full_titles, "Incorrect full song titles."
+    assert len(statements) == len(song_ids), f"Unexpected statements : {statements}."
+
+
+# --------------------------------------------------------------------------
+# /!\ TEST BULK TAGGING /!\
+
+def test_post_tag_songs():
+    """
+    Make sure that a POST at '/api/tags/{name}/songs/':
+    - adds the tag to all the songs matching the search, with a single INSERT statement.
+    - skips the songs that already have the tag.
+    - returns an HTTP 400 when the selection is empty or ambiguous, and an HTTP 404 when a song or the tag doesn't exist.
+    """
+    # log in as the test user
+    auth_header = get_auth_header(login_as_test(client))
+    selection = {"search": {"bpm_min": 120}}
+    response = client.post("/api/songs/search/nb", headers=auth_header, json=selection["search"])
+    nb_results = response.json()["nb_results"]
+    assert nb_results > 1, "The search should match several songs."
+    with record_statements(db) as statements:
+        response = client.post("/api/tags/Relaxing/songs/", headers=auth_header, json=selection)
+    assert response.status_code == 200, response.text
+    assert response.json() == {"nb_affected": nb_results}, "Incorrect response format or data."
+    inserts = [statement for statement in statements if statement.startswith("INSERT")]
+    assert len(inserts) == 1, f"Unexpected INSERT statements : {inserts}."
+    response = client.get("/api/tags/Relaxing/songs/", headers=auth_header)
+    assert len(response.json()) == nb_results, "The tag wasn't added to all the songs."
+    # the songs already have it now
+    response = client.post("/api/tags/Relaxing/songs/", headers=auth_header, json=selection)
+    assert response.json() == {"nb_affected": 0}, "Incorrect response format or data."
+    # errors
+    response = client.post("/api/tags/Relaxing/songs/", headers=auth_header, json={})
+    assert response.status_code == 400, response.text
+    response = client.post("/api/tags/Relaxing/songs/", headers=auth_header, json={**selection, "songs": ["Martin Garrix - Animals"]})
+    assert response.status_code == 400, response.text
+    response = client.post("/api/tags/Relaxing/songs/", headers=auth_header, json={"songs": ["King Julian - I Like to Move It"]})
+    assert response.status_code == 404, response.text
+    response = client.post("/api/tags/non-existent-tag/songs/", headers=auth_header, json=selection)
+    assert response.status_code == 404, response.text
+
+
+def test_delete_tag_songs():
+    """
+    Make sure that a DELETE at '/api/tags/{name}/songs/':
+    - removes the tag from the listed songs, or from all the songs matching the search.
+    """
+    # log in as the test user
+    auth_header = get_auth_header(login_as_test(client))
+    nb_results = len(client.get("/api/tags/Relaxing/songs/", headers=auth_header).json())
+    response = client.delete("/api/tags/Relaxing/songs/", headers=auth_header, json={"songs": ["Martin Garrix - Animals"]})
+    assert response.status_code == 200, response.text
+    assert response.json() == {"nb_affected": 1}, "Incorrect response format or data."
+    response = client.delete("/api/tags/Relaxing/songs/", headers=auth_header, json={"search": {"bpm_min": 120}})
+    assert response.status_code == 200, response.text
+    assert response.json() == {"nb_affected": nb_results - 1}, "Incorrect response format or data."
+    response = client.get("/api/tags/Relaxing/songs/", headers=auth_header)
+    assert response.json() == [], "The tag wasn't removed from all the songs."
+
+
+def test_post_genre_songs():
+    """
+    Make sure that a POST / DELETE at '/api/genres/{name}/songs/':
+    - adds the genre to / removes it from the listed songs.
+    """
+    # log in as the test user
+    auth_header = get_auth_header(login_as_test(client))
+    selection = {"songs": ["Martin Garrix - Animals", "Martin Garrix - Funk"]}
+    response = client.post("/api/genres/Big Room/songs/", headers=auth_header, json=selection)
+    assert response.status_code == 200, response.text
+    # Animals already has it
+    assert response.json() == {"nb_affected": 1}, "Incorrect response format or data."
+    response = client.get("/api/artists/Martin Garrix/Funk", headers=auth_header)
+    assert "Big Room" in response.json()["genres"], "The genre wasn't added to the song."
+    response = client.delete("/api/genres/Big Room/songs/", headers=auth_header, json=selection)
+    assert response.json() == {"nb_affected": 2}, "Incorrect response format or data."
+
+
+# --------------------------------------------------------------------------
+# /!\ TEST MERGE /!\
+
+def test_merge_genre():
+    """
+    Make sure that a POST at '/api/genres/{name}/merge':
+    - repoints the songs of the genre to the target with a single UPDATE statement, without duplicate links.
+    - deletes the merged genre.
+    """
+    # log in as the test user
+    auth_header = get_auth_header(login_as_test(client))
+    # Animals has both genres, Funk only has the target
+    response = client.post("/api/genres/Bass House/songs/", headers=auth_header, json={"songs": ["Martin Garrix - Animals"]})
+    assert response.json() == {"nb_affected": 1}, "Incorrect response format or data."
+    response = client.post("/api/genres/Big Room/songs/", headers=auth_header, json={"songs": ["Martin Garrix - Funk"]})
+    assert response.json() == {"nb_affected": 1}, "Incorrect response format or data."
+    with record_statements(db) as statements:
+        response = client.post("/api/genres/Big Room/merge", headers=auth_header, json={"target": "Bass House"})
+    assert response.status_code == 200, response.text
+    assert response.json()["name"] == "Bass House", "Incorrect response format or data."
+    updates = [statement for statement in statements if statement.startswith("UPDATE")]
+    assert len(updates) == 1, f"Unexpected UPDATE statements : {updates}."
+    for song in ["Animals", "Funk"]:
+        response = client.get(f"/api/artists/Martin Garrix/{song}", headers=auth_header)
+        assert response.json()["genres"] == ["Bass House"], "Incorrect response format or data."
+    response = client.get("/api/genres/Big Room", headers=auth_header)
+    assert response.status_code == 404, response.text
+    # errors
+    response = client.post("/api/genres/Bass House/merge", headers=auth_header, json={"target": "Bass House"})
+    assert response.status_code == 400, response.text
+    response = client.post("/api/genres/Bass House/merge", headers=auth_header, json={"target": "non-existent-genre"})
+    assert response.status_code == 404, response.text
+
+
+def test_merge_artist():
+    """
+    Make sure that a POST at '/api/artists/{name}/merge':
+    - returns an HTTP 409 when both artists have a song with the same title.
+    - repoints the songs of the artist to the target otherwise.
+    """
+    # log in as the test user
+    auth_header = get_auth_header(login_as_test(client))
+    response = client.post("/api/songs/", headers=auth_header, json={
+        "title": "Funk",
+        "key": "A Minor",
+        "bpm": 124,
+        "url": "https://example.com/funk",
+        "duration": 180,
+        "release_date": "2020-01-01",
+        "artists": ["Benix"]
+    })
+    assert response.status_code == 200, response.text
+    response = client.post("/api/artists/Benix/merge", headers=auth_header, json={"target": "Martin Garrix"})
+    assert response.status_code == 409, response.text
+    # Funk is already associated to both of these
+    response = client.post("/api/artists/Julian Jordan/merge", headers=auth_header, json={"target": "Martin Garrix"})
+    assert response.status_code == 200, response.text
+    response = client.get("/api/artists/Martin Garrix/Funk", headers=auth_header)
+    assert response.json()["artists"] == ["Martin Garrix"], "Incorrect response format or data."
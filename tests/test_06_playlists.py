@@ -7,6 +7,8 @@ import os
 # necessary imports to open & use a database connection
 
 from ..main import app, get_db
+from ..utility import MAX_PAGE_SIZE
+from ..routers.playlists import MAX_BULK_PLAYLISTS
 from .utility import *
 
 # /!\ test environment setup /!\
@@ -238,6 +240,95 @@ def test_get_all_playlists():
 
 
 
+def test_get_latest_playlists():
+    """
+    Make sure that a GET at '/api/playlists/?max={max}':
+    - returns the 'max' most recently added 'Playlist' objects.
+    """
+    # logging in as the test user 
+    auth_header = get_auth_header(login_as_test(client))
+    response = client.get("/api/playlists/?max=1", headers=auth_header)
+    assert response.status_code == 200, response.text
+    assert [playlist["name"] for playlist in response.json()] == ["FH Sweets"], "Incorrect response format or data."
+
+
+# --------------------------------------------------------------------------
+# /!\ TEST GET PAGE /!\
+
+def test_get_playlists_page():
+    """
+    Make sure that a GET at '/api/playlists/page/?cursor={cursor}&max={max}':
+    - returns a page of 'Playlist' objects along with the cursor to the next page.
+    """
+    # logging in as the test user 
+    auth_header = get_auth_header(login_as_test(client))
+    # get the first page
+    response = client.get("/api/playlists/page/?max=1", headers=auth_header)
+    assert response.status_code == 200, response.text
+    data = response.json()
+    assert [playlist["name"] for playlist in data["items"]] == ["GOATs"], "Incorrect response format or data."
+    assert data["next_cursor"] == 1, "Incorrect response format or data."
+    # use the cursor to get the next (and last) page
+    response = client.get(f"/api/playlists/page/?max=1&cursor={data['next_cursor']}", headers=auth_header)
+    assert response.status_code == 200, response.text
+    data = response.json()
+    assert [playlist["name"] for playlist in data["items"]] == ["FH Sweets"], "Incorrect response format or data."
+    assert data["next_cursor"] is None, "Incorrect response format or data."
+    # a page holding exactly the remaining playlists is the last one
+    response = client.get("/api/playlists/page/?max=2", headers=auth_header)
+    data = response.json()
+    assert [playlist["name"] for playlist in data["items"]] == ["GOATs", "FH Sweets"], "Incorrect response format or data."
+    assert data["next_cursor"] is None, "Incorrect response format or data."
+    # there's nothing after the last playlist
+    response = client.get("/api/playlists/page/?cursor=2", headers=auth_header)
+    assert response.json() == {"items": [], "next_cursor": None}, "Incorrect response format or data."
+    # make sure we get an HTTP 400 when max is out of bounds
+    for max in [-1, 0, MAX_PAGE_SIZE + 1]:
+        response = client.get(f"/api/playlists/page/?max={max}", headers=auth_header)
+        assert response.status_code == 400, response.text
+    response = client.get(f"/api/playlists/page/?max={MAX_PAGE_SIZE}", headers=auth_header)
+    assert response.status_code == 200, response.text
+
+
+
+# --------------------------------------------------------------------------
+# /!\ TEST GET PLAYLISTS BY TAG /!\
+
+def test_get_tag_playlists_401_login():
+    """
+    Make sure that a GET at '/api/tags/{name}/playlists/':
+    - returns an HTTP 401 when the user isn't logged in.
+    """
+    # trying to GET without being logged in
+    response = client.get("/api/tags/Energetic/playlists/")
+    assert response.status_code == 401, response.text
+
+def test_get_tag_playlists():
+    """
+    Make sure that a GET at '/api/tags/{name}/playlists/?skip={skip}&max={max}':
+    - returns the list of 'Playlist' objects associated to the tag when nothing goes wrong.
+    """
+    # logging in as the test user
+    auth_header = get_auth_header(login_as_test(client))
+    response = client.get("/api/tags/Energetic/playlists/?max=1", headers=auth_header)
+    assert response.status_code == 200, response.text
+    data = response.json()
+    expected_data = [
+        {
+            "id": 1,
+            "name": "GOATs",
+            "user_id": 1,
+            "tags": ["Energetic"],
+            "songs": ["Martin Garrix - Diamonds", "RetroVision - Bring The Beat Back"]
+        }
+    ]
+    assert data == expected_data, "Incorrect response format or data."
+    # make sure we get an HTTP 404 when the tag doesn't exist
+    response = client.get("/api/tags/non-existent-tag/playlists/", headers=auth_header)
+    assert response.status_code == 404, response.text
+
+
+
 # --------------------------------------------------------------------------
 # /!\ TEST SEARCH /!\
 
@@ -521,6 +612,19 @@ def test_search_playlists_boundaries():
     assert data == expected_data, "Incorrect response format or data."
 
 
+def test_search_playlists_with_total():
+    """
+    Make sure that a POST at '/api/playlists/search/?skip={skip}&max={max}&with_total=true':
+    - sends back the total number of results in the 'X-Total-Count' header.
+    """
+    # log in
+    auth_header = get_auth_header(login_as_test(client))
+    response = client.post("/api/playlists/search/?max=1&with_total=true", headers=auth_header, json={"tags": ["Energetic"]})
+    assert response.status_code == 200, response.text
+    assert len(response.json()) == 1, "Incorrect response format or data."
+    assert response.headers["X-Total-Count"] == "2", "Incorrect total number of results."
+
+
 # --------------------------------------------------------------------------
 # /!\ TEST GET NUMBER SEARCH RESULTS /!\
 
@@ -820,3 +924,118 @@ def test_delete_playlist():
         "songs": ["Dirty Palm - Legacy", "Brooks - Better When You're Gone"]
     }
     assert data == expected_data, "Incorrect response format or data."
+
+
+def test_post_playlist_same_song_twice():
+    """
+    Make sure that a POST at '/api/playlists/':
+    - adds a song listed under several of its artists only once.
+    """
+    # log in as the test user
+    auth_header = get_auth_header(login_as_test(client))
+    post_data_2 = {
+        "name": "Duplicates",
+        "songs": ["Martin Garrix - Diamonds", "Julian Jordan - Diamonds", "Martin Garrix - Diamonds"]
+    }
+    response = client.post("/api/playlists/", headers=auth_header, json=post_data_2)
+    assert response.status_code == 200, response.text
+    assert response.json()["songs"] == ["Martin Garrix - Diamonds"], "Incorrect response format or data."
+    # same thing when updating the playlist
+    response = client.put("/api/playlists/Duplicates", headers=auth_header, json={"songs": ["Julian Jordan - Diamonds", "Dirty Palm - Legacy"]})
+    assert response.status_code == 200, response.text
+    assert response.json()["songs"] == ["Dirty Palm - Legacy", "Martin Garrix - Diamonds"], "Incorrect response format or data."
+
+
+def test_put_playlist_songs_set_based():
+    """
+    Make sure that a PUT at '/api/playlists/{name}':
+    - replaces the playlist's songs with a single DELETE & a single INSERT statement.
+    """
+    # log in as the test user
+    auth_header = get_auth_header(login_as_test(client))
+    with record_statements(db) as statements:
+        # Legacy is removed, Diamonds stays (listed under another artist), the others are added
+        response = client.put("/api/playlists/Duplicates", headers=auth_header, json={
+            "songs": ["Julian Jordan - Diamonds", "RetroVision - Bring The Beat Back", "Brooks - Better When You're Gone"]
+        })
+    assert response.status_code == 200, response.text
+    assert sorted(response.json()["songs"]) == [
+        "Brooks - Better When You're Gone", "Martin Garrix - Diamonds", "RetroVision - Bring The Beat Back"
+    ], "Incorrect response format or data."
+    song_playlist_statements = [statement for statement in statements if "song_playlist" in statement and not statement.startswith("SELECT")]
+    assert len(song_playlist_statements) == 2, f"Unexpected statements : {song_playlist_statements}."
+
+
+def test_get_playlists_chunked(monkeypatch):
+    """
+    Make sure that a GET at '/api/playlists/':
+    - returns the same data when the playlists are looked up in several chunks.
+    """
+    from ..crud_functions import playlist as playlist_crud
+    # log in as the test user
+    auth_header = get_auth_header(login_as_test(client))
+    playlists = client.get("/api/playlists/", headers=auth_header).json()
+    assert len(playlists) > 1, "The library should have several playlists."
+    # one playlist per chunk
+    split_in_chunks = playlist_crud.split_in_chunks
+    monkeypatch.setattr(playlist_crud, "split_in_chunks", lambda items: split_in_chunks(items, 1))
+    with record_statements(db) as statements:
+        response = client.get("/api/playlists/", headers=auth_header)
+    assert response.json() == playlists, "Incorrect response format or data."
+    playlist_statements = [statement for statement in statements if "FROM song_playlist" in statement or "FROM tag_playlist" in statement]
+    assert len(playlist_statements) == 2 * len(playlists), f"Unexpected statements : {playlist_statements}."
+
+
+# --------------------------------------------------------------------------
+# /!\ TEST BULK POST /!\
+
+def test_post_playlists_bulk_401_login():
+    """
+    Make sure that a POST at '/api/playlists/bulk':
+    - returns an HTTP 401 when the user isn't logged in.
+    """
+    response = client.post("/api/playlists/bulk", json=[{"name": "Bulk 1"}])
+    assert response.status_code == 401, response.text
+
+
+def test_post_playlists_bulk_404():
+    """
+    Make sure that a POST at '/api/playlists/bulk':
+    - returns an HTTP 404 (and creates nothing) when one of the tags or songs doesn't exist.
+    """
+    # log in as the test user
+    auth_header = get_auth_header(login_as_test(client))
+    response = client.post("/api/playlists/bulk", headers=auth_header, json=[{"name": "Bulk 1"}, {"name": "Bulk 2", "tags": ["non-existent-tag"]}])
+    assert response.status_code == 404, response.text
+    response = client.post("/api/playlists/bulk", headers=auth_header, json=[{"name": "Bulk 1"}, {"name": "Bulk 2", "songs": ["King Julian - I Like to Move It"]}])
+    assert response.status_code == 404, response.text
+    response = client.get("/api/playlists/Bulk 1", headers=auth_header)
+    assert response.status_code == 404, response.text
+
+
+def test_post_playlists_bulk():
+    """
+    Make sure that a POST at '/api/playlists/bulk':
+    - creates the Playlist objects that don't exist yet, with their tags & songs.
+    - sends back the names already in use (in the database or earlier in the list) as conflicts.
+    - returns an HTTP 400 when more than MAX_BULK_PLAYLISTS playlists are sent at once.
+    """
+    # log in as the test user
+    auth_header = get_auth_header(login_as_test(client))
+    bulk_post_data = [
+        {"name": "Bulk 1", "tags": ["Energetic"], "songs": ["Martin Garrix - Diamonds", "Julian Jordan - Diamonds"]},
+        {"name": "Bulk 2", "songs": ["Dirty Palm - Legacy"]},
+        {"name": "Bulk 1", "tags": ["Relaxing"]},
+        {"name": "Duplicates"}
+    ]
+    response = client.post("/api/playlists/bulk", headers=auth_header, json=bulk_post_data)
+    assert response.status_code == 200, response.text
+    data = response.json()
+    assert [(playlist["name"], playlist["tags"], playlist["songs"]) for playlist in data["created"]] == [
+        ("Bulk 1", ["Energetic"], ["Martin Garrix - Diamonds"]),
+        ("Bulk 2", [], ["Dirty Palm - Legacy"])
+    ], "Incorrect response format or data."
+    assert data["conflicts"] == ["Bulk 1", "Duplicates"], "Incorrect response format or data."
+    # make sure we get an HTTP 400 when too many playlists are sent at once
+    response = client.post("/api/playlists/bulk", headers=auth_header, json=[{"name": f"Bulk {i}"} for i in range(MAX_BULK_PLAYLISTS + 1)])
+    assert response.status_code == 400, response.text
@@ -0,0 +1,103 @@
+from sqlalchemy import create_engine, inspect, text
+from sqlalchemy.orm import Session
+import os
+
+# necessary imports to open & use a database connection
+
+from ..migrations import MIGRATIONS, get_schema_version, run_migrations
+from .utility import record_statements
+
+# /!\ test environment setup /!\
+
+MIGRATIONS_DATABASE_URL = "sqlite:///./test_migrations.db"
+
+if os.path.isfile("test_migrations.db"):
+    os.remove("test_migrations.db")
+
+engine = create_engine(MIGRATIONS_DATABASE_URL, connect_args={"check_same_thread": False})
+
+# create a database the way the first versions of the API did
+# (no key_code column, single column indexes only)
+
+legacy_schema = [
+    'CREATE TABLE "user" (id INTEGER PRIMARY KEY, username VARCHAR NOT NULL, first_name VARCHAR, family_name VARCHAR, email VARCHAR, hashed_password VARCHAR, is_active BOOLEAN)',
+    'CREATE TABLE tag (id INTEGER PRIMARY KEY, name VARCHAR, user_id INTEGER REFERENCES "user" (id))',
+    'CREATE TABLE genre (id INTEGER PRIMARY KEY, name VARCHAR NOT NULL, user_id INTEGER REFERENCES "user" (id))',
+    'CREATE TABLE artist (id INTEGER PRIMARY KEY, name VARCHAR NOT NULL, user_id INTEGER REFERENCES "user" (id))',
+    'CREATE TABLE playlist (id INTEGER PRIMARY KEY, name VARCHAR NOT NULL, user_id INTEGER REFERENCES "user" (id))',
+    'CREATE TABLE song (id INTEGER PRIMARY KEY, title VARCHAR NOT NULL, "key" VARCHAR NOT NULL, bpm INTEGER NOT NULL, url VARCHAR NOT NULL, duration DATETIME NOT NULL, release_date DATE, user_id INTEGER REFERENCES "user" (id))',
+    'CREATE TABLE tag_song (id INTEGER PRIMARY KEY, tag_id INTEGER REFERENCES tag (id), song_id INTEGER REFERENCES song (id))',
+    'CREATE TABLE tag_playlist (id INTEGER PRIMARY KEY, tag_id INTEGER REFERENCES tag (id), playlist_id INTEGER REFERENCES playlist (id))',
+    'CREATE TABLE genre_song (id INTEGER PRIMARY KEY, genre_id INTEGER REFERENCES genre (id), song_id INTEGER REFERENCES song (id))',
+    'CREATE TABLE artist_song (id INTEGER PRIMARY KEY, artist_id INTEGER REFERENCES artist (id), song_id INTEGER REFERENCES song (id))',
+    'CREATE TABLE song_playlist (id INTEGER PRIMARY KEY, song_id INTEGER REFERENCES song (id), playlist_id INTEGER REFERENCES playlist (id))',
+    "INSERT INTO \"user\" (id, username) VALUES (1, 'test')",
+    "INSERT INTO tag (id, name, user_id) VALUES (1, 'Energetic', 1)",
+    "INSERT INTO song (id, title, \"key\", bpm, url, duration, release_date, user_id) VALUES (1, 'Legacy', 'G Major', 128, 'https://youtu.be/nHn39P1bAT4', '1970-01-01 00:02:39.000000', '2021-12-10', 1)",
+    # the same key, written another way & a key that can't be parsed
+    "INSERT INTO song (id, title, \"key\", bpm, url, duration, release_date, user_id) VALUES (2, 'Funk', '9B', 126, 'https://youtu.be/funk', '1970-01-01 00:03:00.000000', '2022-01-01', 1)",
+    "INSERT INTO song (id, title, \"key\", bpm, url, duration, release_date, user_id) VALUES (3, 'Unknown', 'H Major', 126, 'https://youtu.be/unknown', '1970-01-01 00:03:00.000000', '2022-01-01', 1)",
+    # the same pair stored twice
+    "INSERT INTO tag_song (id, tag_id, song_id) VALUES (1, 1, 1)",
+    "INSERT INTO tag_song (id, tag_id, song_id) VALUES (2, 1, 1)",
+]
+
+with engine.begin() as connection:
+    for statement in legacy_schema:
+        connection.execute(text(statement))
+
+
+# /!\ Test functions /!\
+
+def test_run_migrations():
+    """
+    Make sure that running the migrations on an existing database:
+    - applies all of them, in order.
+    - adds the user.deletion_requested_at column.
+    - adds the key_code column & computes it for the existing songs, with a single UPDATE statement per key code.
+    - removes the duplicate pairs from the association tables.
+    - creates the composite indexes.
+    """
+    assert get_schema_version(engine) == 0, "The database shouldn't have a version yet."
+    with record_statements(Session(bind=engine)) as statements:
+        applied = run_migrations(engine)
+    assert applied == [version for version, _, _ in MIGRATIONS], "Incorrect list of migrations applied."
+    assert get_schema_version(engine) == MIGRATIONS[-1][0], "Incorrect schema version."
+    with engine.connect() as connection:
+        key_codes = connection.execute(text("SELECT id, key_code FROM song ORDER BY id")).all()
+        assert key_codes == [(1, 17), (2, 17), (3, None)], f"Incorrect key codes : {key_codes}."
+        assert connection.execute(text("SELECT id FROM tag_song")).all() == [(1,)], "Duplicate pairs weren't removed."
+    song_updates = [statement for statement in statements if statement.startswith("UPDATE song")]
+    assert len(song_updates) == 1, f"Unexpected UPDATE statements : {song_updates}."
+    inspector = inspect(engine)
+    user_columns = [column["name"] for column in inspector.get_columns("user")]
+    assert "deletion_requested_at" in user_columns, f"Missing column : {user_columns}."
+    tag_indexes = [index["name"] for index in inspector.get_indexes("tag")]
+    assert "ix_tag_user_id_name" in tag_indexes, f"Missing index : {tag_indexes}."
+    song_indexes = [index["name"] for index in inspector.get_indexes("song")]
+    assert "ix_song_user_id_title" in song_indexes, f"Missing index : {song_indexes}."
+    tag_song_indexes = {index["name"]: index["unique"] for index in inspector.get_indexes("tag_song")}
+    assert tag_song_indexes.get("ix_tag_song_tag_id_song_id"), f"Missing unique index : {tag_song_indexes}."
+    assert "ix_tag_song_song_id_tag_id" in tag_song_indexes, f"Missing index : {tag_song_indexes}."
+
+
+def test_run_migrations_again():
+    """
+    Make sure that running the migrations again:
+    - doesn't apply any of them.
+    """
+    assert run_migrations(engine) == [], "Migrations shouldn't be applied twice."
+
+
+def test_lookups_use_indexes():
+    """
+    Make sure that looking up an item by name & an association by its pair:
+    - uses an index instead of scanning the table.
+    """
+    with engine.connect() as connection:
+        plan = [row[-1] for row in connection.execute(text("EXPLAIN QUERY PLAN SELECT * FROM tag WHERE user_id = 1 AND name = 'Energetic'"))]
+        assert any("ix_tag_user_id_name" in step for step in plan), f"Unexpected query plan : {plan}."
+        plan = [row[-1] for row in connection.execute(text("EXPLAIN QUERY PLAN SELECT * FROM tag_song WHERE tag_id = 1 AND song_id = 1"))]
+        assert any("ix_tag_song_tag_id_song_id" in step for step in plan), f"Unexpected query plan : {plan}."
+        plan = [row[-1] for row in connection.execute(text("EXPLAIN QUERY PLAN SELECT * FROM tag_song WHERE song_id = 1"))]
+        assert any("ix_tag_song_song_id_tag_id" in step for step in plan), f"Unexpected query plan : {plan}."
@@ -1,15 +1,21 @@
 # utility functions
+from contextlib import contextmanager
+from typing import Iterator, List
+from sqlalchemy.orm import Query
 from sqlalchemy.orm.session import Session
 from starlette.responses import Response
 from starlette.testclient import TestClient
 
 import json
 
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker
 from ..database import Base
 from .. import crud, schemas
 from ..auth import get_password_hash
+from ..migrations import run_migrations
+from ..search_functions.text_index import setup_text_index
+from ..crud_functions.purge import resume_purges
 
 SQLALCHEMY_DATABASE_URL = "sqlite:///./test.db"
 
@@ -28,9 +34,12 @@ def db_setup() -> sessionmaker:
     engine = create_engine(
         SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
     )
-    TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=engine)
 
     Base.metadata.create_all(bind=engine)
+    run_migrations(engine)
+    setup_text_index(engine)
+    resume_purges(engine)
     return TestingSessionLocal
 
 def db_populate(db: Session):
@@ -131,3 +140,45 @@ def get_auth_header(resp: Response) -> dict:
     auth_header = {"Authorization": f"{token['token_type']} {token['access_token']}"}
     return auth_header
 
+# useful to check how the database executes the queries built by the API
+
+def explain_query_plan(db: Session, query: Query) -> List[str]:
+    """
+
+    Ask SQLite how it's going to execute a query.
+
+    Args:
+        db (Session): Used to connect to the database.
+        query (Query): The query to be explained (it isn't executed).
+
+    Returns:
+        List[str]: The description of each step of the query plan.
+    """
+    compiled = query.statement.compile(dialect=db.get_bind().dialect)
+    params = tuple(compiled.params[name] for name in compiled.positiontup)
+    rows = db.connection().exec_driver_sql(f"EXPLAIN QUERY PLAN {compiled}", params).fetchall()
+    return [row[-1] for row in rows]
+
+# useful to check how many statements an endpoint sends to the database
+
+@contextmanager
+def record_statements(db: Session) -> Iterator[List[str]]:
+    """
+
+    Record the SQL statements sent to the database while the context is open.
+
+    Args:
+        db (Session): Any session bound to the test database (every session shares its engine).
+
+    Yields:
+        List[str]: The statements executed so far, filled as they're executed.
+    """
+    engine = db.get_bind()
+    statements = []
+    def log_statement(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+    event.listen(engine, "before_cursor_execute", log_statement)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", log_statement)
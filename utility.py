@@ -3,13 +3,21 @@
 from fastapi import HTTPException, status
 from .database import SessionLocal
 
+# the maximum number of objects returned in a single page (see the '/page/' endpoints)
+
+MAX_PAGE_SIZE = 1000
+
 def get_db():
     """
         Used in the dependency injection system to handle database connection opening and closing.
+        The changes that weren't committed when the request fails are rolled back.
     """
     db = SessionLocal()
     try:
         yield db
+    except Exception:
+        db.rollback()
+        raise
     finally:
         db.close()
 